@@ -6,7 +6,9 @@ A practical GUI for executing fast-agent scripts with MCP servers.
 This tool allows you to easily run, monitor, and interact with agent workflows.
 """
 
+import codecs
 import os
+import sys
 import time
 import threading
 import subprocess
@@ -18,7 +20,11 @@ import fcntl
 import termios
 import struct
 import select
-import re
+
+# Use the server package's terminal emulation for the output pane
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from ollama_mcp_server.output_cleaning import TerminalLineEmulator
 
 
 class WorkflowLauncher:
@@ -586,7 +592,9 @@ class WorkflowLauncher:
 
     def monitor_pty_output(self, master_fd, script_name):
         """Thread function to monitor output from a PTY master file descriptor"""
-        buffer = b""
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        # Only the current line is kept editable so output appears without delay
+        emulator = TerminalLineEmulator(live_lines=1)
         read_buffer_size = 1024
 
         try:
@@ -610,58 +618,14 @@ class WorkflowLauncher:
                             if not data:  # EOF
                                 break
 
-                            # Process received data
-                            buffer += data
-
-                            # Process complete lines (and handle terminal control sequences)
-                            lines = []
-                            while b'\r' in buffer or b'\n' in buffer:
-                                # Find line endings
-                                cr_pos = buffer.find(b'\r')
-                                lf_pos = buffer.find(b'\n')
-
-                                # Handle different line endings
-                                if cr_pos >= 0 and (lf_pos < 0 or cr_pos < lf_pos):
-                                    # CR only or CR before LF
-                                    line = buffer[:cr_pos]
-                                    buffer = buffer[cr_pos + 1:]
-                                    lines.append(line)
-                                elif lf_pos >= 0:
-                                    # LF
-                                    line = buffer[:lf_pos]
-                                    buffer = buffer[lf_pos + 1:]
-                                    lines.append(line)
-                                else:
-                                    break
-
-                            # Process and display lines
-                            for line in lines:
-                                try:
-                                    # Try to decode as UTF-8
-                                    decoded_line = line.decode('utf-8')
-
-                                    # Clean ANSI escape sequences for display
-                                    # Simple cleaning for basic ANSI codes
-                                    ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-                                    cleaned_line = ansi_escape.sub('', decoded_line)
-
-                                    # Add to output display
-                                    if cleaned_line:
-                                        self.root.after(0, lambda line=cleaned_line: self.append_output(line + '\n'))
-                                except UnicodeDecodeError:
-                                    # Handle binary data that can't be decoded
-                                    pass
-
-                            # If any data remains in buffer, display it if it's substantial
-                            if len(buffer) > 0 and not any(c in buffer for c in [b'\r', b'\n', b'\x1b']):
-                                try:
-                                    remaining = buffer.decode('utf-8')
-                                    if remaining and len(remaining) > 0:
-                                        self.root.after(0, lambda r=remaining: self.append_output(r))
-                                        buffer = b""
-                                except UnicodeDecodeError:
-                                    # Keep binary data in buffer until we get more complete UTF-8 sequences
-                                    pass
+                            # Apply carriage returns and cursor codes so redrawn
+                            # spinner/progress lines are shown once, in their final state
+                            self.show_lines(emulator.feed(decoder.decode(data)))
+
+                            # Show prompts that are waiting for input
+                            partial = emulator.take_partial_line()
+                            if partial:
+                                self.root.after(0, lambda p=partial: self.append_output(p))
                         except OSError as e:
                             # Handle read errors (e.g., fd closed)
                             if e.errno in (5, 9):  # Input/output error or Bad file descriptor
@@ -675,6 +639,9 @@ class WorkflowLauncher:
                 # Small sleep to prevent CPU hogging
                 time.sleep(0.01)
 
+            # Show whatever the emulator is still holding
+            self.show_lines(emulator.feed(decoder.decode(b"", final=True)) + emulator.flush())
+
             # Process has finished - signal UI update on main thread
             self.root.after(0, lambda: self.process_finished(script_name))
 
@@ -688,6 +655,13 @@ class WorkflowLauncher:
                 os.close(master_fd)
             except OSError:
                 pass
+
+    def show_lines(self, text):
+        """Schedule display of complete, non-blank output lines (safe from worker threads)"""
+        for line in text.split('\n')[:-1]:
+            if line.strip():
+                self.root.after(0, lambda line=line: self.append_output(line + '\n'))
+
     def process_finished(self, script_name):
         """Handle process completion"""
         if script_name not in self.processes:
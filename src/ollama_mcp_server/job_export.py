@@ -0,0 +1,210 @@
+"""
+Streaming export of job history to JSONL or CSV.
+
+Jobs are read from the job index a page at a time and written row by row,
+so exports of any size run in constant memory. Outputs are only read when
+requested, one file at a time. The same export is available as the
+export_jobs tool and from the command line::
+
+    python -m ollama_mcp_server.job_export --outputs-dir outputs \\
+        --format csv --since 2026-10-01 --columns job_id,model,state,created_at jobs.csv
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+from dataclasses import fields
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+try:
+    from .job_store import JobRecord, JobStore, parse_time_filter
+    from .output_layout import resolve_output_file
+except ImportError:
+    from job_store import JobRecord, JobStore, parse_time_filter
+    from output_layout import resolve_output_file
+
+EXPORT_FORMATS = ("jsonl", "csv")
+
+# Every exportable column: the job record fields plus the job's output text
+EXPORT_COLUMNS = [f.name for f in fields(JobRecord)] + ["output"]
+
+# Columns exported when none are selected (launch parameters and outputs are opt-in)
+DEFAULT_EXPORT_COLUMNS = [c for c in EXPORT_COLUMNS if c not in ("params", "output")]
+
+
+def read_raw_output(outputs_dir: Path, record: JobRecord) -> Optional[str]:
+    """
+    Read a job's output file as-is.
+
+    Args:
+        outputs_dir: Root outputs directory
+        record: The job record
+
+    Returns:
+        The output text, or None if the file cannot be found
+    """
+    output_file = resolve_output_file(outputs_dir, record.job_id, record.output_file)
+    if output_file is None:
+        return None
+    with open(output_file, "r", errors="replace") as f:
+        return f.read()
+
+
+def export_jobs(
+    store: JobStore,
+    outputs_dir: Path,
+    destination: Path,
+    export_format: str = "jsonl",
+    columns: Optional[List[str]] = None,
+    include_output: bool = False,
+    read_output: Optional[Callable[[JobRecord], Optional[str]]] = None,
+    **filters: Any
+) -> Dict[str, Any]:
+    """
+    Write matching jobs to a JSONL or CSV file.
+
+    The file is written under a temporary name and renamed when complete.
+
+    Args:
+        store: The JobStore holding the job index
+        outputs_dir: Root outputs directory
+        destination: Path of the export file
+        export_format: "jsonl" or "csv"
+        columns: Columns to export, in order (defaults to DEFAULT_EXPORT_COLUMNS)
+        include_output: Add the "output" column if it is not already selected
+        read_output: Function returning a job's output text (defaults to the raw file)
+        **filters: Filters passed to JobStore.iter_jobs (states, job_type, model, batch_id, since, until)
+
+    Returns:
+        Dict with the export path, number of rows and file size
+
+    Raises:
+        ValueError: If the format or a column name is not recognized
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {export_format!r}; expected one of {', '.join(EXPORT_FORMATS)}")
+    columns = list(columns or DEFAULT_EXPORT_COLUMNS)
+    unknown = [c for c in columns if c not in EXPORT_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+    if include_output and "output" not in columns:
+        columns.append("output")
+    if read_output is None:
+        read_output = partial(read_raw_output, outputs_dir)
+
+    destination = Path(destination)
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    temporary = destination.with_name(destination.name + ".partial")
+    rows = 0
+
+    try:
+        with open(temporary, "w", newline="", encoding="utf-8") as f:
+            csv_writer = None
+            if export_format == "csv":
+                csv_writer = csv.writer(f)
+                csv_writer.writerow(columns)
+
+            for record in store.iter_jobs(**filters):
+                row = _export_row(record, columns, read_output)
+                if csv_writer is not None:
+                    csv_writer.writerow(_csv_value(row[c]) for c in columns)
+                else:
+                    f.write(json.dumps(row, ensure_ascii=False))
+                    f.write("\n")
+                rows += 1
+        os.replace(temporary, destination)
+    finally:
+        if temporary.exists():
+            temporary.unlink()
+
+    return {
+        "path": str(destination),
+        "format": export_format,
+        "columns": columns,
+        "rows": rows,
+        "bytes": destination.stat().st_size
+    }
+
+
+def _export_row(
+    record: JobRecord,
+    columns: Iterable[str],
+    read_output: Callable[[JobRecord], Optional[str]]
+) -> Dict[str, Any]:
+    """Project a job record onto the selected columns."""
+    row = {}
+    for column in columns:
+        if column == "output":
+            try:
+                row[column] = read_output(record)
+            except (IOError, UnicodeDecodeError):
+                row[column] = None
+        else:
+            row[column] = getattr(record, column)
+    return row
+
+
+def _csv_value(value: Any) -> Any:
+    """Encode nested values as JSON and missing values as empty cells."""
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command-line entry point for exporting job history."""
+    parser = argparse.ArgumentParser(description="Export job history to JSONL or CSV")
+    parser.add_argument(
+        "--outputs-dir",
+        type=Path,
+        default=Path(os.environ.get("OLLAMA_MCP_ROOT", ".")) / "outputs",
+        help="Outputs directory (default: $OLLAMA_MCP_ROOT/outputs)"
+    )
+    parser.add_argument("--format", choices=EXPORT_FORMATS, help="Export format (default: from the file extension)")
+    parser.add_argument(
+        "--columns",
+        help=f"Comma-separated columns (default: {','.join(DEFAULT_EXPORT_COLUMNS)}; also: params,output)"
+    )
+    parser.add_argument("--include-output", action="store_true", help="Include each job's raw output file")
+    parser.add_argument("--state", action="append", dest="states", help="Only export jobs in this state (repeatable)")
+    parser.add_argument("--job-type", help="Only export jobs of this type")
+    parser.add_argument("--model", help="Only export jobs run with this model")
+    parser.add_argument("--batch-id", help="Only export jobs of this batch or workflow run")
+    parser.add_argument("--since", help="Only export jobs created on or after this date (ISO 8601)")
+    parser.add_argument("--until", help="Only export jobs created before this date (ISO 8601)")
+    parser.add_argument("destination", type=Path, help="File to write")
+    args = parser.parse_args(argv)
+
+    export_format = args.format or ("csv" if args.destination.suffix.lower() == ".csv" else "jsonl")
+    store = JobStore(args.outputs_dir / "jobs.db")
+    try:
+        summary = export_jobs(
+            store, args.outputs_dir, args.destination,
+            export_format=export_format,
+            columns=args.columns.split(",") if args.columns else None,
+            include_output=args.include_output,
+            states=args.states,
+            job_type=args.job_type,
+            model=args.model,
+            batch_id=args.batch_id,
+            since=parse_time_filter(args.since),
+            until=parse_time_filter(args.until)
+        )
+    except ValueError as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        return 1
+    finally:
+        store.close()
+
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
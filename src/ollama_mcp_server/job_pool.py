@@ -0,0 +1,136 @@
+"""
+Concurrency limits for subprocess jobs.
+
+Bash commands and fast-agent scripts each get a fixed number of slots.
+Jobs beyond that wait in a per-type queue, highest priority first and in
+submission order within a priority, and are started as slots free up. When
+a queue is full new jobs are refused outright, so a burst of requests gets
+an error back instead of piling up processes on the host.
+"""
+
+import asyncio
+import heapq
+import itertools
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted to a pool whose queue is full."""
+
+
+class JobPool:
+    """Per-job-type slots with a bounded priority queue of waiting jobs."""
+
+    def __init__(self, limits: Dict[str, int], max_queued: int):
+        """
+        Create the pool.
+
+        Args:
+            limits: Maximum number of concurrently running jobs per job type;
+                types not listed (or with a limit of 0) are not limited
+            max_queued: Maximum number of waiting jobs per job type
+        """
+        self.limits = limits
+        self.max_queued = max_queued
+        self._running: Dict[str, int] = {}
+        # Heaps of (-priority, sequence, job_id, future) per job type
+        self._waiting: Dict[str, List[Tuple[int, int, str, asyncio.Future]]] = {}
+        self._sequence = itertools.count()
+
+    def submit(self, job_id: str, job_type: str, priority: int = 0) -> asyncio.Future:
+        """
+        Ask for a slot for a job.
+
+        Args:
+            job_id: The job ID
+            job_type: The job type, which selects the limit
+            priority: Jobs with a higher priority start first
+
+        Returns:
+            A future that is done once the job holds a slot (immediately if one
+            is free); the holder must call release() when the job ends
+
+        Raises:
+            QueueFullError: If the job would have to wait and the queue is full
+        """
+        future = asyncio.get_running_loop().create_future()
+        limit = self.limits.get(job_type) or 0
+        waiting = self._waiting.setdefault(job_type, [])
+        if not limit or (self._running.get(job_type, 0) < limit and not waiting):
+            self._running[job_type] = self._running.get(job_type, 0) + 1
+            future.set_result(None)
+            return future
+        if len(waiting) >= self.max_queued:
+            raise QueueFullError(
+                f"Too many {job_type} jobs waiting ({len(waiting)}, limit {self.max_queued}); try again later"
+            )
+        heapq.heappush(waiting, (-priority, next(self._sequence), job_id, future))
+        return future
+
+    def release(self, job_type: str) -> None:
+        """
+        Give a slot back and start the next waiting job of the same type.
+
+        Args:
+            job_type: The job type of the finished job
+        """
+        self._running[job_type] = max(self._running.get(job_type, 0) - 1, 0)
+        waiting = self._waiting.get(job_type, [])
+        while waiting:
+            _, _, _, future = heapq.heappop(waiting)
+            if not future.done():
+                self._running[job_type] += 1
+                future.set_result(None)
+                return
+
+    def withdraw(self, job_id: str) -> bool:
+        """
+        Remove a waiting job from its queue.
+
+        Args:
+            job_id: The job ID
+
+        Returns:
+            True if the job was waiting and has been removed
+        """
+        for waiting in self._waiting.values():
+            for index, entry in enumerate(waiting):
+                if entry[2] == job_id:
+                    waiting.pop(index)
+                    heapq.heapify(waiting)
+                    entry[3].cancel()
+                    return True
+        return False
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        """
+        Position of a waiting job in its queue.
+
+        Args:
+            job_id: The job ID
+
+        Returns:
+            1 for the next job to start, or None if the job is not waiting
+        """
+        for waiting in self._waiting.values():
+            for entry in waiting:
+                if entry[2] == job_id:
+                    return sum(1 for other in waiting if other[:2] <= entry[:2])
+        return None
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Running and waiting job counts per job type.
+
+        Returns:
+            Dict mapping each job type to its limit and running/queued counts
+        """
+        job_types = set(self.limits) | set(self._running)
+        return {
+            job_type: {
+                "limit": self.limits.get(job_type) or None,
+                "running": self._running.get(job_type, 0),
+                "queued": len(self._waiting.get(job_type, [])),
+            }
+            for job_type in sorted(job_types)
+        }
@@ -0,0 +1,200 @@
+"""
+Pre-aggregated job statistics.
+
+Each finished job is folded into an hourly rollup row keyed by job type,
+model and client, so analytics queries read a few rows per hour of history
+instead of every job. Latencies are kept as log-scale histograms, which can
+be merged across rows and still give percentiles to within one bucket
+(about 10%).
+"""
+
+import math
+from typing import Any, Dict, Iterable, List, Optional
+
+# Width of a rollup bucket in seconds
+ROLLUP_BUCKET_SECONDS = 3600
+
+# Histogram buckets grow geometrically from HISTOGRAM_MIN seconds
+HISTOGRAM_MIN = 0.01
+HISTOGRAM_GROWTH = 1.1
+
+# Final states that count as errors in the error rate
+ERROR_STATES = {"failed", "timed_out", "stalled"}
+
+# Percentiles reported for latency and time-to-first-token
+REPORTED_PERCENTILES = (50, 90, 95, 99)
+
+
+def bucket_start(timestamp: float) -> int:
+    """
+    Start of the rollup bucket containing a timestamp.
+
+    Args:
+        timestamp: Unix timestamp
+
+    Returns:
+        Unix timestamp of the bucket start
+    """
+    return int(timestamp // ROLLUP_BUCKET_SECONDS) * ROLLUP_BUCKET_SECONDS
+
+
+def histogram_index(value: float) -> int:
+    """
+    Histogram bucket holding a duration.
+
+    Args:
+        value: Duration in seconds
+
+    Returns:
+        Bucket index (0 for anything at or below HISTOGRAM_MIN)
+    """
+    if value <= HISTOGRAM_MIN:
+        return 0
+    return math.ceil(math.log(value / HISTOGRAM_MIN, HISTOGRAM_GROWTH))
+
+
+def histogram_upper_bound(index: int) -> float:
+    """
+    Largest duration that falls into a histogram bucket.
+
+    Args:
+        index: Bucket index
+
+    Returns:
+        Upper bound of the bucket in seconds
+    """
+    return HISTOGRAM_MIN * HISTOGRAM_GROWTH ** index
+
+
+def merge_histograms(histograms: Iterable[Dict[str, int]]) -> Dict[int, int]:
+    """
+    Add up histograms stored as {bucket index: count}.
+
+    Args:
+        histograms: Histograms to merge (keys may be strings, as stored in JSON)
+
+    Returns:
+        The merged histogram
+    """
+    merged: Dict[int, int] = {}
+    for histogram in histograms:
+        for index, count in histogram.items():
+            merged[int(index)] = merged.get(int(index), 0) + count
+    return merged
+
+
+def histogram_percentile(histogram: Dict[int, int], percentile: float) -> Optional[float]:
+    """
+    Estimate a percentile from a histogram.
+
+    Args:
+        histogram: Histogram as {bucket index: count}
+        percentile: Percentile between 0 and 100
+
+    Returns:
+        Upper bound of the bucket holding the percentile, or None if the histogram is empty
+    """
+    total = sum(histogram.values())
+    if not total:
+        return None
+    rank = percentile / 100.0 * total
+    seen = 0
+    for index in sorted(histogram):
+        seen += histogram[index]
+        if seen >= rank:
+            return round(histogram_upper_bound(index), 3)
+    return round(histogram_upper_bound(max(histogram)), 3)
+
+
+def job_rollup_values(
+    state: str,
+    exit_code: Optional[int],
+    created_at: float,
+    finished_at: Optional[float],
+    metadata: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Measurements a finished job contributes to its rollup row.
+
+    Args:
+        state: Final job state
+        exit_code: Process exit code, if any
+        created_at: When the job was created
+        finished_at: When the job finished
+        metadata: Job metadata (token counts, TTFT and duration for generations,
+            resource usage for subprocess jobs)
+
+    Returns:
+        Dict of counters and optional latency/TTFT/token/resource measurements
+    """
+    resources = metadata.get("resources") or {}
+    values: Dict[str, Any] = {
+        "error": state in ERROR_STATES or (state == "completed" and exit_code not in (None, 0)),
+        "cancelled": state == "cancelled",
+        "latency": finished_at - created_at if finished_at else None,
+        "ttft": metadata.get("ttft_seconds"),
+        "tokens_in": metadata.get("prompt_tokens") or 0,
+        "tokens_out": metadata.get("tokens_generated") or 0,
+        "decode_seconds": None,
+        "measured": bool(resources),
+        "cpu_user_seconds": resources.get("cpu_user_seconds") or 0.0,
+        "cpu_system_seconds": resources.get("cpu_system_seconds") or 0.0,
+        "max_rss_bytes": resources.get("max_rss_bytes") or 0,
+        "io_read_blocks": resources.get("io_read_blocks") or 0,
+        "io_write_blocks": resources.get("io_write_blocks") or 0,
+    }
+    duration = metadata.get("duration_seconds")
+    if values["tokens_out"] and duration:
+        values["decode_seconds"] = max(duration - (values["ttft"] or 0.0), 0.0)
+    return values
+
+
+def summarize_rollups(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Combine rollup rows into one set of statistics.
+
+    Args:
+        rows: Rollup rows with decoded histograms
+
+    Returns:
+        Dict with counts, error rate, latency and TTFT percentiles, token totals,
+        tok/s and the resource usage of subprocess jobs
+    """
+    jobs = sum(row["jobs"] for row in rows)
+    errors = sum(row["errors"] for row in rows)
+    latency = merge_histograms(row["latency_hist"] for row in rows)
+    ttft = merge_histograms(row["ttft_hist"] for row in rows)
+    latency_count = sum(latency.values())
+    ttft_count = sum(ttft.values())
+    tokens_out = sum(row["tokens_out"] for row in rows)
+    decode_tokens = sum(row["decode_tokens"] for row in rows)
+    decode_seconds = sum(row["decode_seconds"] for row in rows)
+    measured_jobs = sum(row["measured_jobs"] for row in rows)
+    cpu_seconds = sum(row["cpu_user_seconds"] + row["cpu_system_seconds"] for row in rows)
+
+    return {
+        "count": jobs,
+        "errors": errors,
+        "cancelled": sum(row["cancelled"] for row in rows),
+        "error_rate": round(errors / jobs, 4) if jobs else 0.0,
+        "latency_seconds": {
+            "mean": round(sum(row["latency_sum"] for row in rows) / latency_count, 3) if latency_count else None,
+            **{f"p{p}": histogram_percentile(latency, p) for p in REPORTED_PERCENTILES},
+        },
+        "ttft_seconds": {
+            "mean": round(sum(row["ttft_sum"] for row in rows) / ttft_count, 3) if ttft_count else None,
+            **{f"p{p}": histogram_percentile(ttft, p) for p in REPORTED_PERCENTILES},
+        },
+        "tokens_in": sum(row["tokens_in"] for row in rows),
+        "tokens_out": tokens_out,
+        "tokens_per_second": round(decode_tokens / decode_seconds, 2) if decode_seconds else None,
+        "resources": {
+            "measured_jobs": measured_jobs,
+            "cpu_user_seconds": round(sum(row["cpu_user_seconds"] for row in rows), 3),
+            "cpu_system_seconds": round(sum(row["cpu_system_seconds"] for row in rows), 3),
+            "cpu_seconds_mean": round(cpu_seconds / measured_jobs, 3) if measured_jobs else None,
+            "max_rss_bytes": max((row["max_rss_bytes"] for row in rows), default=0) if measured_jobs else None,
+            "io_read_blocks": sum(row["io_read_blocks"] for row in rows),
+            "io_write_blocks": sum(row["io_write_blocks"] for row in rows),
+        },
+    }
@@ -0,0 +1,833 @@
+"""
+Durable job state tracking for the Ollama MCP Server.
+
+Every job (Ollama prompt, bash command, fast-agent script, workflow) gets a
+row in a small SQLite database that lives next to the output files. The row
+is rewritten on every state transition, so a restarted server can tell which
+jobs were interrupted and decide what to do with them.
+
+The same database holds a full-text (FTS5) index of finished jobs' prompts
+and outputs, used by the search_jobs tool, and hourly rollups of finished
+jobs used by the job_stats tool.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    from .job_rollups import bucket_start, histogram_index, job_rollup_values, summarize_rollups
+except ImportError:
+    from job_rollups import bucket_start, histogram_index, job_rollup_values, summarize_rollups
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+# Generations stopped by one of their limits
+TIMED_OUT = "timed_out"
+STALLED = "stalled"
+TOKEN_LIMIT = "token_limit"
+
+TERMINAL_STATES = {COMPLETED, FAILED, CANCELLED, TIMED_OUT, STALLED, TOKEN_LIMIT}
+
+# RUNNING -> QUEUED is only used to hand a resumable job back to the queue
+# when the server shuts down or restarts underneath it.
+ALLOWED_TRANSITIONS: Dict[str, set] = {
+    QUEUED: {RUNNING, FAILED, CANCELLED},
+    RUNNING: {COMPLETED, FAILED, CANCELLED, QUEUED, TIMED_OUT, STALLED, TOKEN_LIMIT},
+    COMPLETED: set(),
+    FAILED: set(),
+    CANCELLED: set(),
+    TIMED_OUT: set(),
+    STALLED: set(),
+    TOKEN_LIMIT: set(),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    job_type TEXT NOT NULL,
+    state TEXT NOT NULL,
+    output_file TEXT,
+    model TEXT,
+    batch_id TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    exit_code INTEGER,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    params TEXT NOT NULL DEFAULT '{}',
+    metadata TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state);
+CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs (created_at);
+"""
+
+# Columns added after the first release, created on existing databases at open
+_ADDED_COLUMNS = {
+    "batch_id": "TEXT",
+}
+
+# Full-text index of finished jobs. Search rows are keyed by doc_id, an
+# INTEGER PRIMARY KEY, so their rowids survive a VACUUM.
+_SEARCH_SCHEMA = """
+CREATE TABLE IF NOT EXISTS job_search_docs (
+    doc_id INTEGER PRIMARY KEY,
+    job_id TEXT NOT NULL UNIQUE,
+    indexed_at REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS job_search USING fts5(
+    prompt, system_prompt, output, tokenize = 'porter unicode61'
+);
+"""
+
+# Hourly aggregates of finished jobs; histograms are JSON {bucket index: count}
+_ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS job_rollups (
+    bucket_start INTEGER NOT NULL,
+    job_type TEXT NOT NULL,
+    model TEXT NOT NULL DEFAULT '',
+    client TEXT NOT NULL DEFAULT '',
+    jobs INTEGER NOT NULL DEFAULT 0,
+    errors INTEGER NOT NULL DEFAULT 0,
+    cancelled INTEGER NOT NULL DEFAULT 0,
+    latency_sum REAL NOT NULL DEFAULT 0,
+    latency_hist TEXT NOT NULL DEFAULT '{}',
+    ttft_sum REAL NOT NULL DEFAULT 0,
+    ttft_hist TEXT NOT NULL DEFAULT '{}',
+    tokens_in INTEGER NOT NULL DEFAULT 0,
+    tokens_out INTEGER NOT NULL DEFAULT 0,
+    decode_tokens INTEGER NOT NULL DEFAULT 0,
+    decode_seconds REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket_start, job_type, model, client)
+);
+"""
+
+# Rollup columns added after the first release, created on existing databases at open
+_ADDED_ROLLUP_COLUMNS = {
+    "measured_jobs": "INTEGER NOT NULL DEFAULT 0",
+    "cpu_user_seconds": "REAL NOT NULL DEFAULT 0",
+    "cpu_system_seconds": "REAL NOT NULL DEFAULT 0",
+    "max_rss_bytes": "INTEGER NOT NULL DEFAULT 0",
+    "io_read_blocks": "INTEGER NOT NULL DEFAULT 0",
+    "io_write_blocks": "INTEGER NOT NULL DEFAULT 0",
+}
+
+# Dimensions job_stats can group by, mapped to rollup columns
+ROLLUP_GROUPS = {"model": "model", "job_type": "job_type", "client": "client"}
+
+# bm25 column weights for prompt, system prompt and output
+_SEARCH_WEIGHTS = (2.0, 0.5, 1.0)
+
+# Stay well below SQLite's limit on bound parameters per statement
+_MAX_QUERY_PARAMS = 500
+
+
+def parse_time_filter(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a date/time filter given as an ISO 8601 string or a Unix timestamp.
+
+    Args:
+        value: e.g. "2026-10-01", "2026-10-01T12:00:00" or "1790000000"
+
+    Returns:
+        Unix timestamp, or None if no filter was given
+
+    Raises:
+        ValueError: If the value cannot be parsed
+    """
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class InvalidTransitionError(ValueError):
+    """Raised when a job is moved to a state it cannot reach from its current one."""
+
+
+@dataclass
+class JobRecord:
+    """A single persisted job."""
+
+    job_id: str
+    job_type: str
+    state: str
+    output_file: Optional[str]
+    created_at: float
+    updated_at: float
+    model: Optional[str] = None
+    batch_id: Optional[str] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    exit_code: Optional[int] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    params: Dict[str, Any] = field(default_factory=dict)
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def is_terminal(self) -> bool:
+        """Whether the job has reached a final state."""
+        return self.state in TERMINAL_STATES
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the record as a plain dict (without launch parameters)."""
+        data = asdict(self)
+        data.pop("params", None)
+        return data
+
+
+class JobStore:
+    """SQLite-backed store of job records and their state transitions."""
+
+    def __init__(self, db_path: Path):
+        """
+        Open (or create) the job database.
+
+        Args:
+            db_path: Path of the SQLite database file
+        """
+        self.db_path = Path(db_path)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        # WAL keeps every committed transition durable across a process crash
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        existing = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, column_type in _ADDED_COLUMNS.items():
+            if column not in existing:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_batch_id ON jobs (batch_id)")
+        has_rollups = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'job_rollups'"
+        ).fetchone()
+        self._conn.executescript(_ROLLUP_SCHEMA)
+        existing = {row["name"] for row in self._conn.execute("PRAGMA table_info(job_rollups)")}
+        for column, column_type in _ADDED_ROLLUP_COLUMNS.items():
+            if column not in existing:
+                self._conn.execute(f"ALTER TABLE job_rollups ADD COLUMN {column} {column_type}")
+        if not has_rollups:
+            # First open since rollups were introduced: aggregate existing history
+            self.rebuild_rollups()
+        try:
+            self._conn.executescript(_SEARCH_SCHEMA)
+            self.search_available = True
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5
+            self.search_available = False
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _row_to_record(row: sqlite3.Row) -> JobRecord:
+        data = dict(row)
+        data["params"] = json.loads(data["params"] or "{}")
+        data["metadata"] = json.loads(data["metadata"] or "{}")
+        return JobRecord(**data)
+
+    def create(
+        self,
+        job_id: str,
+        job_type: str,
+        output_file: Optional[Path],
+        params: Optional[Dict[str, Any]] = None,
+        model: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        batch_id: Optional[str] = None
+    ) -> JobRecord:
+        """
+        Persist a new job in the queued state.
+
+        Args:
+            job_id: Unique job identifier
+            job_type: Kind of job ("ollama", "bash", "fastagent", "workflow")
+            output_file: Path of the job's output file
+            params: Everything needed to (re)launch the job
+            model: Ollama model name, if any
+            metadata: Free-form metadata to store with the job
+            batch_id: Batch or workflow run the job belongs to, if any
+
+        Returns:
+            The newly created job record
+        """
+        now = time.time()
+        record = JobRecord(
+            job_id=job_id,
+            job_type=job_type,
+            state=QUEUED,
+            output_file=str(output_file) if output_file else None,
+            created_at=now,
+            updated_at=now,
+            model=model,
+            batch_id=batch_id,
+            params=params or {},
+            metadata=metadata or {}
+        )
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, job_type, state, output_file, model, batch_id, "
+                "created_at, updated_at, params, metadata) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    record.job_id, record.job_type, record.state, record.output_file,
+                    record.model, record.batch_id, record.created_at, record.updated_at,
+                    json.dumps(record.params), json.dumps(record.metadata)
+                )
+            )
+        return record
+
+    def get(self, job_id: str) -> Optional[JobRecord]:
+        """
+        Look up a job by ID.
+
+        Args:
+            job_id: The job identifier
+
+        Returns:
+            The job record, or None if the job is unknown
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._row_to_record(row) if row else None
+
+    def get_many(self, job_ids: Iterable[str]) -> Dict[str, JobRecord]:
+        """
+        Look up many jobs at once.
+
+        Args:
+            job_ids: The job identifiers
+
+        Returns:
+            Dict mapping each known job ID to its record (unknown IDs are omitted)
+        """
+        job_ids = list(dict.fromkeys(job_ids))
+        records: Dict[str, JobRecord] = {}
+        for start in range(0, len(job_ids), _MAX_QUERY_PARAMS):
+            chunk = job_ids[start:start + _MAX_QUERY_PARAMS]
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT * FROM jobs WHERE job_id IN ({', '.join('?' for _ in chunk)})", chunk
+                ).fetchall()
+            for row in rows:
+                record = self._row_to_record(row)
+                records[record.job_id] = record
+        return records
+
+    def list_jobs(
+        self,
+        states: Optional[Iterable[str]] = None,
+        batch_id: Optional[str] = None
+    ) -> List[JobRecord]:
+        """
+        List jobs, oldest first.
+
+        Args:
+            states: Only return jobs in one of these states
+            batch_id: Only return jobs belonging to this batch or workflow run
+
+        Returns:
+            List of job records
+        """
+        query = "SELECT * FROM jobs"
+        conditions: List[str] = []
+        args: List[Any] = []
+        if states is not None:
+            states = list(states)
+            conditions.append(f"state IN ({', '.join('?' for _ in states)})")
+            args.extend(states)
+        if batch_id is not None:
+            conditions.append("batch_id = ?")
+            args.append(batch_id)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY created_at"
+        with self._lock:
+            rows = self._conn.execute(query, args).fetchall()
+        return [self._row_to_record(row) for row in rows]
+
+    def iter_jobs(
+        self,
+        states: Optional[Iterable[str]] = None,
+        job_type: Optional[str] = None,
+        model: Optional[str] = None,
+        batch_id: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        page_size: int = 500
+    ) -> Iterator[JobRecord]:
+        """
+        Iterate over matching jobs, oldest first, one page at a time.
+
+        Pages are fetched with keyset pagination, so memory use stays constant
+        and the lock is only held while a page is read.
+
+        Args:
+            states: Only return jobs in one of these states
+            job_type: Only return jobs of this type
+            model: Only return jobs run with this model
+            batch_id: Only return jobs belonging to this batch or workflow run
+            since: Only return jobs created at or after this Unix timestamp
+            until: Only return jobs created before this Unix timestamp
+            page_size: Number of rows fetched per query
+
+        Yields:
+            Job records
+        """
+        conditions: List[str] = []
+        args: List[Any] = []
+        if states is not None:
+            states = list(states)
+            conditions.append(f"state IN ({', '.join('?' for _ in states)})")
+            args.extend(states)
+        for condition, value in (
+            ("job_type = ?", job_type),
+            ("model = ?", model),
+            ("batch_id = ?", batch_id),
+            ("created_at >= ?", since),
+            ("created_at < ?", until),
+        ):
+            if value is not None:
+                conditions.append(condition)
+                args.append(value)
+
+        after: Tuple[Any, ...] = (float("-inf"), "")
+        while True:
+            where = " AND ".join(conditions + ["(created_at, job_id) > (?, ?)"])
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT * FROM jobs WHERE {where} ORDER BY created_at, job_id LIMIT ?",
+                    (*args, *after, page_size)
+                ).fetchall()
+            for row in rows:
+                yield self._row_to_record(row)
+            if len(rows) < page_size:
+                return
+            after = (rows[-1]["created_at"], rows[-1]["job_id"])
+
+    def transition(
+        self,
+        job_id: str,
+        new_state: str,
+        error: Optional[str] = None,
+        exit_code: Optional[int] = None,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> JobRecord:
+        """
+        Move a job to a new state and persist the change immediately.
+
+        Args:
+            job_id: The job identifier
+            new_state: Target state
+            error: Error message to record (for failed/cancelled jobs)
+            exit_code: Process exit code, if known
+            metadata: Extra metadata merged into the stored metadata
+
+        Returns:
+            The updated job record
+
+        Raises:
+            KeyError: If the job does not exist
+            InvalidTransitionError: If the transition is not allowed
+        """
+        with self._lock:
+            record = self.get(job_id)
+            if record is None:
+                raise KeyError(job_id)
+            if new_state not in ALLOWED_TRANSITIONS.get(record.state, set()):
+                raise InvalidTransitionError(
+                    f"Job {job_id} cannot move from {record.state} to {new_state}"
+                )
+
+            now = time.time()
+            record.state = new_state
+            record.updated_at = now
+            if new_state == RUNNING:
+                record.started_at = now
+                record.finished_at = None
+                record.error = None
+                record.attempts += 1
+            elif new_state in TERMINAL_STATES:
+                record.finished_at = now
+            if error is not None:
+                record.error = error
+            if exit_code is not None:
+                record.exit_code = exit_code
+            if metadata:
+                record.metadata.update(metadata)
+
+            # The job's final state and its rollup counts are written together
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    "UPDATE jobs SET state = ?, updated_at = ?, started_at = ?, finished_at = ?, "
+                    "exit_code = ?, error = ?, attempts = ?, metadata = ? WHERE job_id = ?",
+                    (
+                        record.state, record.updated_at, record.started_at, record.finished_at,
+                        record.exit_code, record.error, record.attempts,
+                        json.dumps(record.metadata), job_id
+                    )
+                )
+                if new_state in TERMINAL_STATES:
+                    self._add_to_rollup(record)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return record
+
+    def update_metadata(self, job_id: str, **fields: Any) -> None:
+        """
+        Merge fields into a job's stored metadata without changing its state.
+
+        Args:
+            job_id: The job identifier
+            **fields: Metadata keys and values to store
+        """
+        with self._lock:
+            record = self.get(job_id)
+            if record is None:
+                return
+            record.metadata.update(fields)
+            self._conn.execute(
+                "UPDATE jobs SET metadata = ?, updated_at = ? WHERE job_id = ?",
+                (json.dumps(record.metadata), time.time(), job_id)
+            )
+
+    def set_output_file(self, job_id: str, output_file: Path) -> None:
+        """
+        Point a job at a new output file location.
+
+        Args:
+            job_id: The job identifier
+            output_file: New path of the job's output file
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET output_file = ?, updated_at = ? WHERE job_id = ?",
+                (str(output_file), time.time(), job_id)
+            )
+
+    def import_job(
+        self,
+        job_id: str,
+        job_type: str,
+        output_file: Path,
+        created_at: float,
+        finished_at: Optional[float] = None,
+        model: Optional[str] = None
+    ) -> None:
+        """
+        Register a job that finished before the job store existed.
+
+        Args:
+            job_id: The job identifier
+            job_type: Kind of job ("ollama", "bash", "fastagent", "workflow")
+            output_file: Path of the job's output file
+            created_at: When the job was created
+            finished_at: When the job finished, if known
+            model: Ollama model name, if any
+        """
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                inserted = self._conn.execute(
+                    "INSERT OR IGNORE INTO jobs (job_id, job_type, state, output_file, model, "
+                    "created_at, updated_at, finished_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        job_id, job_type, COMPLETED, str(output_file), model,
+                        created_at, time.time(), finished_at
+                    )
+                ).rowcount
+                if inserted:
+                    self._add_to_rollup(self.get(job_id))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def count_by_state(self) -> Dict[str, int]:
+        """
+        Count jobs in each state.
+
+        Returns:
+            Dict mapping state to number of jobs
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return {row[0]: row[1] for row in rows}
+
+    def _add_to_rollup(self, record: JobRecord) -> None:
+        """Fold a finished job into its hourly rollup row (caller holds the lock)."""
+        values = job_rollup_values(
+            record.state, record.exit_code, record.created_at, record.finished_at, record.metadata
+        )
+        key = (
+            bucket_start(record.finished_at or record.updated_at),
+            record.job_type, record.model or "", record.metadata.get("client") or ""
+        )
+        row = self._conn.execute(
+            "SELECT latency_hist, ttft_hist FROM job_rollups "
+            "WHERE bucket_start = ? AND job_type = ? AND model = ? AND client = ?",
+            key
+        ).fetchone()
+        latency_hist = json.loads(row["latency_hist"]) if row else {}
+        ttft_hist = json.loads(row["ttft_hist"]) if row else {}
+        for histogram, value in ((latency_hist, values["latency"]), (ttft_hist, values["ttft"])):
+            if value is not None:
+                index = str(histogram_index(value))
+                histogram[index] = histogram.get(index, 0) + 1
+
+        decode_seconds = values["decode_seconds"]
+        self._conn.execute(
+            "INSERT INTO job_rollups (bucket_start, job_type, model, client, jobs, errors, cancelled, "
+            "latency_sum, latency_hist, ttft_sum, ttft_hist, tokens_in, tokens_out, decode_tokens, "
+            "decode_seconds, measured_jobs, cpu_user_seconds, cpu_system_seconds, max_rss_bytes, "
+            "io_read_blocks, io_write_blocks) "
+            "VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (bucket_start, job_type, model, client) DO UPDATE SET "
+            "jobs = jobs + 1, errors = errors + excluded.errors, cancelled = cancelled + excluded.cancelled, "
+            "latency_sum = latency_sum + excluded.latency_sum, latency_hist = excluded.latency_hist, "
+            "ttft_sum = ttft_sum + excluded.ttft_sum, ttft_hist = excluded.ttft_hist, "
+            "tokens_in = tokens_in + excluded.tokens_in, tokens_out = tokens_out + excluded.tokens_out, "
+            "decode_tokens = decode_tokens + excluded.decode_tokens, "
+            "decode_seconds = decode_seconds + excluded.decode_seconds, "
+            "measured_jobs = measured_jobs + excluded.measured_jobs, "
+            "cpu_user_seconds = cpu_user_seconds + excluded.cpu_user_seconds, "
+            "cpu_system_seconds = cpu_system_seconds + excluded.cpu_system_seconds, "
+            "max_rss_bytes = MAX(max_rss_bytes, excluded.max_rss_bytes), "
+            "io_read_blocks = io_read_blocks + excluded.io_read_blocks, "
+            "io_write_blocks = io_write_blocks + excluded.io_write_blocks",
+            (
+                *key, int(values["error"]), int(values["cancelled"]),
+                values["latency"] or 0.0, json.dumps(latency_hist),
+                values["ttft"] or 0.0, json.dumps(ttft_hist),
+                values["tokens_in"], values["tokens_out"],
+                values["tokens_out"] if decode_seconds is not None else 0,
+                decode_seconds or 0.0,
+                int(values["measured"]), values["cpu_user_seconds"], values["cpu_system_seconds"],
+                values["max_rss_bytes"], values["io_read_blocks"], values["io_write_blocks"]
+            )
+        )
+
+    def rebuild_rollups(self) -> None:
+        """Recompute all rollup rows from the finished jobs in the database."""
+        states = sorted(TERMINAL_STATES)
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute("DELETE FROM job_rollups")
+                cursor = self._conn.execute(
+                    f"SELECT * FROM jobs WHERE state IN ({', '.join('?' for _ in states)})", states
+                )
+                for row in cursor.fetchall():
+                    self._add_to_rollup(self._row_to_record(row))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def rollup_stats(
+        self,
+        since: float,
+        until: float,
+        group_by: Optional[str] = None,
+        job_type: Optional[str] = None,
+        model: Optional[str] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Aggregate statistics of jobs that finished in a time window.
+
+        The window is widened to whole rollup buckets (hours).
+
+        Args:
+            since: Start of the window (Unix timestamp)
+            until: End of the window (Unix timestamp)
+            group_by: "model", "job_type" or "client", or None for a single total
+            job_type: Only include jobs of this type
+            model: Only include jobs run with this model
+
+        Returns:
+            Dict mapping each group (or "all") to its statistics
+        """
+        if group_by is not None and group_by not in ROLLUP_GROUPS:
+            raise ValueError(f"Cannot group by {group_by!r}; expected one of {', '.join(ROLLUP_GROUPS)}")
+
+        query = "SELECT * FROM job_rollups WHERE bucket_start >= ? AND bucket_start < ?"
+        args: List[Any] = [bucket_start(since), until]
+        if job_type is not None:
+            query += " AND job_type = ?"
+            args.append(job_type)
+        if model is not None:
+            query += " AND model = ?"
+            args.append(model)
+        with self._lock:
+            rows = self._conn.execute(query, args).fetchall()
+
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            data = dict(row)
+            data["latency_hist"] = json.loads(data["latency_hist"])
+            data["ttft_hist"] = json.loads(data["ttft_hist"])
+            key = (data[ROLLUP_GROUPS[group_by]] or "unknown") if group_by else "all"
+            groups.setdefault(key, []).append(data)
+        return {key: summarize_rollups(group_rows) for key, group_rows in sorted(groups.items())}
+
+    def index_search_document(self, job_id: str, prompt: str, system_prompt: str, output: str) -> None:
+        """
+        Add a job to the full-text index, replacing any earlier entry.
+
+        Args:
+            job_id: The job identifier
+            prompt: Prompt (or command) text
+            system_prompt: System prompt text
+            output: Cleaned output text
+        """
+        if not self.search_available:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                row = self._conn.execute(
+                    "SELECT doc_id FROM job_search_docs WHERE job_id = ?", (job_id,)
+                ).fetchone()
+                if row:
+                    doc_id = row[0]
+                    self._conn.execute("DELETE FROM job_search WHERE rowid = ?", (doc_id,))
+                    self._conn.execute(
+                        "UPDATE job_search_docs SET indexed_at = ? WHERE doc_id = ?", (time.time(), doc_id)
+                    )
+                else:
+                    doc_id = self._conn.execute(
+                        "INSERT INTO job_search_docs (job_id, indexed_at) VALUES (?, ?)", (job_id, time.time())
+                    ).lastrowid
+                self._conn.execute(
+                    "INSERT INTO job_search (rowid, prompt, system_prompt, output) VALUES (?, ?, ?, ?)",
+                    (doc_id, prompt, system_prompt, output)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def unindexed_jobs(self, limit: int = 100) -> List[JobRecord]:
+        """
+        List finished jobs that are not in the full-text index yet, newest first.
+
+        Args:
+            limit: Maximum number of jobs to return
+
+        Returns:
+            List of job records
+        """
+        if not self.search_available:
+            return []
+        states = sorted(TERMINAL_STATES)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT jobs.* FROM jobs LEFT JOIN job_search_docs d ON d.job_id = jobs.job_id "
+                f"WHERE d.job_id IS NULL AND jobs.state IN ({', '.join('?' for _ in states)}) "
+                "ORDER BY jobs.created_at DESC LIMIT ?",
+                (*states, limit)
+            ).fetchall()
+        return [self._row_to_record(row) for row in rows]
+
+    def search(
+        self,
+        query: str,
+        model: Optional[str] = None,
+        job_type: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        limit: int = 20,
+        highlight: Tuple[str, str] = ("**", "**")
+    ) -> List[Dict[str, Any]]:
+        """
+        Full-text search over indexed jobs, best matches first.
+
+        Args:
+            query: FTS5 query; plain words are matched as-is if the query is not valid FTS5 syntax
+            model: Only return jobs run with this model
+            job_type: Only return jobs of this type
+            since: Only return jobs created at or after this Unix timestamp
+            until: Only return jobs created before this Unix timestamp
+            limit: Maximum number of results
+            highlight: Markers placed around matched terms in snippets
+
+        Returns:
+            List of dicts with job fields, a relevance score and a highlighted snippet
+
+        Raises:
+            RuntimeError: If SQLite was built without FTS5
+        """
+        if not self.search_available:
+            raise RuntimeError("Full-text search requires SQLite with FTS5")
+
+        conditions = ["job_search MATCH ?"]
+        args: List[Any] = []
+        for condition, value in (
+            ("jobs.model = ?", model),
+            ("jobs.job_type = ?", job_type),
+            ("jobs.created_at >= ?", since),
+            ("jobs.created_at < ?", until),
+        ):
+            if value is not None:
+                conditions.append(condition)
+                args.append(value)
+
+        sql = (
+            "SELECT jobs.job_id, jobs.job_type, jobs.state, jobs.model, jobs.created_at, "
+            f"bm25(job_search, {', '.join(str(w) for w in _SEARCH_WEIGHTS)}) AS score, "
+            "snippet(job_search, -1, ?, ?, '...', 16) AS snippet "
+            "FROM job_search "
+            "JOIN job_search_docs d ON d.doc_id = job_search.rowid "
+            "JOIN jobs ON jobs.job_id = d.job_id "
+            f"WHERE {' AND '.join(conditions)} "
+            "ORDER BY score LIMIT ?"
+        )
+
+        def run(match: str) -> List[sqlite3.Row]:
+            with self._lock:
+                return self._conn.execute(sql, (*highlight, match, *args, limit)).fetchall()
+
+        try:
+            rows = run(query)
+        except sqlite3.OperationalError:
+            # Not valid FTS5 syntax (e.g. stray quotes or operators): match the words literally
+            words = query.split()
+            if not words:
+                return []
+            rows = run(" ".join('"' + word.replace('"', '""') + '"' for word in words))
+
+        return [
+            {
+                "job_id": row["job_id"],
+                "job_type": row["job_type"],
+                "state": row["state"],
+                "model": row["model"],
+                "created_at": row["created_at"],
+                # bm25 scores are negative; flip them so higher is better
+                "score": round(-row["score"], 4),
+                "snippet": row["snippet"]
+            }
+            for row in rows
+        ]
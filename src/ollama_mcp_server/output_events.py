@@ -0,0 +1,322 @@
+"""
+Timestamped output events for subprocess jobs.
+
+A job's output file holds stdout and stderr together as plain text, with
+nothing to say when each line arrived. Alongside it, ``OutputEventLog``
+records every line as a JSON event carrying the time it was read (seconds
+since the job started, from the monotonic clock) and the stream it came
+from::
+
+    {"t": 12.407, "stream": "stderr", "text": "warning: unused variable"}
+
+When the job ends a final ``{"t": ..., "end": true, ...}`` record gives the
+run's duration. ``summarize_events`` reads the log back to find the longest
+silences between lines and to bucket the run into a coarse timeline, so
+slow builds and agent runs can be profiled after the fact.
+
+Event logs sit next to the output file as ``<job file>.events.jsonl``.
+Lines are stored raw (escape codes included) and cut at MAX_EVENT_TEXT
+characters; past MAX_EVENTS events a job's further lines are only counted.
+"""
+
+import codecs
+import heapq
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from .output_cleaning import clean_ansi_escape_codes
+except ImportError:
+    from output_cleaning import clean_ansi_escape_codes
+
+# Event logs are named after the output file with this suffix in place of .txt
+EVENTS_SUFFIX = ".events.jsonl"
+
+# Most events recorded per job; later lines are counted as dropped
+MAX_EVENTS = 200_000
+
+# Characters of each line kept in its event
+MAX_EVENT_TEXT = 500
+
+# Flush recorded events to disk at least this often (seconds) while output arrives
+EVENT_FLUSH_INTERVAL = 0.5
+
+# Characters of a line shown next to a gap or timeline bucket in summaries
+SUMMARY_TEXT_CHARS = 200
+
+
+def events_path(output_file: Path) -> Path:
+    """
+    Path of the event log kept next to a job's output file.
+
+    Args:
+        output_file: The job's output file
+
+    Returns:
+        The event log path
+    """
+    output_file = Path(output_file)
+    return output_file.with_name(output_file.stem + EVENTS_SUFFIX)
+
+
+class OutputEventLog:
+    """Line-by-line, timestamped record of one job's output streams."""
+
+    def __init__(self, path: Path, started: Optional[float] = None):
+        """
+        Open the event log for writing.
+
+        Args:
+            path: Path of the event log (see events_path)
+            started: time.monotonic() value that event times are relative to
+                (defaults to now)
+        """
+        self.path = Path(path)
+        self.started = time.monotonic() if started is None else started
+        self.events = 0
+        self.dropped = 0
+
+        self._file = open(self.path, "w", encoding="utf-8")
+        self._last_flush = self.started
+        # Start of the unfinished last line and when its latest text arrived, per stream
+        self._pending: Dict[str, Tuple[str, float]] = {}
+        self._decoders: Dict[str, Any] = {}
+
+    def decode(self, stream: str, data: bytes) -> str:
+        """
+        Decode a chunk of a stream's raw output.
+
+        Each stream has its own incremental decoder, so multi-byte characters
+        split across chunks survive when the streams' chunks interleave.
+
+        Args:
+            stream: Stream name ("stdout" or "stderr")
+            data: Raw UTF-8 bytes
+
+        Returns:
+            The decoded text (may be empty)
+        """
+        decoder = self._decoders.get(stream)
+        if decoder is None:
+            decoder = self._decoders[stream] = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        return decoder.decode(data)
+
+    def record(self, stream: str, text: str, now: Optional[float] = None) -> None:
+        """
+        Record a chunk of a stream's output, one event per completed line.
+
+        A line's event carries the time its newline was read.
+
+        Args:
+            stream: Stream name ("stdout" or "stderr")
+            text: Decoded output text
+            now: time.monotonic() value the chunk was read at (defaults to now)
+        """
+        if self._file.closed or not text:
+            return
+        now = time.monotonic() if now is None else now
+        lines = text.split("\n")
+        rest = lines.pop()
+        pending = self._pending.pop(stream, None)
+
+        if lines:
+            if pending is not None:
+                lines[0] = pending[0] + lines[0]
+            self._write_events(now, stream, lines)
+        elif pending is not None:
+            rest = pending[0] + rest
+        if rest:
+            # Keep only as much of an unfinished line as its event will hold
+            self._pending[stream] = (rest[:MAX_EVENT_TEXT], now)
+
+        if now - self._last_flush >= EVENT_FLUSH_INTERVAL:
+            self._file.flush()
+            self._last_flush = now
+
+    def _write_events(self, now: float, stream: str, lines: List[str]) -> None:
+        room = MAX_EVENTS - self.events
+        if len(lines) > room:
+            self.dropped += len(lines) - max(room, 0)
+            lines = lines[:max(room, 0)]
+        if not lines:
+            return
+        self.events += len(lines)
+        # Every line of a chunk shares its time and stream, so only the text is encoded per line
+        prefix = f'{{"t": {round(now - self.started, 4)}, "stream": {json.dumps(stream)}, "text": '
+        texts = (json.dumps(line[:MAX_EVENT_TEXT].rstrip("\r"), ensure_ascii=False) for line in lines)
+        self._file.write("".join(f"{prefix}{text}}}\n" for text in texts))
+
+    def close(self, now: Optional[float] = None) -> None:
+        """
+        Record unfinished lines and the end of the run, then close the log.
+
+        Args:
+            now: time.monotonic() value the job ended at (defaults to now)
+        """
+        if self._file.closed:
+            return
+        now = time.monotonic() if now is None else now
+        for stream, decoder in self._decoders.items():
+            tail = decoder.decode(b"", final=True)
+            if tail:
+                self.record(stream, tail, now)
+        for stream, (line, arrived) in sorted(self._pending.items(), key=lambda item: item[1][1]):
+            self._write_events(arrived, stream, [line])
+        self._pending.clear()
+        end = {"t": round(now - self.started, 4), "end": True, "events": self.events, "dropped": self.dropped}
+        self._file.write(json.dumps(end) + "\n")
+        self._file.close()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Event counters, as stored in job metadata.
+
+        Returns:
+            Dict with the number of events recorded and dropped
+        """
+        return {"output_events": self.events, "output_events_dropped": self.dropped}
+
+
+def _snippet(text: Optional[str]) -> Optional[str]:
+    if text is None:
+        return None
+    return clean_ansi_escape_codes(text)[:SUMMARY_TEXT_CHARS] or text.strip()[:SUMMARY_TEXT_CHARS]
+
+
+def summarize_events(
+    path: Path,
+    top_gaps: int = 10,
+    buckets: int = 20,
+    min_gap_seconds: float = 0.0
+) -> Dict[str, Any]:
+    """
+    Profile a job's run from its event log.
+
+    Gaps are measured between consecutive lines of either stream, from the
+    start of the job to its first line and from its last line to the end of
+    the run. The timeline splits the run into equal slices and counts the
+    lines of each stream in every slice.
+
+    Args:
+        path: Path of the event log
+        top_gaps: Number of longest gaps to return
+        buckets: Number of timeline slices
+        min_gap_seconds: Leave out gaps shorter than this
+
+    Returns:
+        Dict with the run's duration, whether it has finished, per-stream
+        line counts, the longest gaps (longest first) and the timeline
+
+    Raises:
+        FileNotFoundError: If the job has no event log
+    """
+    times: List[float] = []
+    streams: List[str] = []
+    per_stream: Dict[str, Dict[str, Any]] = {}
+    gaps: List[Tuple[float, int, Dict[str, Any]]] = []
+    end: Optional[Dict[str, Any]] = None
+
+    previous_t = 0.0
+    previous_text: Optional[str] = None
+
+    def consider_gap(t: float, next_text: Optional[str], next_stream: Optional[str]) -> None:
+        gap = t - previous_t
+        if gap < min_gap_seconds or top_gaps <= 0:
+            return
+        entry = (gap, -len(times), {
+            "start": round(previous_t, 4),
+            "seconds": round(gap, 4),
+            "after": previous_text,
+            "before": next_text,
+            "before_stream": next_stream,
+        })
+        if len(gaps) < top_gaps:
+            heapq.heappush(gaps, entry)
+        elif entry[:2] > gaps[0][:2]:
+            heapq.heapreplace(gaps, entry)
+
+    with open(path, encoding="utf-8") as f:
+        for raw in f:
+            try:
+                event = json.loads(raw)
+            except ValueError:
+                # A line cut short by a crash
+                continue
+            if event.get("end"):
+                end = event
+                continue
+            t = float(event["t"])
+            stream = event.get("stream", "stdout")
+            text = event.get("text", "")
+            consider_gap(t, text, stream)
+
+            counts = per_stream.setdefault(stream, {"lines": 0, "first": t, "last": t})
+            counts["lines"] += 1
+            counts["last"] = t
+            times.append(t)
+            streams.append(stream)
+            previous_t, previous_text = t, text
+
+    duration = end["t"] if end else (times[-1] if times else 0.0)
+    if end:
+        consider_gap(duration, None, None)
+
+    longest = []
+    for _, _, gap in sorted(gaps, reverse=True):
+        gap["after"] = _snippet(gap["after"])
+        gap["before"] = _snippet(gap["before"])
+        longest.append(gap)
+
+    timeline = []
+    if buckets > 0 and duration > 0:
+        width = duration / buckets
+        slices = [
+            {"start": round(i * width, 4), "end": round((i + 1) * width, 4), "lines": {}, "first_line": None}
+            for i in range(buckets)
+        ]
+        first_index: Dict[int, int] = {}
+        for index, (t, stream) in enumerate(zip(times, streams)):
+            slot = min(int(t / width), buckets - 1)
+            lines = slices[slot]["lines"]
+            lines[stream] = lines.get(stream, 0) + 1
+            first_index.setdefault(slot, index)
+        if first_index:
+            # Second pass for the first line of each slice, reading only up to the last one needed
+            wanted = {index: slot for slot, index in first_index.items()}
+            _fill_first_lines(path, wanted, slices)
+        timeline = slices
+
+    return {
+        "finished": end is not None,
+        "duration_seconds": round(duration, 4),
+        "events": len(times),
+        "dropped_events": end.get("dropped", 0) if end else 0,
+        "streams": {
+            name: {"lines": counts["lines"], "first_at": counts["first"], "last_at": counts["last"]}
+            for name, counts in sorted(per_stream.items())
+        },
+        "longest_gaps": longest,
+        "timeline": timeline,
+    }
+
+
+def _fill_first_lines(path: Path, wanted: Dict[int, int], slices: List[Dict[str, Any]]) -> None:
+    """Set each timeline slice's first_line from the events at the given indexes."""
+    last = max(wanted)
+    index = 0
+    with open(path, encoding="utf-8") as f:
+        for raw in f:
+            try:
+                event = json.loads(raw)
+            except ValueError:
+                continue
+            if event.get("end"):
+                continue
+            slot = wanted.get(index)
+            if slot is not None:
+                slices[slot]["first_line"] = _snippet(event.get("text", ""))
+            if index >= last:
+                return
+            index += 1
@@ -0,0 +1,305 @@
+"""
+Sharded on-disk layout for job output files.
+
+Job outputs used to live in one flat directory (``<uuid>.txt``,
+``<uuid>_bash.txt``, ...). New outputs are partitioned by UTC date and a
+hash prefix of the job ID::
+
+    outputs/2026/10/19/3f/<job_id>_bash.txt
+
+Job IDs are time-sortable (UUIDv7 layout), so the shard of a new job can be
+computed from its ID alone. Flat files from older versions are still found
+by the resolver and can be moved into the sharded layout with the migration
+tool, while the server keeps running::
+
+    python -m ollama_mcp_server.output_layout --outputs-dir outputs migrate
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import secrets
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# File name suffix used for each job type
+JOB_FILE_SUFFIXES = {
+    "ollama": "",
+    "bash": "_bash",
+    "fastagent": "_fastagent",
+    "workflow": "_workflow",
+}
+
+
+def new_job_id() -> str:
+    """
+    Generate a time-sortable job ID.
+
+    The ID uses the UUIDv7 layout: a 48-bit millisecond Unix timestamp
+    followed by random bits, so IDs sort by creation time and keep the
+    familiar UUID string format.
+
+    Returns:
+        The new job ID
+    """
+    timestamp_ms = time.time_ns() // 1_000_000
+    value = (timestamp_ms & ((1 << 48) - 1)) << 80
+    value |= secrets.randbits(80)
+    # Set version (7) and variant (RFC 4122) bits
+    value &= ~(0xF << 76)
+    value |= 0x7 << 76
+    value &= ~(0x3 << 62)
+    value |= 0x2 << 62
+    return str(uuid.UUID(int=value))
+
+
+def job_id_timestamp(job_id: str) -> Optional[float]:
+    """
+    Extract the creation time embedded in a time-sortable job ID.
+
+    Args:
+        job_id: The job ID
+
+    Returns:
+        Unix timestamp in seconds, or None for IDs without a timestamp (e.g. UUIDv4)
+    """
+    try:
+        parsed = uuid.UUID(job_id)
+    except ValueError:
+        return None
+    if parsed.version != 7:
+        return None
+    return (parsed.int >> 80) / 1000.0
+
+
+def split_job_file_stem(stem: str) -> Tuple[str, str]:
+    """
+    Split an output file stem such as ``<id>_bash`` into job ID and job type.
+
+    Args:
+        stem: File name without the ``.txt`` extension
+
+    Returns:
+        Tuple of (job_id, job_type)
+    """
+    for job_type, suffix in JOB_FILE_SUFFIXES.items():
+        if suffix and stem.endswith(suffix):
+            return stem[:-len(suffix)], job_type
+    return stem, "ollama"
+
+
+def shard_dir(outputs_dir: Path, job_id: str, timestamp: Optional[float] = None) -> Path:
+    """
+    Directory that holds a job's output file.
+
+    Args:
+        outputs_dir: Root outputs directory
+        job_id: The job ID
+        timestamp: Creation time; defaults to the time embedded in the ID, or now
+
+    Returns:
+        Path of the shard directory
+    """
+    if timestamp is None:
+        timestamp = job_id_timestamp(job_id) or time.time()
+    day = datetime.fromtimestamp(timestamp, tz=timezone.utc)
+    prefix = hashlib.sha1(job_id.encode()).hexdigest()[:2]
+    return outputs_dir / f"{day:%Y}" / f"{day:%m}" / f"{day:%d}" / prefix
+
+
+def job_output_path(
+    outputs_dir: Path,
+    job_id: str,
+    job_type: str,
+    timestamp: Optional[float] = None,
+    create: bool = True
+) -> Path:
+    """
+    Path of a job's output file in the sharded layout.
+
+    Args:
+        outputs_dir: Root outputs directory
+        job_id: The job ID
+        job_type: Kind of job ("ollama", "bash", "fastagent", "workflow")
+        timestamp: Creation time; defaults to the time embedded in the ID, or now
+        create: Whether to create the shard directory
+
+    Returns:
+        Path of the output file
+    """
+    directory = shard_dir(outputs_dir, job_id, timestamp)
+    if create:
+        directory.mkdir(parents=True, exist_ok=True)
+    return directory / f"{job_id}{JOB_FILE_SUFFIXES[job_type]}.txt"
+
+
+def resolve_output_file(
+    outputs_dir: Path,
+    job_id: str,
+    indexed_path: Optional[str] = None
+) -> Optional[Path]:
+    """
+    Find a job's output file, wherever it currently lives.
+
+    Checks the path recorded in the job index first, then the legacy flat
+    layout, then the sharded location implied by a time-sortable ID.
+    Both the index path and the flat path are tried because a migration may
+    be moving the file concurrently.
+
+    Args:
+        outputs_dir: Root outputs directory
+        job_id: The job ID (a legacy ``<id>_bash`` style stem is also accepted)
+        indexed_path: Output path recorded in the job index, if any
+
+    Returns:
+        Path of the existing output file, or None if it cannot be found
+    """
+    base_id, _ = split_job_file_stem(job_id)
+
+    candidates: List[Path] = []
+    if indexed_path:
+        candidates.append(Path(indexed_path))
+    candidates.append(outputs_dir / f"{job_id}.txt")
+    for suffix in JOB_FILE_SUFFIXES.values():
+        candidates.append(outputs_dir / f"{base_id}{suffix}.txt")
+    if job_id_timestamp(base_id) is not None:
+        directory = shard_dir(outputs_dir, base_id)
+        for suffix in JOB_FILE_SUFFIXES.values():
+            candidates.append(directory / f"{base_id}{suffix}.txt")
+
+    for candidate in candidates:
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def _read_legacy_metadata(path: Path) -> Dict[str, Any]:
+    """Read the METADATA / WORKFLOW RUN header line of a legacy output file."""
+    try:
+        with open(path, "r") as f:
+            first_line = f.readline().strip()
+    except IOError:
+        return {}
+    for prefix in ("METADATA:", "WORKFLOW RUN:"):
+        if first_line.startswith(prefix):
+            try:
+                return json.loads(first_line[len(prefix):])
+            except json.JSONDecodeError:
+                return {}
+    return {}
+
+
+def migrate_flat_outputs(
+    outputs_dir: Path,
+    store: Any,
+    min_age: float = 60.0,
+    dry_run: bool = False,
+    limit: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Move legacy flat output files into the sharded layout.
+
+    Each file is hard-linked into its shard, the job index is pointed at the
+    new path, and only then is the flat name removed, so readers always find
+    the file through ``resolve_output_file``. Files of jobs that are still
+    active, or that were modified in the last ``min_age`` seconds, are skipped.
+
+    Args:
+        outputs_dir: Root outputs directory
+        store: The JobStore holding the job index
+        min_age: Skip files modified more recently than this many seconds
+        dry_run: Only report what would be moved
+        limit: Maximum number of files to move in this run
+
+    Returns:
+        Dict with counts of moved and skipped files and any errors
+    """
+    summary: Dict[str, Any] = {"moved": 0, "skipped": 0, "errors": []}
+    now = time.time()
+
+    with os.scandir(outputs_dir) as entries:
+        for entry in entries:
+            if limit is not None and summary["moved"] >= limit:
+                break
+            if not entry.is_file() or not entry.name.endswith(".txt"):
+                continue
+
+            old_path = Path(entry.path)
+            job_id, job_type = split_job_file_stem(old_path.stem)
+            record = store.get(job_id)
+            stat = entry.stat()
+            if (record and not record.is_terminal) or now - stat.st_mtime < min_age:
+                summary["skipped"] += 1
+                continue
+
+            metadata = _read_legacy_metadata(old_path)
+            created_at = metadata.get("timestamp") or metadata.get("started_at") or stat.st_mtime
+            new_path = job_output_path(outputs_dir, job_id, job_type, timestamp=created_at, create=not dry_run)
+            if dry_run:
+                summary["moved"] += 1
+                continue
+
+            try:
+                if not new_path.exists():
+                    os.link(old_path, new_path)
+                if record:
+                    store.set_output_file(job_id, new_path)
+                else:
+                    store.import_job(
+                        job_id, job_type, new_path,
+                        created_at=created_at,
+                        finished_at=stat.st_mtime,
+                        model=metadata.get("model")
+                    )
+                old_path.unlink()
+                summary["moved"] += 1
+            except OSError as e:
+                summary["errors"].append(f"{old_path.name}: {str(e)}")
+
+    return summary
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command-line entry point for the output layout migration."""
+    try:
+        from .job_store import JobStore
+    except ImportError:
+        from job_store import JobStore
+
+    parser = argparse.ArgumentParser(description="Manage the sharded job output layout")
+    parser.add_argument(
+        "--outputs-dir",
+        type=Path,
+        default=Path(os.environ.get("OLLAMA_MCP_ROOT", ".")) / "outputs",
+        help="Outputs directory (default: $OLLAMA_MCP_ROOT/outputs)"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    migrate = subparsers.add_parser("migrate", help="Move flat output files into the sharded layout")
+    migrate.add_argument("--dry-run", action="store_true", help="Only report what would be moved")
+    migrate.add_argument("--limit", type=int, default=None, help="Maximum number of files to move")
+    migrate.add_argument(
+        "--min-age", type=float, default=60.0,
+        help="Skip files modified in the last N seconds (default: 60)"
+    )
+    args = parser.parse_args(argv)
+
+    store = JobStore(args.outputs_dir / "jobs.db")
+    try:
+        summary = migrate_flat_outputs(
+            args.outputs_dir, store,
+            min_age=args.min_age, dry_run=args.dry_run, limit=args.limit
+        )
+    finally:
+        store.close()
+
+    print(json.dumps(summary, indent=2))
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
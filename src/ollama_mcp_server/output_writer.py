@@ -0,0 +1,290 @@
+"""
+Buffered output writer for job capture loops.
+
+Capture loops used to reopen the output file for every line and keep the
+whole output in one ever-growing string. ``JobOutputWriter`` keeps the file
+open for the lifetime of the job, buffers writes and flushes them when the
+buffer grows past a size threshold or a flush interval elapses, and keeps
+only a bounded tail of the output in memory. Writes may be raw bytes, which
+are decoded incrementally, and an optional ``StreamingCleaner`` cleans the
+output before it is stored.
+
+With a size cap, only the first ``max_bytes`` of output go to the file as
+they arrive; when the writer is closed it appends a truncation marker and
+the in-memory tail, so the stored file is head + marker + tail however
+much the job printed.
+"""
+
+import asyncio
+import codecs
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple, Union
+
+try:
+    from .output_cleaning import StreamingCleaner
+except ImportError:
+    from output_cleaning import StreamingCleaner
+
+# Flush once this many characters are buffered...
+DEFAULT_FLUSH_CHARS = 64 * 1024
+# ...or at least this often (seconds), so pollers see recent output
+DEFAULT_FLUSH_INTERVAL = 0.5
+# Characters of recent output kept in memory for quick access
+DEFAULT_TAIL_CHARS = 64 * 1024
+
+# Marker written between the stored head and tail of truncated output
+TRUNCATION_MARKER = "\n\n[OUTPUT TRUNCATED: {omitted} bytes omitted]\n\n"
+
+
+class JobOutputWriter:
+    """Append-only, buffered writer for a single job's output file."""
+
+    def __init__(
+        self,
+        output_file: Path,
+        flush_chars: int = DEFAULT_FLUSH_CHARS,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        tail_chars: int = DEFAULT_TAIL_CHARS,
+        cleaner: Optional[StreamingCleaner] = None,
+        max_bytes: Optional[int] = None
+    ):
+        """
+        Open the output file for appending.
+
+        Args:
+            output_file: Path of the job's output file
+            flush_chars: Flush when at least this many characters are buffered
+            flush_interval: Flush buffered output at least this often (seconds)
+            tail_chars: Number of trailing characters to keep in memory
+            cleaner: Clean output as it is written, storing only the cleaned text
+            max_bytes: Store at most this many bytes of output as it arrives, plus
+                the tail when closed (None for no limit)
+        """
+        self.output_file = Path(output_file)
+        self.flush_chars = flush_chars
+        self.flush_interval = flush_interval
+        self.tail_chars = tail_chars
+        self.cleaner = cleaner
+        self.max_bytes = max_bytes
+
+        # Totals for all output, whether stored or not
+        self.chars_written = 0
+        self.lines_written = 0
+        self.bytes_received = 0
+        # Bytes of output sent to the file, and where in the output storing stopped
+        self.bytes_stored = 0
+        self.truncated = False
+        self._truncated_at_char = 0
+        # Characters of the tail stored after the truncation marker
+        self.stored_tail_chars = 0
+        # Bytes of (cleaned) text produced, counted only when capped
+        self._text_bytes = 0
+
+        self._file = open(self.output_file, "a")
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._buffer: List[str] = []
+        self._buffered = 0
+        self._tail: Deque[str] = deque()
+        self._tail_size = 0
+        self._lock = asyncio.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+        self._closed = False
+
+    async def __aenter__(self) -> "JobOutputWriter":
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    def start(self) -> None:
+        """Start the periodic flush task (requires a running event loop)."""
+        if self._flusher is None and self.flush_interval > 0:
+            self._flusher = asyncio.create_task(self._flush_periodically())
+
+    def append(self, data: Union[str, bytes]) -> None:
+        """
+        Buffer output without flushing.
+
+        Args:
+            data: Text, or raw UTF-8 bytes, to append to the output
+        """
+        if self._closed:
+            raise ValueError("Writer is closed")
+        self.bytes_received += len(data) if isinstance(data, bytes) else len(data.encode("utf-8"))
+        if self.cleaner is not None:
+            text = self.cleaner.feed(data)
+        elif isinstance(data, bytes):
+            text = self._decoder.decode(data)
+        else:
+            text = data
+        self._buffer_text(text)
+
+    def _buffer_text(self, text: str) -> None:
+        if not text:
+            return
+        if self.max_bytes is not None:
+            self._text_bytes += len(text.encode("utf-8"))
+        self._store(text)
+        self.chars_written += len(text)
+        self.lines_written += text.count("\n")
+
+        self._tail.append(text)
+        self._tail_size += len(text)
+        # Drop whole chunks from the front while the rest still covers the tail
+        while self._tail and self._tail_size - len(self._tail[0]) >= self.tail_chars:
+            self._tail_size -= len(self._tail.popleft())
+
+    def _store(self, text: str) -> None:
+        """Buffer text for the file, up to max_bytes of output."""
+        if self.truncated:
+            return
+        if self.max_bytes is not None:
+            encoded = text.encode("utf-8")
+            budget = self.max_bytes - self.bytes_stored
+            if len(encoded) > budget:
+                text = encoded[:budget].decode("utf-8", errors="ignore")
+                encoded = text.encode("utf-8")
+                self.truncated = True
+                self._truncated_at_char = self.chars_written + len(text)
+            self.bytes_stored += len(encoded)
+        if text:
+            self._buffer.append(text)
+            self._buffered += len(text)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Output size counters.
+
+        Returns:
+            Dict with the bytes of output received, the characters of text they
+            produced, whether it was truncated and, when capped, the bytes stored
+            (and, once closed, the characters of the tail stored after the marker)
+        """
+        stats: Dict[str, Any] = {
+            "output_bytes": self.bytes_received,
+            "output_chars": self.chars_written,
+            "truncated": self.truncated
+        }
+        if self.max_bytes is not None:
+            stats["stored_bytes"] = self.bytes_stored
+        if self.truncated and self._closed:
+            stats["stored_tail_chars"] = self.stored_tail_chars
+        return stats
+
+    async def write(self, data: Union[str, bytes]) -> None:
+        """
+        Buffer output and flush if the buffer is over the size threshold.
+
+        Args:
+            data: Text, or raw UTF-8 bytes, to append to the output
+        """
+        self.append(data)
+        if self._buffered >= self.flush_chars:
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Write all buffered text to the output file."""
+        async with self._lock:
+            if not self._buffer or self._file.closed:
+                return
+            data = "".join(self._buffer)
+            self._buffer.clear()
+            self._buffered = 0
+            await asyncio.to_thread(self._write_through, data)
+
+    def _write_through(self, data: str) -> None:
+        self._file.write(data)
+        self._file.flush()
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def _finish_stream(self) -> None:
+        """Buffer output still held back by the decoder or cleaner, and the tail of truncated output."""
+        if self.cleaner is not None:
+            self._buffer_text(self.cleaner.flush())
+        else:
+            self._buffer_text(self._decoder.decode(b"", final=True))
+
+        if self.truncated:
+            # The in-memory tail may reach back into the part already stored
+            unstored = self.chars_written - self._truncated_at_char
+            tail = self.tail()[-unstored:] if unstored else ""
+            tail_bytes = len(tail.encode("utf-8"))
+            omitted = self._text_bytes - self.bytes_stored - tail_bytes
+            if omitted > 0:
+                self._buffer.append(TRUNCATION_MARKER.format(omitted=omitted))
+                self.stored_tail_chars = len(tail)
+            else:
+                self.truncated = False
+            self._buffer.append(tail)
+            self.bytes_stored += tail_bytes
+
+    async def close(self) -> None:
+        """Flush remaining output, stop the flush task and close the file."""
+        if self._closed:
+            return
+        self._finish_stream()
+        self._closed = True
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush()
+        self._file.close()
+
+    def close_now(self) -> None:
+        """Synchronously flush and close (for shutdown paths without an event loop)."""
+        if self._closed:
+            return
+        self._finish_stream()
+        self._closed = True
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        if self._buffer and not self._file.closed:
+            self._write_through("".join(self._buffer))
+            self._buffer.clear()
+            self._buffered = 0
+        self._file.close()
+
+    @property
+    def closed(self) -> bool:
+        """Whether the writer has been closed."""
+        return self._closed
+
+    def tail(self, chars: Optional[int] = None) -> str:
+        """
+        Return the most recent output kept in memory.
+
+        Args:
+            chars: Number of trailing characters to return (defaults to the tail size)
+
+        Returns:
+            The trailing output text
+        """
+        limit = min(chars or self.tail_chars, self.tail_chars)
+        return "".join(self._tail)[-limit:]
+
+    def read_since(self, position: int) -> Tuple[str, int]:
+        """
+        Return the output written after a position in the output.
+
+        Args:
+            position: Offset in characters of output, as counted by chars_written
+
+        Returns:
+            Tuple of the text and the offset it starts at, which is later than
+            position if the output in between has already left the in-memory tail
+        """
+        start = max(position, self.chars_written - min(self._tail_size, self.tail_chars), 0)
+        if start >= self.chars_written:
+            return "", self.chars_written
+        return self.tail(self.chars_written - start), start
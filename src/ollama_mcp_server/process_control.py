@@ -0,0 +1,244 @@
+"""
+Process groups, resource limits and usage accounting for subprocess jobs.
+
+Every job runs in its own session, so the shell and anything it forks share
+a process group that can be signalled as a whole: cancelling a job also
+stops the background processes it started. Jobs can also be given rlimits
+and a niceness so a runaway command can't starve the Ollama daemon running
+on the same machine. The limits apply to the job's command itself; its
+CPU time, peak memory and I/O are collected by the process supervisor when
+it is reaped.
+
+Jobs read stdin from /dev/null unless they are started with a pipe or a
+pseudo-terminal (for programs that need a TTY, such as interactive
+fast-agent scripts), which JobInput writes to.
+"""
+
+import asyncio
+import os
+import signal
+import struct
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    import fcntl
+    import resource
+    import termios
+except ImportError:  # Not available on Windows
+    fcntl = resource = termios = None
+
+# Resource limits a job can set, mapped to their rlimit names
+JOB_LIMITS = {
+    "cpu_seconds": "RLIMIT_CPU",
+    "memory_bytes": "RLIMIT_AS",
+    "open_files": "RLIMIT_NOFILE",
+    # Counts every process of the server's user, not just the job's
+    "max_processes": "RLIMIT_NPROC",
+}
+
+# Seconds between SIGXCPU at the CPU limit and SIGKILL
+CPU_LIMIT_GRACE = 5
+
+# How a job's stdin is connected
+STDIN_MODES = ("none", "pipe", "pty")
+
+# Window size reported to programs running on a job's pseudo-terminal
+PTY_COLUMNS = 120
+PTY_ROWS = 40
+
+
+def validate_limits(limits: Optional[Dict[str, Any]], nice: Optional[int] = None) -> Dict[str, int]:
+    """
+    Check requested resource limits.
+
+    Args:
+        limits: Limits by name (see JOB_LIMITS); None or 0 values are ignored
+        nice: Niceness increment for the job
+
+    Returns:
+        The limits to apply, as integers
+
+    Raises:
+        ValueError: If a limit is unknown or negative, or limits are not supported here
+    """
+    checked: Dict[str, int] = {}
+    for name, value in (limits or {}).items():
+        if name not in JOB_LIMITS:
+            raise ValueError(f"Unknown resource limit {name!r}; expected one of {', '.join(JOB_LIMITS)}")
+        if not value:
+            continue
+        if int(value) < 0:
+            raise ValueError(f"Resource limit {name} must not be negative")
+        checked[name] = int(value)
+    if checked and resource is None:
+        raise ValueError("Resource limits are not supported on this platform")
+    if nice is not None and not 0 <= nice <= 19:
+        raise ValueError("nice must be between 0 and 19")
+    return checked
+
+
+def make_preexec_fn(limits: Dict[str, int], nice: int = 0) -> Optional[Callable[[], None]]:
+    """
+    Build the function that applies limits in the child before it runs the command.
+
+    Hard limits are never raised above the server's own, so unprivileged
+    servers can still apply them.
+
+    Args:
+        limits: Validated limits (see validate_limits)
+        nice: Niceness increment for the job
+
+    Returns:
+        The function to pass as preexec_fn, or None if there is nothing to apply
+    """
+    if not limits and not nice:
+        return None
+
+    def apply_limits() -> None:
+        if nice:
+            os.nice(nice)
+        for name, value in limits.items():
+            which = getattr(resource, JOB_LIMITS[name])
+            _, hard = resource.getrlimit(which)
+            soft_limit = value
+            hard_limit = value + CPU_LIMIT_GRACE if name == "cpu_seconds" else value
+            if hard != resource.RLIM_INFINITY:
+                soft_limit = min(soft_limit, hard)
+                hard_limit = min(hard_limit, hard)
+            resource.setrlimit(which, (soft_limit, hard_limit))
+
+    return apply_limits
+
+
+def signal_process_group(pid: int, sig: int) -> bool:
+    """
+    Send a signal to a job's process group.
+
+    Falls back to signalling the process alone when it has no group of its
+    own (jobs started by older versions).
+
+    Args:
+        pid: PID of the job's main process, which leads its group
+        sig: Signal to send
+
+    Returns:
+        True if any process was signalled
+    """
+    try:
+        if os.getpgid(pid) == pid:
+            os.killpg(pid, sig)
+        else:
+            os.kill(pid, sig)
+        return True
+    except ProcessLookupError:
+        pass
+    # The leader has exited, but processes it left behind keep its group ID
+    try:
+        os.killpg(pid, sig)
+        return True
+    except (ProcessLookupError, PermissionError):
+        return False
+
+
+def kill_process_group(pid: int) -> None:
+    """
+    Kill whatever is left of a job's process group.
+
+    Args:
+        pid: PID of the job's main process
+    """
+    signal_process_group(pid, signal.SIGKILL)
+
+
+def open_job_pty() -> Tuple[int, int]:
+    """
+    Open a pseudo-terminal for a job.
+
+    Echo is turned off so input sent to the job doesn't show up in its
+    output, and so is output processing, so lines end in plain newlines.
+
+    Returns:
+        Tuple of the master and slave file descriptors
+
+    Raises:
+        OSError: If pseudo-terminals are not supported here
+    """
+    if termios is None:
+        raise OSError("Pseudo-terminals are not supported on this platform")
+    master_fd, slave_fd = os.openpty()
+    attributes = termios.tcgetattr(slave_fd)
+    attributes[1] &= ~termios.OPOST  # oflag
+    attributes[3] &= ~termios.ECHO  # lflag
+    termios.tcsetattr(slave_fd, termios.TCSANOW, attributes)
+    fcntl.ioctl(slave_fd, termios.TIOCSWINSZ, struct.pack("HHHH", PTY_ROWS, PTY_COLUMNS, 0, 0))
+    return master_fd, slave_fd
+
+
+class JobInput:
+    """Write end of a running job's stdin: a pipe or the master side of a PTY."""
+
+    def __init__(
+        self,
+        pipe: Optional[asyncio.StreamWriter] = None,
+        pty_fd: Optional[int] = None
+    ):
+        """
+        Wrap a job's stdin.
+
+        Args:
+            pipe: The process's stdin stream, for pipe mode
+            pty_fd: The PTY master file descriptor, for PTY mode (owned by this object)
+        """
+        self.pipe = pipe
+        self.pty_fd = pty_fd
+        self.bytes_sent = 0
+        self.closed = False
+
+    @property
+    def mode(self) -> str:
+        """"pipe" or "pty"."""
+        return "pty" if self.pty_fd is not None else "pipe"
+
+    async def write(self, data: bytes) -> None:
+        """
+        Send data to the job.
+
+        Args:
+            data: Bytes to write
+
+        Raises:
+            BrokenPipeError: If the job no longer reads its input
+        """
+        if self.closed:
+            raise BrokenPipeError("The job's input has been closed")
+        if self.pipe is not None:
+            self.pipe.write(data)
+            await self.pipe.drain()
+        else:
+            view = memoryview(data)
+            while view:
+                try:
+                    view = view[os.write(self.pty_fd, view):]
+                except BlockingIOError:
+                    # The terminal's input queue is full until the job reads from it
+                    await asyncio.sleep(0.01)
+        self.bytes_sent += len(data)
+
+    async def send_eof(self) -> None:
+        """Signal end of input (closes a pipe, sends the EOF character to a PTY)."""
+        if self.closed:
+            return
+        if self.pipe is not None:
+            self.pipe.close()
+            self.closed = True
+        else:
+            await self.write(bytes([termios.tcgetattr(self.pty_fd)[6][termios.VEOF][0]]))
+
+    def close(self) -> None:
+        """Release the job's input once the job has finished."""
+        if self.pipe is not None and not self.pipe.is_closing():
+            self.pipe.close()
+        if self.pty_fd is not None:
+            os.close(self.pty_fd)
+            self.pty_fd = None
+        self.closed = True
@@ -0,0 +1,380 @@
+"""
+Event-driven supervision of job processes.
+
+Job processes used to be checked for exit by polling their returncode
+every tenth of a second, and stale entries in the server's process table
+were only cleaned up when a tool happened to look at them. The supervisor
+starts job processes with a subprocess protocol that hears from the event
+loop's child watcher the moment a process is reaped, and then resolves the
+process's exit future and calls the registered exit listeners right away.
+
+The supervisor installs its own child watcher, which is notified by the
+kernel rather than polling: it waits on a pidfd per child on Linux, or on
+a thread blocked in wait4() elsewhere. It reaps children with wait4(), so
+each job's CPU time, peak memory and I/O are kept without running the job
+under a separate wrapper process. Python 3.14 and later no longer let
+asyncio's child watcher be replaced; there asyncio's own watcher reaps
+children and no resource usage is recorded.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import warnings
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Buffer limit of the process's stdout/stderr readers (asyncio's default)
+STREAM_LIMIT = 2 ** 16
+
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+_MAXRSS_SCALE = 1 if sys.platform == "darwin" else 1024
+
+# Resource usage kept for reaped processes that no supervisor has claimed
+# (subprocesses started outside it, such as shell sessions)
+_MAX_UNCLAIMED_USAGE = 256
+
+# Exit code reported when a child was reaped by someone else, as asyncio does
+_UNKNOWN_EXIT_CODE = 255
+
+
+def usage_report(rusage: Any, wall_seconds: float, inherited_rss: int = 0) -> Dict[str, Any]:
+    """
+    Resource usage of a finished process, as stored in job metadata.
+
+    The counts cover the process and every descendant it waited for. Linux
+    carries a process's peak RSS across exec, so a child's peak includes the
+    memory of the process it was forked from; a peak no higher than that
+    says nothing about the child and max_rss_bytes is None.
+
+    Args:
+        rusage: struct_rusage returned by os.wait4
+        wall_seconds: Time from start to exit
+        inherited_rss: Peak RSS the child inherited at fork, in bytes
+
+    Returns:
+        Dict with wall and CPU times, peak memory and block I/O counts
+    """
+    max_rss = rusage.ru_maxrss * _MAXRSS_SCALE
+    return {
+        "wall_seconds": round(wall_seconds, 3),
+        "cpu_user_seconds": round(rusage.ru_utime, 3),
+        "cpu_system_seconds": round(rusage.ru_stime, 3),
+        "max_rss_bytes": max_rss if max_rss > inherited_rss else None,
+        "io_read_blocks": rusage.ru_inblock,
+        "io_write_blocks": rusage.ru_oublock,
+    }
+
+
+def _inherited_rss() -> int:
+    """Upper bound of the peak RSS a child forked from this process starts with."""
+    if resource is None or not sys.platform.startswith("linux"):
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _MAXRSS_SCALE
+
+
+def _pidfds_supported() -> bool:
+    if not hasattr(os, "pidfd_open"):
+        return False
+    try:
+        os.close(os.pidfd_open(os.getpid()))
+    except OSError:
+        # Kernels before 5.3, or pidfds blocked by a seccomp filter
+        return False
+    return True
+
+
+# asyncio only accepts AbstractChildWatcher subclasses, which don't exist on
+# Windows or from Python 3.14; the watcher is never installed there
+_ChildWatcherBase = getattr(asyncio, "AbstractChildWatcher", object)
+
+
+class UsageChildWatcher(_ChildWatcherBase):
+    """
+    asyncio child watcher that reaps children with wait4() and keeps their rusage.
+
+    Exits are noticed through a pidfd per child where the platform has them,
+    otherwise by a thread per child blocked in wait4().
+    """
+
+    def __init__(self, use_pidfds: bool):
+        """
+        Create a watcher.
+
+        Args:
+            use_pidfds: Wait on pidfds instead of threads
+        """
+        self.kind = "pidfd" if use_pidfds else "thread"
+        self.usage: Dict[int, Any] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._callbacks: Dict[int, Tuple[Optional[int], Callable[..., None], Tuple[Any, ...]]] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        pass
+
+    def is_active(self) -> bool:
+        return self._loop is not None and self._loop.is_running()
+
+    def close(self) -> None:
+        self.attach_loop(None)
+
+    def attach_loop(self, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+        for pidfd, _, _ in self._callbacks.values():
+            if pidfd is not None:
+                self._loop.remove_reader(pidfd)
+                os.close(pidfd)
+        self._callbacks.clear()
+        self._loop = loop
+
+    def add_child_handler(self, pid: int, callback: Callable[..., None], *args: Any) -> None:
+        existing = self._callbacks.get(pid)
+        if existing is not None:
+            self._callbacks[pid] = existing[0], callback, args
+            return
+        pidfd = None
+        if self.kind == "pidfd":
+            pidfd = os.pidfd_open(pid)
+            self._loop.add_reader(pidfd, self._reap, pid)
+        else:
+            threading.Thread(target=self._wait_in_thread, args=(pid,), daemon=True).start()
+        self._callbacks[pid] = pidfd, callback, args
+
+    def remove_child_handler(self, pid: int) -> bool:
+        entry = self._callbacks.pop(pid, None)
+        if entry is None:
+            return False
+        if entry[0] is not None:
+            self._loop.remove_reader(entry[0])
+            os.close(entry[0])
+        return True
+
+    def _reap(self, pid: int) -> None:
+        # The pidfd is readable once the child has exited, so wait4 returns at once
+        pidfd = self._callbacks[pid][0]
+        self._loop.remove_reader(pidfd)
+        os.close(pidfd)
+        self._finish(pid, *self._wait4(pid))
+
+    def _wait_in_thread(self, pid: int) -> None:
+        status, rusage = self._wait4(pid)
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._finish, pid, status, rusage)
+
+    @staticmethod
+    def _wait4(pid: int) -> Tuple[Optional[int], Any]:
+        try:
+            _, status, rusage = os.wait4(pid, 0)
+        except ChildProcessError:
+            # Already reaped by a waitpid() elsewhere
+            return None, None
+        return status, rusage
+
+    def _finish(self, pid: int, status: Optional[int], rusage: Any) -> None:
+        entry = self._callbacks.pop(pid, None)
+        if entry is None:
+            return
+        _, callback, args = entry
+        if rusage is not None:
+            self.usage[pid] = rusage
+            while len(self.usage) > _MAX_UNCLAIMED_USAGE:
+                del self.usage[next(iter(self.usage))]
+        returncode = _UNKNOWN_EXIT_CODE if status is None else os.waitstatus_to_exitcode(status)
+        callback(pid, returncode, *args)
+
+
+def use_usage_child_watcher(loop: asyncio.AbstractEventLoop) -> Optional[UsageChildWatcher]:
+    """
+    Have asyncio reap child processes with a UsageChildWatcher.
+
+    Args:
+        loop: The event loop the server runs in
+
+    Returns:
+        The installed watcher, or None where asyncio's watcher can't be replaced
+    """
+    if _ChildWatcherBase is object or not hasattr(asyncio, "set_child_watcher"):
+        return None
+    watcher = UsageChildWatcher(_pidfds_supported())
+    watcher.attach_loop(loop)
+    with warnings.catch_warnings():
+        # Deprecated (but still honoured) in 3.12 and 3.13
+        warnings.simplefilter("ignore", DeprecationWarning)
+        asyncio.set_child_watcher(watcher)
+    return watcher
+
+
+class _SupervisedProtocol(asyncio.subprocess.SubprocessStreamProtocol):
+    """Stream protocol that reports the process's exit to a callback."""
+
+    def __init__(self, on_exit: Callable[[Optional[int]], None], limit: int, loop: asyncio.AbstractEventLoop):
+        super().__init__(limit=limit, loop=loop)
+        self._on_exit = on_exit
+
+    def process_exited(self) -> None:
+        # Read before the base class drops the transport (once the pipes are closed too)
+        returncode = self._transport.get_returncode()
+        super().process_exited()
+        self._on_exit(returncode)
+
+
+class ProcessSupervisor:
+    """Starts job processes and reacts to their exits as they happen."""
+
+    def __init__(self):
+        """Create a supervisor with no processes."""
+        self.watcher: Optional[UsageChildWatcher] = None
+        self.started = 0
+        self.exited = 0
+        self._installed = False
+        self._exits: Dict[int, asyncio.Future] = {}
+        # time.monotonic() at start and the inherited peak RSS, by PID
+        self._start_times: Dict[int, Tuple[float, int]] = {}
+        self._usage: Dict[int, Dict[str, Any]] = {}
+        self._listeners: List[Callable[[str, asyncio.subprocess.Process], None]] = []
+
+    def add_exit_listener(self, listener: Callable[[str, asyncio.subprocess.Process], None]) -> None:
+        """
+        Call a function whenever a supervised process exits.
+
+        Listeners run in the event loop as soon as the exit is reported, before
+        anything waiting on the process is resumed.
+
+        Args:
+            listener: Called with the job ID and the exited process
+        """
+        self._listeners.append(listener)
+
+    async def spawn(self, job_id: str, program: str, *args: str, **kwargs: Any) -> asyncio.subprocess.Process:
+        """
+        Start a job's process, like asyncio.create_subprocess_exec.
+
+        Args:
+            job_id: The job the process belongs to
+            program: Program to run
+            *args: Its arguments
+            **kwargs: Options for the subprocess (stdin, stdout, cwd, ...)
+
+        Returns:
+            The started process
+        """
+        loop = asyncio.get_running_loop()
+        if not self._installed:
+            self.watcher = use_usage_child_watcher(loop)
+            self._installed = True
+        exited = loop.create_future()
+        holder: Dict[str, asyncio.subprocess.Process] = {}
+
+        def on_exit(returncode: Optional[int]) -> None:
+            process = holder.get("process")
+            if process is not None:
+                self._process_exited(job_id, process, returncode)
+            elif not exited.done():
+                # Exited before spawn() returned; reported once the process exists
+                exited.set_result(returncode)
+
+        started = time.monotonic()
+        transport, protocol = await loop.subprocess_exec(
+            lambda: _SupervisedProtocol(on_exit, STREAM_LIMIT, loop), program, *args, **kwargs
+        )
+        process = asyncio.subprocess.Process(transport, protocol, loop)
+        holder["process"] = process
+        self._start_times[process.pid] = started, _inherited_rss()
+        self.started += 1
+        if exited.done():
+            self._process_exited(job_id, process, exited.result())
+        else:
+            self._exits[process.pid] = exited
+        return process
+
+    def _process_exited(self, job_id: str, process: asyncio.subprocess.Process, returncode: Optional[int]) -> None:
+        self.exited += 1
+        exited = self._exits.pop(process.pid, None)
+        started = self._start_times.pop(process.pid, None)
+        rusage = self.watcher.usage.pop(process.pid, None) if self.watcher is not None else None
+        if rusage is not None and started is not None:
+            self._usage[process.pid] = usage_report(rusage, time.monotonic() - started[0], started[1])
+        for listener in self._listeners:
+            try:
+                listener(job_id, process)
+            except Exception as e:
+                print(f"Process exit listener failed for job {job_id}: {str(e)}", file=sys.stderr)
+        # Unclaimed by the listeners; not kept once the process is gone
+        self._usage.pop(process.pid, None)
+        if exited is not None and not exited.done():
+            exited.set_result(returncode)
+
+    def resource_usage(self, process: asyncio.subprocess.Process) -> Optional[Dict[str, Any]]:
+        """
+        Resource usage of a process that just exited.
+
+        Only available to exit listeners, while they are being called.
+
+        Args:
+            process: A process started by spawn()
+
+        Returns:
+            The process's usage (see usage_report), or None if the child
+            watcher doesn't record it
+        """
+        return self._usage.get(process.pid)
+
+    def call_on_exit(self, process: asyncio.subprocess.Process, callback: Callable[[], None]) -> None:
+        """
+        Call a function once a supervised process has exited.
+
+        Args:
+            process: A process started by spawn()
+            callback: Called without arguments (right away if the process is gone)
+        """
+        exited = self._exits.get(process.pid)
+        if exited is None:
+            callback()
+        else:
+            exited.add_done_callback(lambda _: callback())
+
+    async def wait(self, process: asyncio.subprocess.Process) -> int:
+        """
+        Wait for a process itself to exit.
+
+        Unlike Process.wait(), this doesn't also wait for the process's pipes
+        to close, so a background grandchild holding stdout open can't keep a
+        finished job "running".
+
+        Args:
+            process: A process started by spawn()
+
+        Returns:
+            The process's exit code
+        """
+        exited = self._exits.get(process.pid)
+        if exited is not None:
+            # Shielded so a caller's timeout doesn't cancel it for everyone
+            await asyncio.shield(exited)
+        elif process.returncode is None:
+            # Not supervised (or already gone); fall back to the full wait
+            await process.wait()
+        return process.returncode
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Supervisor counters.
+
+        Returns:
+            Dict with the child watcher in use and process counts
+        """
+        return {
+            "child_watcher": self.watcher.kind if self.watcher is not None else "default",
+            "supervised": len(self._exits),
+            "started": self.started,
+            "exited": self.exited,
+        }
@@ -0,0 +1,137 @@
+"""
+Bounded in-memory cache of job results.
+
+The server used to keep the full output of every job in a dict for the life
+of the process. ``ResultCache`` keeps only recently used results, evicting
+least-recently-used entries once the total size passes a byte budget.
+Evicted results are still on disk and are simply re-read from the job's
+output file the next time they are requested.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# Default total budget for cached results
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# Results larger than this fraction of the budget are never cached
+DEFAULT_MAX_ENTRY_FRACTION = 0.25
+
+
+class ResultCache:
+    """Size-aware LRU cache mapping job IDs to result text."""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, max_entry_bytes: Optional[int] = None):
+        """
+        Create an empty cache.
+
+        Args:
+            max_bytes: Total size budget for cached results (UTF-8 bytes)
+            max_entry_bytes: Largest single result to cache (defaults to a quarter of max_bytes)
+        """
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = (
+            max_entry_bytes if max_entry_bytes is not None
+            else int(max_bytes * DEFAULT_MAX_ENTRY_FRACTION)
+        )
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejected = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a cached result and mark it as recently used.
+
+        Args:
+            key: The job ID
+
+        Returns:
+            The cached result, or None on a miss
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: str) -> bool:
+        """
+        Cache a result, evicting least-recently-used entries to stay within budget.
+
+        Args:
+            key: The job ID
+            value: The result text
+
+        Returns:
+            True if the result was cached, False if it was too large
+        """
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._discard(key)
+            if size > self.max_entry_bytes:
+                self.rejected += 1
+                return False
+
+            self._entries[key] = value
+            self._sizes[key] = size
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._discard(oldest)
+                self.evictions += 1
+            return True
+
+    def discard(self, key: str) -> None:
+        """
+        Drop a cached result if present.
+
+        Args:
+            key: The job ID
+        """
+        with self._lock:
+            self._discard(key)
+
+    def _discard(self, key: str) -> None:
+        if key in self._entries:
+            del self._entries[key]
+            self.current_bytes -= self._sizes.pop(key)
+
+    def clear(self) -> None:
+        """Drop all cached results."""
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Report current usage.
+
+        Returns:
+            Dict with entry count, byte usage and hit/miss/eviction counters
+        """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "max_entry_bytes": self.max_entry_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "rejected": self.rejected,
+            }
@@ -8,21 +8,107 @@ Includes fast-agent integration for advanced agent workflows.
 
 import asyncio
 import atexit
+import errno
 import importlib.util
 import json
 import os
-import re
 import signal
+import sqlite3
 import subprocess
 import sys
 import time
-import uuid
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Set
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
 
+import httpx
 from mcp.server.fastmcp import FastMCP
 from dotenv import load_dotenv
 
+try:
+    from .job_export import EXPORT_FORMATS, export_jobs as write_job_export, read_raw_output
+    from .job_pool import JobPool, QueueFullError
+    from .job_store import (
+        CANCELLED,
+        COMPLETED,
+        FAILED,
+        QUEUED,
+        RUNNING,
+        STALLED,
+        TIMED_OUT,
+        TOKEN_LIMIT,
+        InvalidTransitionError,
+        JobRecord,
+        JobStore,
+        parse_time_filter,
+    )
+    from .output_cleaning import StreamingCleaner, TerminalLineEmulator, clean_ollama_output
+    from .output_layout import (
+        job_output_path,
+        migrate_flat_outputs,
+        new_job_id,
+        resolve_output_file,
+        split_job_file_stem,
+    )
+    from .output_events import OutputEventLog, events_path, summarize_events
+    from .output_writer import JobOutputWriter
+    from .process_control import (
+        STDIN_MODES,
+        JobInput,
+        kill_process_group,
+        make_preexec_fn,
+        open_job_pty,
+        signal_process_group,
+        validate_limits,
+    )
+    from .process_supervisor import ProcessSupervisor
+    from .result_cache import DEFAULT_MAX_BYTES, ResultCache
+    from .shell_sessions import ShellSession, ShellSessionClosed
+    from .workflow_graph import SKIPPED, SUCCEEDED, WorkflowError, plan_steps, resolve_references, run_step_graph
+except ImportError:
+    # Allow running this file directly as a script (see example_claude_desktop_config.json)
+    from job_export import EXPORT_FORMATS, export_jobs as write_job_export, read_raw_output
+    from job_pool import JobPool, QueueFullError
+    from job_store import (
+        CANCELLED,
+        COMPLETED,
+        FAILED,
+        QUEUED,
+        RUNNING,
+        STALLED,
+        TIMED_OUT,
+        TOKEN_LIMIT,
+        InvalidTransitionError,
+        JobRecord,
+        JobStore,
+        parse_time_filter,
+    )
+    from output_cleaning import StreamingCleaner, TerminalLineEmulator, clean_ollama_output
+    from output_layout import (
+        job_output_path,
+        migrate_flat_outputs,
+        new_job_id,
+        resolve_output_file,
+        split_job_file_stem,
+    )
+    from output_events import OutputEventLog, events_path, summarize_events
+    from output_writer import JobOutputWriter
+    from process_control import (
+        STDIN_MODES,
+        JobInput,
+        kill_process_group,
+        make_preexec_fn,
+        open_job_pty,
+        signal_process_group,
+        validate_limits,
+    )
+    from process_supervisor import ProcessSupervisor
+    from result_cache import DEFAULT_MAX_BYTES, ResultCache
+    from shell_sessions import ShellSession, ShellSessionClosed
+    from workflow_graph import SKIPPED, SUCCEEDED, WorkflowError, plan_steps, resolve_references, run_step_graph
+
 # Load environment variables
 load_dotenv()
 
@@ -55,8 +141,29 @@ SCRIPTS_DIR.mkdir(exist_ok=True)
 WORKFLOWS_DIR.mkdir(exist_ok=True)
 FASTAGENT_DIR.mkdir(exist_ok=True)
 
+
+
+@asynccontextmanager
+async def server_lifespan(server: FastMCP) -> AsyncIterator[Dict[str, Any]]:
+    """Reconcile persisted job state once the server's event loop is up."""
+    global _jobs_reconciled
+    if not _jobs_reconciled:
+        _jobs_reconciled = True
+        summary = await reconcile_jobs()
+        if any(summary.values()):
+            print(f"Recovered jobs after restart: {json.dumps(summary)}", file=sys.stderr)
+        if job_store.search_available:
+            # Index history from before search existed without delaying startup
+            track_background_task(asyncio.create_task(backfill_search_index()))
+    try:
+        yield {}
+    finally:
+        if _ollama_client is not None:
+            await _ollama_client.aclose()
+
+
 # Initialize the MCP server
-mcp = FastMCP("OllamaMCPServer")
+mcp = FastMCP("OllamaMCPServer", lifespan=server_lifespan)
 
 # Log the output paths for debugging
 print(f"Using outputs directory: {OUTPUTS_DIR}")
@@ -67,15 +174,107 @@ print(f"Using workflows directory: {WORKFLOWS_DIR}")
 server_instance = None
 
 # CRITICAL: Process and task tracking for cleanup
-running_processes: Dict[str, subprocess.Popen] = {}
+running_processes: Dict[str, asyncio.subprocess.Process] = {}
 background_tasks: Set[asyncio.Task] = set()
 
-# Dictionary to store process output for async handling
-process_outputs: Dict[str, str] = {}
+# In-flight Ollama generations; cancelling a task closes its HTTP connection
+running_generations: Dict[str, asyncio.Task] = {}
+
+# Bounded LRU of recently read job results; evicted results are re-read from disk
+result_cache = ResultCache(
+    max_bytes=int(os.environ.get("OLLAMA_MCP_RESULT_CACHE_BYTES", DEFAULT_MAX_BYTES))
+)
+
+# Buffered output writers of jobs that are still capturing output
+job_writers: Dict[str, JobOutputWriter] = {}
+
+# stdin of running jobs started with a pipe or PTY, by job ID
+job_inputs: Dict[str, JobInput] = {}
+
+# Open persistent shell sessions by session ID
+shell_sessions: Dict[str, ShellSession] = {}
+
+# Most shell sessions open at once, and how long an unused one is kept (seconds)
+MAX_SHELL_SESSIONS = int(os.environ.get("OLLAMA_MCP_MAX_SHELL_SESSIONS", "8"))
+SHELL_SESSION_IDLE_TIMEOUT = float(os.environ.get("OLLAMA_MCP_SHELL_SESSION_IDLE_TIMEOUT", "1800"))
 
 # Store the selected default Ollama model
 default_ollama_model: Optional[str] = None
 
+# Ollama API endpoint
+OLLAMA_API_URL = os.environ.get("OLLAMA_API_URL", "http://localhost:11434").rstrip("/")
+
+# Generations can take a long time before the first token (model loading),
+# so only connecting and sending the request are bounded
+OLLAMA_HTTP_TIMEOUT = httpx.Timeout(connect=10.0, read=None, write=30.0, pool=None)
+
+# Shared Ollama API client, created on first use
+_ollama_client: Optional[httpx.AsyncClient] = None
+
+# Default generation limits (seconds, 0 disables). The stall watchdog fires when
+# no token has arrived for this long, which also covers model loading.
+GENERATION_TIMEOUT = float(os.environ.get("OLLAMA_MCP_GENERATION_TIMEOUT", "0"))
+STALL_TIMEOUT = float(os.environ.get("OLLAMA_MCP_STALL_TIMEOUT", "300"))
+
+# Durable job state, persisted on every transition so restarts can recover
+job_store = JobStore(OUTPUTS_DIR / "jobs.db")
+
+# Concurrently running subprocess jobs allowed per type (0 for no limit), and
+# how many more may wait for a slot before new ones are refused
+job_pool = JobPool(
+    limits={
+        "bash": int(os.environ.get("OLLAMA_MCP_MAX_BASH_JOBS", "8")),
+        "fastagent": int(os.environ.get("OLLAMA_MCP_MAX_FASTAGENT_JOBS", "2")),
+    },
+    max_queued=int(os.environ.get("OLLAMA_MCP_MAX_QUEUED_JOBS", "64"))
+)
+
+# Starts subprocess jobs and hears about their exits from the child watcher (no polling)
+process_supervisor = ProcessSupervisor()
+
+
+def forget_exited_process(job_id: str, process: asyncio.subprocess.Process) -> None:
+    """Drop a job's process from running_processes as soon as it exits."""
+    if running_processes.get(job_id) is process:
+        del running_processes[job_id]
+
+
+process_supervisor.add_exit_listener(forget_exited_process)
+
+# Re-run generations that were interrupted by a restart instead of failing them.
+# Ollama generations have no side effects, so running them again is safe.
+RESUME_GENERATIONS = os.environ.get("OLLAMA_MCP_RESUME_GENERATIONS", "").lower() in ("1", "true", "yes")
+
+# Job types that are safe to run again from scratch after an interruption
+RESUMABLE_JOB_TYPES = {"ollama"}
+
+_jobs_reconciled = False
+_shutting_down = False
+
+# Batch (workflow run) that jobs started in the current task belong to
+current_batch_id: ContextVar[Optional[str]] = ContextVar("current_batch_id", default=None)
+
+# Futures resolved when a job reaches a terminal state (see wait_for_job)
+job_waiters: Dict[str, List[asyncio.Future]] = {}
+
+# Workflow steps run at once, when steps declare their dependencies
+WORKFLOW_PARALLELISM = int(os.environ.get("OLLAMA_MCP_WORKFLOW_PARALLELISM", "4"))
+
+
+# Size of each read from a subprocess pipe
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# How long to keep draining pipes after a process exits; grandchildren that
+# inherited the pipe can otherwise hold it open indefinitely
+PIPE_DRAIN_TIMEOUT = 2.0
+
+# Most bytes of a command's output stored on disk; past this only the last
+# part is kept, after a truncation marker (0 for no limit)
+MAX_OUTPUT_BYTES = int(os.environ.get("OLLAMA_MCP_MAX_OUTPUT_BYTES", str(16 * 1024 * 1024)))
+
+# Niceness increment for command and fast-agent jobs, so they yield the CPU to Ollama
+JOB_NICE = int(os.environ.get("OLLAMA_MCP_JOB_NICE", "0"))
+
 
 def track_background_task(task: asyncio.Task) -> None:
     """Track background tasks for proper cleanup"""
@@ -83,206 +282,392 @@ def track_background_task(task: asyncio.Task) -> None:
     task.add_done_callback(background_tasks.discard)
 
 
-def cleanup_processes() -> None:
-    """Clean up all running processes and background tasks"""
-    print("Cleaning up processes and tasks...")
-    
-    # Cancel background tasks
-    for task in background_tasks.copy():  # Use copy to avoid modification during iteration
-        if not task.done():
-            task.cancel()
-    
-    # Terminate all processes
-    for job_id, process in list(running_processes.items()):  # Use list() to avoid modification during iteration
-        if process and process.poll() is None:
-            print(f"Terminating process {job_id}")
-            process.terminate()
-            try:
-                process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                print(f"Force killing process {job_id}")
-                process.kill()
-                try:
-                    process.wait(timeout=2)
-                except subprocess.TimeoutExpired:
-                    pass  # Process is really stuck, move on
-    
-    running_processes.clear()
-    background_tasks.clear()
-    print("Cleanup completed")
+def is_process_running(process: Optional[asyncio.subprocess.Process]) -> bool:
+    """Whether a tracked subprocess has not exited yet."""
+    return process is not None and process.returncode is None
 
 
-def signal_handler(signum: int, frame) -> None:
-    """Handle termination signals"""
-    print(f"Received signal {signum}, cleaning up...")
-    cleanup_processes()
-    sys.exit(0)
+async def terminate_process(process: asyncio.subprocess.Process, timeout: float = 5.0) -> None:
+    """
+    Terminate a subprocess and its process group, escalating to SIGKILL if it doesn't exit in time.
+
+    Anything the process started in the background is killed with it.
+    """
+    if process.returncode is not None:
+        kill_process_group(process.pid)
+        return
+    signal_process_group(process.pid, signal.SIGTERM)
+    try:
+        # Wait a bit for graceful termination
+        await asyncio.wait_for(wait_for_exit(process), timeout=timeout)
+    except asyncio.TimeoutError:
+        pass
+    # Force kill whatever didn't terminate gracefully
+    kill_process_group(process.pid)
+    await wait_for_exit(process)
 
 
-# CRITICAL: Register cleanup handlers
-signal.signal(signal.SIGTERM, signal_handler)
-signal.signal(signal.SIGINT, signal_handler)
-atexit.register(cleanup_processes)
+def _wait_pid(pid: int, timeout: float) -> bool:
+    """
+    Synchronously wait for a child to exit (for shutdown paths without a running loop).
+
+    Returns:
+        True if the child has exited
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            waited_pid, _ = os.waitpid(pid, os.WNOHANG)
+        except ChildProcessError:
+            # Already reaped by the event loop's child watcher
+            return True
+        if waited_pid != 0:
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.05)
+
+
+async def pump_stream(
+    stream: asyncio.StreamReader,
+    writer: JobOutputWriter,
+    events: Optional[OutputEventLog] = None,
+    name: str = "stdout"
+) -> None:
+    """
+    Copy a subprocess pipe into a job's output writer without blocking the event loop.
+
+    Reads fixed-size chunks rather than lines so very long lines can't
+    overrun the stream buffer. Without an event log, chunks are passed on as
+    bytes and the writer decodes them incrementally so multi-byte characters
+    split across chunks survive; with one, each stream is decoded by the log
+    (which keeps a decoder per stream) and the text goes to both.
+
+    Args:
+        stream: The pipe to read
+        writer: The job's output writer
+        events: The job's event log, which records each line with its arrival time
+        name: Stream name recorded in events ("stdout" or "stderr")
+    """
+    while True:
+        try:
+            chunk = await stream.read(STREAM_CHUNK_SIZE)
+        except OSError as e:
+            # Reading a PTY whose job side has closed fails with EIO instead of EOF
+            if e.errno == errno.EIO:
+                break
+            raise
+        if not chunk:
+            break
+        if events is None:
+            await writer.write(chunk)
+            continue
+        text = events.decode(name, chunk)
+        events.record(name, text)
+        await writer.write(text)
+
+
+async def wait_for_exit(process: asyncio.subprocess.Process) -> int:
+    """
+    Wait for a subprocess itself to exit.
+
+    Unlike Process.wait(), this doesn't also wait for every pipe to close,
+    so a background grandchild holding stdout open can't keep a finished
+    job "running". The supervisor wakes the caller as soon as the process
+    is reaped.
+    """
+    return await process_supervisor.wait(process)
 
 
-def clean_ansi_escape_codes(text: str) -> str:
+async def capture_process_output(
+    job_id: str,
+    process: asyncio.subprocess.Process,
+    writer: JobOutputWriter,
+    streams: Optional[Dict[str, asyncio.StreamReader]] = None,
+    events: Optional[OutputEventLog] = None
+) -> Optional[int]:
     """
-    Clean ANSI escape sequences and terminal control codes from text.
+    Stream a job's output into its writer and watch for the process to exit.
+
+    The exit watcher and the stream readers run concurrently; if the process
+    exits while its pipes are still held open, the readers get
+    PIPE_DRAIN_TIMEOUT seconds to finish draining.
 
     Args:
-        text: Text containing ANSI escape sequences
+        job_id: The job ID
+        process: The job's process
+        writer: The job's output writer
+        streams: Output streams by name (defaults to the process's stdout)
+        events: The job's event log
 
     Returns:
-        Cleaned text without ANSI codes
+        The process exit code
+    """
+    if streams is None:
+        streams = {"stdout": process.stdout} if process.stdout is not None else {}
+    if not streams:
+        return await process.wait()
+
+    readers = [
+        asyncio.create_task(pump_stream(stream, writer, events, name))
+        for name, stream in streams.items()
+    ]
+    all_read = asyncio.gather(*readers)
+    # Readers cancelled with the loop (e.g. at shutdown) leave a CancelledError on the gather
+    all_read.add_done_callback(lambda future: future.cancelled() or future.exception())
+    exit_watcher = asyncio.create_task(wait_for_exit(process))
+    try:
+        await asyncio.wait({all_read, exit_watcher}, return_when=asyncio.FIRST_COMPLETED)
+        if all_read.done():
+            # The pipes are closed, so the process is exiting (or already gone)
+            all_read.result()
+            return await process.wait()
+
+        try:
+            await asyncio.wait_for(all_read, timeout=PIPE_DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            pass
+        return process.returncode
+    finally:
+        # Cancelling the gathered readers cancels each of them
+        all_read.cancel()
+        if not exit_watcher.done():
+            exit_watcher.cancel()
+
+
+async def spawn_job_process(
+    job_id: str,
+    cmd: List[str],
+    preexec_fn: Optional[Callable[[], None]] = None,
+    stdin_mode: str = "none"
+) -> Tuple[asyncio.subprocess.Process, Dict[str, asyncio.StreamReader]]:
     """
-    if not text:
-        return text
+    Start a job's command in its own session.
 
-    # Pattern for ANSI escape sequences - comprehensive pattern
-    ansi_pattern = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+    stdout and stderr are read from separate pipes, except on a PTY, where
+    the job's output is a single stream (reported as stdout). Jobs started
+    with a "pipe" or "pty" stdin get an entry in job_inputs.
 
-    # Remove ANSI escape sequences
-    cleaned_text = ansi_pattern.sub('', text)
+    Args:
+        job_id: The job ID
+        cmd: The job's command line
+        preexec_fn: Function applying resource limits in the child
+        stdin_mode: "none" for /dev/null, "pipe", or "pty" to run the job on a
+            pseudo-terminal (stdin, stdout and stderr)
 
-    # Additional cleanup for specific control sequences we observed
-    # Remove cursor hide/show sequences [?25l and [?25h
-    cleaned_text = re.sub(r'\[\?25[hl]', '', cleaned_text)
+    Returns:
+        Tuple of the process and its output streams by name
+    """
+    master_fd = slave_fd = None
+    if stdin_mode == "pty":
+        master_fd, slave_fd = open_job_pty()
+        stdio = {"stdin": slave_fd, "stdout": slave_fd, "stderr": slave_fd}
+    else:
+        stdio = {
+            "stdin": asyncio.subprocess.PIPE if stdin_mode == "pipe" else asyncio.subprocess.DEVNULL,
+            "stdout": asyncio.subprocess.PIPE,
+            "stderr": asyncio.subprocess.PIPE
+        }
+    try:
+        process = await process_supervisor.spawn(
+            job_id,
+            *cmd,
+            start_new_session=True,
+            preexec_fn=preexec_fn,
+            **stdio
+        )
+    except BaseException:
+        if master_fd is not None:
+            os.close(master_fd)
+        raise
+    finally:
+        if slave_fd is not None:
+            os.close(slave_fd)
 
-    # Remove console mode sequences [?2026h and [?2026l
-    cleaned_text = re.sub(r'\[\?2026[hl]', '', cleaned_text)
+    if master_fd is None:
+        streams = {"stdout": process.stdout, "stderr": process.stderr}
+        if stdin_mode == "pipe":
+            job_inputs[job_id] = JobInput(pipe=process.stdin)
+    else:
+        # Read through a duplicate so the transport can own (and close) it
+        stream = asyncio.StreamReader()
+        await asyncio.get_running_loop().connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(stream), os.fdopen(os.dup(master_fd), "rb", buffering=0)
+        )
+        job_inputs[job_id] = JobInput(pty_fd=master_fd)
+        streams = {"stdout": stream}
+    return process, streams
 
-    # Remove cursor position commands like [1G
-    cleaned_text = re.sub(r'\[\d*G', '', cleaned_text)
 
-    # Remove line clear commands like [K and [2K
-    cleaned_text = re.sub(r'\[\d*K', '', cleaned_text)
+def record_resource_usage(job_id: str, process: asyncio.subprocess.Process) -> None:
+    """Store a job's resource usage in its metadata as soon as its process is reaped."""
+    usage = process_supervisor.resource_usage(process)
+    if usage is not None:
+        job_store.update_metadata(job_id, resources=usage)
 
-    # Remove any remaining escape sequences that weren't caught
-    cleaned_text = re.sub(r'\x1B\[.*?[a-zA-Z]', '', cleaned_text)
 
-    # Clean up carriage returns that aren't followed by newlines
-    cleaned_text = re.sub(r'\r(?!\n)', '', cleaned_text)
+process_supervisor.add_exit_listener(record_resource_usage)
 
-    # Remove standalone [ and ] that might be leftover from escape sequences
-    cleaned_text = re.sub(r'^\[', '', cleaned_text, flags=re.MULTILINE)
-    cleaned_text = re.sub(r'\]$', '', cleaned_text, flags=re.MULTILINE)
 
-    # Remove Unicode braille pattern characters used for spinners
-    cleaned_text = re.sub(r'[\u2800-\u28FF]', '', cleaned_text)
+def current_client_name() -> Optional[str]:
+    """
+    Name of the MCP client whose request is being handled, for job analytics.
 
-    # Remove any lines that are just whitespace or control characters
-    lines = cleaned_text.split('\n')
-    clean_lines = []
-    for line in lines:
-        # Keep lines that have actual content (letters or meaningful punctuation)
-        if line.strip() and any(c.isalpha() or c.isdigit() for c in line):
-            clean_lines.append(line.strip())
+    Returns:
+        The client name reported at initialization, or None outside a request
+    """
+    try:
+        client_params = mcp.get_context().session.client_params
+    except (LookupError, ValueError):
+        return None
+    return client_params.clientInfo.name if client_params else None
+
+
+def set_job_state(
+    job_id: str,
+    state: str,
+    error: Optional[str] = None,
+    exit_code: Optional[int] = None,
+    metadata: Optional[Dict[str, Any]] = None
+) -> Optional[JobRecord]:
+    """
+    Persist a job state transition.
 
-    cleaned_text = '\n'.join(clean_lines)
+    Transitions that are no longer valid (for example a capture task trying to
+    complete a job that was already cancelled) are ignored, as are transitions
+    requested while the server is shutting down.
 
-    # Normalize multiple consecutive newlines to max two
-    cleaned_text = re.sub(r'\n{3,}', '\n\n', cleaned_text)
+    Returns:
+        The updated job record, or None if the transition was skipped
+    """
+    if _shutting_down:
+        return None
+    try:
+        record = job_store.transition(job_id, state, error=error, exit_code=exit_code, metadata=metadata)
+    except (KeyError, InvalidTransitionError):
+        return None
 
-    # Trim leading/trailing whitespace
-    cleaned_text = cleaned_text.strip()
+    if record.is_terminal:
+        for waiter in job_waiters.pop(job_id, []):
+            if not waiter.done():
+                waiter.set_result(record)
 
-    return cleaned_text
+    # Make finished jobs searchable; anything missed here is picked up by the startup backfill
+    if record.is_terminal and job_store.search_available:
+        try:
+            task = asyncio.get_running_loop().create_task(index_job_for_search(job_id))
+            track_background_task(task)
+        except RuntimeError:
+            pass
+    return record
 
 
-def clean_ollama_output(content: str) -> str:
+async def wait_for_job(job_id: str) -> Optional[JobRecord]:
     """
-    Clean the output from an Ollama model, preserving metadata and prompt.
+    Wait for a job to reach a terminal state.
 
     Args:
-        content: Raw content from the output file
+        job_id: The job ID
 
     Returns:
-        Cleaned content with ANSI codes removed and JSON properly parsed
+        The finished job's record, or None if there is no such job
     """
-    if not content:
-        return content
+    record = job_store.get(job_id)
+    if record is None or record.is_terminal:
+        return record
+    waiter = asyncio.get_running_loop().create_future()
+    job_waiters.setdefault(job_id, []).append(waiter)
+    try:
+        return await waiter
+    finally:
+        waiters = job_waiters.get(job_id)
+        if waiters and waiter in waiters:
+            waiters.remove(waiter)
+            if not waiters:
+                del job_waiters[job_id]
+
+
+def append_job_notice(output_file: Optional[str], notice: str, job_id: Optional[str] = None) -> None:
+    """Append a marker such as "[JOB CANCELLED BY USER]" to a job's output file."""
+    # Go through the job's writer while it is open so the notice lands after buffered output
+    writer = job_writers.get(job_id) if job_id else None
+    if writer and not writer.closed:
+        writer.append(f"\n\n[{notice}]\n")
+        return
+    if not output_file or not os.path.exists(output_file):
+        return
+    try:
+        with open(output_file, "a") as f:
+            f.write(f"\n\n[{notice}]\n")
+    except IOError:
+        pass
 
-    # Check if this is an Ollama response
-    if "RESPONSE:" in content:
-        # Split into metadata/prompt and response
-        parts = content.split("RESPONSE:", 1)
-        header = parts[0] + "RESPONSE:\n"
-        response_text = parts[1]
 
-        # Check if the response might contain JSON
-        try:
-            # Try to parse each line as JSON
-            response_lines = response_text.strip().split('\n')
-            actual_response = ""
-
-            for line in response_lines:
-                line = line.strip()
-                if not line:
-                    continue
-
-                # Skip download progress lines
-                if "pulling" in line.lower() or "verifying" in line.lower() or "writing manifest" in line.lower() or "success" in line:
-                    continue
-                # Skip UI elements and token markers
-                if line.startswith(("r", "[", "╭", "│", "╰")):
-                    continue
-                if any(char in line for char in ["⠙", "⠹", "⠸", "⠼", "⠴", "⠦", "⠧", "⠇", "⠏"]):
-                    continue
-                if line.startswith("METADATA:") or line.startswith("PROMPT:"):
-                    continue
+def cleanup_processes() -> None:
+    """Clean up all running processes and background tasks"""
+    global _shutting_down
+    print("Cleaning up processes and tasks...")
 
-                try:
-                    json_data = json.loads(line)
-                    if "response" in json_data:
-                        actual_response += json_data["response"]
-                except json.JSONDecodeError:
-                    # Not JSON, but might be actual response text
-                    # Skip lines that look like token identifiers
-                    if not re.match(r'^[a-z]\d+', line):
-                        actual_response += line + "\n"
-
-            if actual_response:
-                # If we successfully extracted response data, use it
-                cleaned_response = clean_ansi_escape_codes(actual_response)
-                return header + cleaned_response
-
-            # If we couldn't extract a clean response, try a different approach
-            # Look for the [ASSISTANT] marker and extract text after it
-            if "[ASSISTANT]" in response_text:
-                assistant_parts = response_text.split("[ASSISTANT]", 1)
-                if len(assistant_parts) > 1:
-                    assistant_response = assistant_parts[1].strip()
-                    # Remove any remaining UI elements
-                    cleaned_response = re.sub(r'\[.*?\]', '', assistant_response)
-                    cleaned_response = clean_ansi_escape_codes(cleaned_response)
-                    return header + cleaned_response
+    # Record what happens to in-flight jobs before we kill them, so the next
+    # start can re-queue resumable work instead of leaving it "running" forever
+    if not _shutting_down:
+        for record in job_store.list_jobs(states=[RUNNING]):
+            if record.job_type in RESUMABLE_JOB_TYPES and RESUME_GENERATIONS:
+                job_store.transition(record.job_id, QUEUED, error="Interrupted by server shutdown")
+            else:
+                job_store.transition(record.job_id, FAILED, error="Server shut down while the job was running")
+                append_job_notice(record.output_file, "JOB FAILED: SERVER SHUT DOWN", job_id=record.job_id)
+        _shutting_down = True
 
-        except Exception:
-            # Fall back to original cleaning if JSON parsing fails
-            pass
+    # Cancel background tasks
+    for task in background_tasks.copy():  # Use copy to avoid modification during iteration
+        if not task.done():
+            task.cancel()
+    
+    # Terminate all processes (the event loop may already be gone, so wait synchronously)
+    for job_id, process in list(running_processes.items()):  # Use list() to avoid modification during iteration
+        if is_process_running(process):
+            print(f"Terminating process {job_id}")
+            signal_process_group(process.pid, signal.SIGTERM)
+            if not _wait_pid(process.pid, timeout=5):
+                print(f"Force killing process {job_id}")
+            kill_process_group(process.pid)
+            _wait_pid(process.pid, timeout=2)  # If it's really stuck, move on
+    
+    # Flush whatever output is still buffered
+    for writer in list(job_writers.values()):
+        writer.close_now()
+    job_writers.clear()
 
-        # Clean the response text (fallback)
-        cleaned_response = clean_ansi_escape_codes(response_text)
+    for session in list(shell_sessions.values()):
+        session.close_now()
+    shell_sessions.clear()
 
-        # Final attempt to extract only the meaningful content
-        # Remove token markers and UI elements
-        cleaned_response = re.sub(r'r\d+[a-z]*', '', cleaned_response)
-        cleaned_response = re.sub(r'\[[^\]]+\]', '', cleaned_response)
-        cleaned_response = re.sub(r'[╭│╰─]', '', cleaned_response)
-        cleaned_response = re.sub(r'[⠙⠹⠸⠼⠴⠦⠧⠇⠏]', '', cleaned_response)
+    running_processes.clear()
+    background_tasks.clear()
+    print("Cleanup completed")
 
-        # Reconstruct the content
-        return header + cleaned_response
 
-    # If not a typical Ollama response, return as is
-    return content
+def signal_handler(signum: int, frame) -> None:
+    """Handle termination signals"""
+    print(f"Received signal {signum}, cleaning up...")
+    cleanup_processes()
+    sys.exit(0)
+
+
+# CRITICAL: Register cleanup handlers
+signal.signal(signal.SIGTERM, signal_handler)
+signal.signal(signal.SIGINT, signal_handler)
+atexit.register(cleanup_processes)
 
 
 @mcp.tool()
 async def list_ollama_models() -> Dict[str, Any]:
     """List all available Ollama models - Shows installed models with correct names and sizes"""
     try:
-        process = subprocess.run(
+        # Run in a worker thread so a slow daemon doesn't stall the event loop
+        process = await asyncio.to_thread(
+            subprocess.run,
             ["ollama", "list"],
             capture_output=True,
             text=True,
@@ -321,6 +706,171 @@ async def list_ollama_models() -> Dict[str, Any]:
         }
 
 
+def get_ollama_client() -> httpx.AsyncClient:
+    """
+    Return the shared Ollama API client.
+
+    Building a client costs tens of milliseconds of event-loop time, which
+    adds up quickly when a batch starts many generations at once.
+
+    Returns:
+        The shared HTTP client
+    """
+    global _ollama_client
+    if _ollama_client is None or _ollama_client.is_closed:
+        # No connection cap: every generation keeps its own connection so it can be aborted
+        _ollama_client = httpx.AsyncClient(
+            timeout=OLLAMA_HTTP_TIMEOUT,
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=20)
+        )
+    return _ollama_client
+
+
+def _start_ollama_job(
+    job_id: str,
+    output_file: Path,
+    ollama_input: Dict[str, Any],
+    timeout: Optional[float] = None,
+    stall_timeout: Optional[float] = None,
+    stall_retries: int = 0
+) -> asyncio.Task:
+    """
+    Start a generation job against the Ollama API in the background.
+
+    The response is streamed into the output file as it is generated.
+    Cancelling the returned task closes the HTTP connection, which makes
+    Ollama stop decoding and frees its slot immediately.
+
+    A generation that runs past its deadline, produces no token for
+    stall_timeout seconds, or reaches its token limit is stopped the same
+    way and ends as timed_out, stalled or token_limit respectively.
+
+    Args:
+        job_id: The job ID (already persisted in the job store)
+        output_file: Output file with the job header already written
+        ollama_input: Request body for the Ollama generate API
+        timeout: Total time allowed for the generation in seconds (None or 0 for no limit)
+        stall_timeout: Time allowed between tokens in seconds (None or 0 for no limit)
+        stall_retries: How many times to restart a stalled generation before giving up
+
+    Returns:
+        The task running the generation
+    """
+    request_body = dict(ollama_input, stream=True)
+    max_tokens = (ollama_input.get("options") or {}).get("num_predict")
+    # Retries rewind the output file to where the response starts
+    response_offset = output_file.stat().st_size
+
+    set_job_state(job_id, RUNNING)
+
+    async def stream_once(writer: JobOutputWriter, stats: Dict[str, Any]) -> Tuple[str, Optional[str]]:
+        """Run one generation attempt and return (final state, error)."""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + timeout if timeout else None
+
+        def next_deadline() -> Optional[float]:
+            candidates = [d for d in (deadline, loop.time() + stall_timeout if stall_timeout else None) if d]
+            return min(candidates) if candidates else None
+
+        try:
+            async with asyncio.timeout(next_deadline()) as watchdog:
+                async with get_ollama_client().stream("POST", f"{OLLAMA_API_URL}/api/generate", json=request_body) as response:
+                    if response.status_code != 200:
+                        body = (await response.aread()).decode("utf-8", errors="replace")
+                        try:
+                            error_text = json.loads(body).get("error", body)
+                        except json.JSONDecodeError:
+                            error_text = body or f"HTTP {response.status_code}"
+                        await writer.write(f"Error: {error_text}")
+                        return FAILED, error_text
+
+                    async for line in response.aiter_lines():
+                        if not line.strip():
+                            continue
+                        try:
+                            chunk = json.loads(line)
+                        except json.JSONDecodeError:
+                            continue
+                        if "error" in chunk:
+                            await writer.write(f"Error: {chunk['error']}")
+                            return FAILED, chunk["error"]
+                        text = chunk.get("response", "")
+                        if text:
+                            # Guard against backends that ignore num_predict
+                            if max_tokens and stats["tokens_generated"] >= max_tokens:
+                                return TOKEN_LIMIT, f"Stopped after reaching the limit of {max_tokens} tokens"
+                            # Ollama streams one token per chunk
+                            stats["tokens_generated"] += 1
+                            if stats["ttft_seconds"] is None:
+                                stats["ttft_seconds"] = round(loop.time() - started, 3)
+                            await writer.write(text)
+                            watchdog.reschedule(next_deadline())
+                        if chunk.get("done"):
+                            stats["tokens_generated"] = chunk.get("eval_count", stats["tokens_generated"])
+                            stats["prompt_tokens"] = chunk.get("prompt_eval_count")
+                            if chunk.get("done_reason") == "length":
+                                return TOKEN_LIMIT, f"Stopped after reaching the limit of {max_tokens} tokens"
+                            return COMPLETED, None
+            return FAILED, "Ollama closed the stream before the generation finished"
+        except TimeoutError:
+            if deadline and loop.time() >= deadline:
+                return TIMED_OUT, f"Generation exceeded its {timeout} second time limit"
+            return STALLED, f"No token received for {stall_timeout} seconds"
+        except httpx.HTTPError as e:
+            return FAILED, f"Ollama request failed: {str(e)}"
+
+    async def generate():
+        started = time.monotonic()
+        stats: Dict[str, Any] = {"tokens_generated": 0, "prompt_tokens": None, "ttft_seconds": None}
+        stall_restarts = 0
+        writer = None
+
+        try:
+            while True:
+                writer = JobOutputWriter(output_file)
+                writer.start()
+                job_writers[job_id] = writer
+                state, error_text = await stream_once(writer, stats)
+                if state != STALLED or stall_restarts >= stall_retries:
+                    break
+
+                # Discard the stalled attempt and start over
+                stall_restarts += 1
+                await writer.close()
+                os.truncate(output_file, response_offset)
+                stats.update(tokens_generated=0, prompt_tokens=None, ttft_seconds=None)
+                job_store.update_metadata(job_id, stall_restarts=stall_restarts)
+        except asyncio.CancelledError:
+            # The connection is already closed at this point; record how far it got
+            job_store.update_metadata(
+                job_id,
+                tokens_generated=stats["tokens_generated"],
+                aborted_after_seconds=round(time.monotonic() - started, 3)
+            )
+            raise
+        except Exception as e:
+            state, error_text = FAILED, f"Generation failed: {str(e)}"
+        finally:
+            if writer is not None:
+                await writer.close()
+            job_writers.pop(job_id, None)
+            running_generations.pop(job_id, None)
+
+        stats["duration_seconds"] = round(time.monotonic() - started, 3)
+        if stall_restarts:
+            stats["stall_restarts"] = stall_restarts
+        if state in (TIMED_OUT, STALLED):
+            append_job_notice(output_file, f"JOB {JOB_STATUS_NAMES[state].upper()}: {error_text}")
+        set_job_state(job_id, state, error=error_text, metadata=stats)
+
+    task = asyncio.create_task(generate())
+    track_background_task(task)  # CRITICAL: Track the task
+    running_generations[job_id] = task
+
+    return task
+
+
 @mcp.tool()
 async def run_ollama_prompt(
     model: str,
@@ -329,26 +879,54 @@ async def run_ollama_prompt(
     temperature: float = 0.7,
     wait_for_result: bool = False,
     max_tokens: Optional[int] = None,
-    output_format: str = "text"
+    output_format: str = "text",
+    timeout: Optional[float] = None,
+    stall_timeout: Optional[float] = None,
+    stall_retries: int = 0,
+    batch_id: Optional[str] = None
 ) -> Dict[str, Any]:
-    """Run a prompt with Ollama model - Execute prompts with specified models synchronously or asynchronously"""
+    """
+    Run a prompt with Ollama model - Execute prompts with specified models synchronously or asynchronously
+
+    Args:
+        model: Name of the Ollama model
+        prompt: The prompt text
+        system_prompt: Optional system prompt
+        temperature: Sampling temperature
+        wait_for_result: Wait for the generation to finish and return its content
+        max_tokens: Stop after this many tokens (job ends as "token_limit")
+        output_format: "text" or "json"
+        timeout: Total seconds allowed (job ends as "timed_out"); defaults to OLLAMA_MCP_GENERATION_TIMEOUT
+        stall_timeout: Seconds allowed without a new token (job ends as "stalled");
+            defaults to OLLAMA_MCP_STALL_TIMEOUT
+        stall_retries: Restart a stalled generation this many times before giving up
+        batch_id: Optional batch label, for checking many jobs at once with get_jobs_status
+
+    Returns:
+        Dict with the job ID and status, plus content when waiting for the result
+    """
     # Generate a unique job ID
-    job_id = str(uuid.uuid4())
-    output_file = OUTPUTS_DIR / f"{job_id}.txt"
+    job_id = new_job_id()
+    output_file = job_output_path(OUTPUTS_DIR, job_id, "ollama")
+
+    limits = {
+        "timeout": GENERATION_TIMEOUT if timeout is None else timeout,
+        "stall_timeout": STALL_TIMEOUT if stall_timeout is None else stall_timeout,
+        "stall_retries": stall_retries
+    }
 
-    # Prepare the Ollama API call using curl
+    # Prepare the Ollama API request; sampling parameters go in "options"
     ollama_input = {
         "model": model,
         "prompt": prompt,
-        "stream": False,  # Use non-streaming for simpler processing
-        "temperature": temperature
+        "options": {"temperature": temperature}
     }
 
     if system_prompt:
         ollama_input["system"] = system_prompt
 
     if max_tokens:
-        ollama_input["num_predict"] = max_tokens
+        ollama_input["options"]["num_predict"] = max_tokens
 
     if output_format == "json":
         ollama_input["format"] = "json"
@@ -363,253 +941,1019 @@ async def run_ollama_prompt(
                 "temperature": temperature,
                 "system_prompt": system_prompt,
                 "max_tokens": max_tokens,
-                "output_format": output_format
+                "output_format": output_format,
+                **limits
             }
         }
-        f.write(f"METADATA: {json.dumps(metadata)}\n\n")
-        f.write(f"PROMPT: {prompt}\n\n")
-        f.write("RESPONSE:\n")
-
-    # Use curl to call the Ollama API with silent mode to avoid progress output
-    cmd = [
-        "curl", "-s", "-X", "POST",
-        "http://localhost:11434/api/generate",
-        "-H", "Content-Type: application/json",
-        "-d", json.dumps(ollama_input)
-    ]
+        f.write(f"METADATA: {json.dumps(metadata)}\n\n")
+        f.write(f"PROMPT: {prompt}\n\n")
+        f.write("RESPONSE:\n")
+
+    # Persist the job before starting it, along with everything needed to
+    # resume it (and where the response starts) after a restart
+    job_store.create(
+        job_id, "ollama", output_file,
+        params={
+            "ollama_input": ollama_input,
+            "limits": limits,
+            "response_offset": output_file.stat().st_size
+        },
+        model=model,
+        metadata={"server_pid": os.getpid(), "client": current_client_name()},
+        batch_id=batch_id or current_batch_id.get()
+    )
+
+    try:
+        task = _start_ollama_job(job_id, output_file, ollama_input, **limits)
+
+        # If wait_for_result is True, wait for the generation to finish
+        if wait_for_result:
+            # asyncio.wait leaves the job running if this tool call is cancelled,
+            # and doesn't raise if cancel_job aborts the generation
+            await asyncio.wait({task})
+
+            record = job_store.get(job_id)
+            if task.cancelled():
+                return {
+                    "status": "cancelled",
+                    "job_id": job_id,
+                    "tokens_generated": record.metadata.get("tokens_generated") if record else None,
+                    "message": "Generation was cancelled"
+                }
+            if record and record.state in (COMPLETED, TOKEN_LIMIT):
+                try:
+                    with open(output_file, "r") as f:
+                        content = f.read()
+
+                    # Clean the output
+                    content = clean_ollama_output(content)
+
+                    result = {
+                        "status": JOB_STATUS_NAMES[record.state],
+                        "job_id": job_id,
+                        "output_file": str(output_file),
+                        "content": content
+                    }
+                    if record.error:
+                        result["message"] = record.error
+                    return result
+                except Exception as e:
+                    return {
+                        "status": "error",
+                        "job_id": job_id,
+                        "message": f"Error reading output: {str(e)}"
+                    }
+            else:
+                return {
+                    "status": JOB_STATUS_NAMES[record.state] if record and record.state in (TIMED_OUT, STALLED) else "error",
+                    "job_id": job_id,
+                    "message": record.error if record and record.error else "Generation did not complete"
+                }
+
+        # Return immediately with job information
+        return {
+            "status": "running",
+            "job_id": job_id,
+            "output_file": str(output_file),
+            "message": "Generation started, check job status for completion"
+        }
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        set_job_state(job_id, FAILED, error=f"Failed to start generation: {str(e)}")
+        return {
+            "status": "error",
+            "job_id": job_id,
+            "message": f"Failed to start generation: {str(e)}"
+        }
+
+
+# Job types whose output files need no cleaning when read: bash output is
+# kept verbatim and fast-agent output is cleaned as it is captured
+STORED_AS_SERVED_JOB_TYPES = ("bash", "fastagent")
+
+
+def load_job_content(job_id: str, output_file: Path) -> str:
+    """
+    Return a finished job's cleaned output, served from the result cache when possible.
+
+    Args:
+        job_id: The job ID
+        output_file: Path of the job's output file
+
+    Returns:
+        The cleaned output text
+    """
+    content = result_cache.get(job_id)
+    if content is None:
+        with open(output_file, "r") as f:
+            content = f.read()
+
+        # Clean the output unless it is stored as served
+        _, job_type = split_job_file_stem(Path(output_file).stem)
+        if job_type not in STORED_AS_SERVED_JOB_TYPES:
+            content = clean_ollama_output(content)
+
+        result_cache.put(job_id, content)
+    return content
+
+
+def read_job_tail(job_id: str, output_file: Optional[str], chars: int) -> str:
+    """
+    Return the last characters of a job's raw output without reading the whole file.
+
+    Args:
+        job_id: The job ID
+        output_file: Path of the job's output file
+        chars: Number of trailing characters to return
+
+    Returns:
+        The trailing output text (empty if the file is missing)
+    """
+    writer = job_writers.get(job_id)
+    if writer and not writer.closed:
+        return writer.tail(chars)
+    if not output_file or not os.path.exists(output_file):
+        return ""
+    with open(output_file, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        # UTF-8 uses at most 4 bytes per character
+        f.seek(max(0, size - chars * 4))
+        data = f.read()
+    return data.decode("utf-8", errors="replace")[-chars:]
+
+
+def read_output_body_tail(output_file: Optional[str], chars: int) -> str:
+    """
+    Return the last characters of a finished job's output, stopping at the end of the file's header.
+
+    Args:
+        output_file: Path of the job's output file
+        chars: Number of trailing characters to return
+
+    Returns:
+        The trailing output text (empty if the file is missing)
+    """
+    if not output_file or not os.path.exists(output_file):
+        return ""
+    with open(output_file, "rb") as f:
+        body_start = 0
+        while True:
+            line = f.readline()
+            if not line:
+                break
+            if line.decode("utf-8", errors="replace") in SEARCH_OUTPUT_MARKERS:
+                body_start = f.tell()
+                break
+        size = f.seek(0, os.SEEK_END)
+        # UTF-8 uses at most 4 bytes per character
+        f.seek(max(body_start, size - chars * 4))
+        data = f.read()
+    return data.decode("utf-8", errors="replace")[-chars:]
+
+
+def output_size_fields(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Output size counters recorded for a captured command.
+
+    Args:
+        metadata: The job's metadata
+
+    Returns:
+        Dict with output_bytes, stored_bytes and truncated, where recorded
+    """
+    return {key: metadata[key] for key in ("output_bytes", "stored_bytes", "truncated") if key in metadata}
+
+
+# Longest output (in characters) stored in the full-text index per job
+SEARCH_MAX_OUTPUT_CHARS = 1_000_000
+
+# Header lines that end before the output itself in each kind of output file
+SEARCH_OUTPUT_MARKERS = ("RESPONSE:\n", "OUTPUT:\n")
+
+
+def read_clean_output(record: JobRecord) -> Optional[str]:
+    """
+    Read and clean a job's output without going through the result cache.
+
+    Args:
+        record: The job record
+
+    Returns:
+        The cleaned output text, or None if the output file cannot be found
+    """
+    content = read_raw_output(OUTPUTS_DIR, record)
+    if content is not None and record.job_type not in STORED_AS_SERVED_JOB_TYPES:
+        content = clean_ollama_output(content)
+    return content
+
+
+def job_output_body(record: JobRecord) -> str:
+    """
+    A job's cleaned output without the header of its output file.
+
+    Args:
+        record: The job record
+
+    Returns:
+        The output after the RESPONSE:/OUTPUT: line (empty if the file is missing)
+    """
+    output = read_clean_output(record) or ""
+    for marker in SEARCH_OUTPUT_MARKERS:
+        if marker in output:
+            return output.split(marker, 1)[1]
+    return output
+
+
+def build_search_document(record: JobRecord) -> Tuple[str, str, str]:
+    """
+    Extract the searchable prompt, system prompt and output of a finished job.
+
+    Args:
+        record: The job record
+
+    Returns:
+        Tuple of (prompt, system prompt, cleaned output)
+    """
+    params = record.params
+    prompt = system_prompt = ""
+    if record.job_type == "ollama":
+        ollama_input = params.get("ollama_input", {})
+        prompt = ollama_input.get("prompt", "")
+        system_prompt = ollama_input.get("system", "")
+    elif record.job_type == "bash":
+        prompt = params.get("command", "")
+    elif record.job_type == "fastagent":
+        cmd = params.get("cmd", [])
+        if "--message" in cmd and cmd.index("--message") + 1 < len(cmd):
+            prompt = cmd[cmd.index("--message") + 1]
+    elif record.job_type == "workflow":
+        prompt = "\n".join(step.get("name", step.get("tool", "")) for step in params.get("steps", []))
+
+    return prompt, system_prompt, job_output_body(record)[:SEARCH_MAX_OUTPUT_CHARS]
+
+
+async def index_job_for_search(job_id: str) -> None:
+    """
+    Add a finished job to the full-text index.
+
+    Args:
+        job_id: The job ID
+    """
+    # Cancelled jobs can still be flushing their last output
+    for _ in range(50):
+        if job_id not in job_writers:
+            break
+        await asyncio.sleep(0.1)
+
+    record = job_store.get(job_id)
+    if record is None:
+        return
+
+    def index() -> None:
+        try:
+            document = build_search_document(record)
+        except (IOError, UnicodeDecodeError):
+            document = ("", "", "")
+        job_store.index_search_document(job_id, *document)
+
+    try:
+        await asyncio.to_thread(index)
+    except Exception as e:
+        print(f"Failed to index job {job_id} for search: {str(e)}", file=sys.stderr)
+
+
+async def backfill_search_index(batch_size: int = 200) -> int:
+    """
+    Index finished jobs that are missing from the full-text index.
+
+    Args:
+        batch_size: Number of jobs to index per database round trip
+
+    Returns:
+        Number of jobs indexed
+    """
+    indexed = 0
+    while True:
+        records = job_store.unindexed_jobs(limit=batch_size)
+        if not records:
+            return indexed
+
+        def index_batch() -> None:
+            for record in records:
+                try:
+                    document = build_search_document(record)
+                except (IOError, UnicodeDecodeError):
+                    document = ("", "", "")
+                job_store.index_search_document(record.job_id, *document)
+
+        await asyncio.to_thread(index_batch)
+        indexed += len(records)
+
+
+# Map persisted job states onto the status strings returned by get_job_status
+JOB_STATUS_NAMES = {
+    QUEUED: "queued",
+    RUNNING: "running",
+    COMPLETED: "complete",
+    FAILED: "failed",
+    CANCELLED: "cancelled",
+    TIMED_OUT: "timed_out",
+    STALLED: "stalled",
+    TOKEN_LIMIT: "token_limit",
+}
+
+
+@mcp.tool()
+async def get_job_status(job_id: str) -> Dict[str, Any]:
+    """
+    Check the status of a specific job by its ID.
+
+    Args:
+        job_id: The ID of the job to check
+
+    Returns:
+        Dict with job status information and content if complete
+    """
+    # Accept legacy "<id>_bash" style IDs as listed by older versions
+    job_id, _ = split_job_file_stem(job_id)
+    record = job_store.get(job_id)
+    output_file = resolve_output_file(OUTPUTS_DIR, job_id, record.output_file if record else None)
+
+    if output_file is None:
+        return {
+            "status": "not_found",
+            "message": f"No job found with ID {job_id}"
+        }
+
+    # Check if the process is still running
+    process = running_processes.get(job_id)
+    if is_process_running(process) or (record and not record.is_terminal):
+        result = {
+            "status": JOB_STATUS_NAMES.get(record.state, "running") if record else "running",
+            "job_id": job_id,
+            "output_file": str(output_file)
+        }
+        queue_position = job_pool.queue_position(job_id)
+        if queue_position is not None:
+            result["queue_position"] = queue_position
+        return result
+
+    try:
+        content = load_job_content(job_id, output_file)
+    except Exception as e:
+        return {
+            "status": "error",
+            "job_id": job_id,
+            "message": f"Error reading output file: {str(e)}"
+        }
+
+    result = {
+        # Jobs that predate the job store have no record and are reported as complete
+        "status": JOB_STATUS_NAMES[record.state] if record else "complete",
+        "job_id": job_id,
+        "output_file": str(output_file),
+        "content": content
+    }
+    if record:
+        if record.exit_code is not None:
+            result["exitcode"] = record.exit_code
+        if record.error:
+            result["error"] = record.error
+        result.update(output_size_fields(record.metadata))
+        if "resources" in record.metadata:
+            result["resources"] = record.metadata["resources"]
+    return result
+
+@mcp.tool()
+async def get_jobs_status(
+    job_ids: Optional[List[str]] = None,
+    batch_id: Optional[str] = None,
+    content: str = "none",
+    tail_chars: int = 2000
+) -> Dict[str, Any]:
+    """
+    Check the status of many jobs in one call.
+
+    Statuses come straight from the job index, so no output files are read
+    unless content is requested.
+
+    Args:
+        job_ids: IDs of the jobs to check
+        batch_id: Check every job of this batch or workflow run instead
+        content: "none" for status only, "tail" for the last tail_chars of each
+            job's output, or "full" for the cleaned output of finished jobs
+        tail_chars: Number of characters returned per job with content="tail"
+
+    Returns:
+        Dict with one status row per job, counts by status and any unknown IDs
+    """
+    if content not in ("none", "tail", "full"):
+        return {
+            "status": "error",
+            "message": f"Invalid content projection '{content}' (expected none, tail or full)"
+        }
+    if not job_ids and not batch_id:
+        return {
+            "status": "error",
+            "message": "Provide job_ids or batch_id"
+        }
+
+    if batch_id:
+        records = job_store.list_jobs(batch_id=batch_id)
+        not_found: List[str] = []
+    else:
+        # Accept legacy "<id>_bash" style IDs as listed by older versions
+        requested = [split_job_file_stem(job_id)[0] for job_id in job_ids]
+        found = job_store.get_many(requested)
+        records = [found[job_id] for job_id in dict.fromkeys(requested) if job_id in found]
+        not_found = [job_id for job_id in dict.fromkeys(requested) if job_id not in found]
+
+    def build_rows() -> List[Dict[str, Any]]:
+        rows = []
+        for record in records:
+            row: Dict[str, Any] = {
+                "job_id": record.job_id,
+                "status": JOB_STATUS_NAMES.get(record.state, record.state),
+                "job_type": record.job_type,
+                "model": record.model,
+                "created_at": record.created_at,
+                "finished_at": record.finished_at
+            }
+            if record.exit_code is not None:
+                row["exitcode"] = record.exit_code
+            if record.error:
+                row["error"] = record.error
+            try:
+                if content == "tail":
+                    row["content"] = read_job_tail(record.job_id, record.output_file, tail_chars)
+                elif content == "full" and record.is_terminal:
+                    output_file = resolve_output_file(OUTPUTS_DIR, record.job_id, record.output_file)
+                    if output_file is not None:
+                        row["content"] = load_job_content(record.job_id, output_file)
+            except (IOError, UnicodeDecodeError) as e:
+                row["content_error"] = str(e)
+            rows.append(row)
+        return rows
+
+    # Only reading output files needs to leave the event loop
+    rows = build_rows() if content == "none" else await asyncio.to_thread(build_rows)
+
+    counts: Dict[str, int] = {}
+    for row in rows:
+        counts[row["status"]] = counts.get(row["status"], 0) + 1
+
+    result = {
+        "status": "success",
+        "jobs": rows,
+        "counts": counts
+    }
+    if not_found:
+        result["not_found"] = not_found
+    return result
+
+@mcp.tool()
+async def search_jobs(
+    query: str,
+    model: Optional[str] = None,
+    job_type: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    limit: int = 20
+) -> Dict[str, Any]:
+    """
+    Search the prompts and outputs of finished jobs.
+
+    Args:
+        query: Words to search for; FTS5 syntax such as "exact phrase", OR, NOT and prefix* is supported
+        model: Only return jobs run with this model
+        job_type: Only return jobs of this type ("ollama", "bash", "fastagent", "workflow")
+        since: Only return jobs created on or after this date (ISO 8601, UTC unless given)
+        until: Only return jobs created before this date (ISO 8601, UTC unless given)
+        limit: Maximum number of results
+
+    Returns:
+        Dict with matching jobs, best first, each with a highlighted snippet
+    """
+    if not job_store.search_available:
+        return {
+            "status": "error",
+            "message": "Full-text search requires SQLite with FTS5 support"
+        }
+    try:
+        since_ts = parse_time_filter(since)
+        until_ts = parse_time_filter(until)
+    except ValueError as e:
+        return {
+            "status": "error",
+            "message": f"Invalid date filter: {str(e)}"
+        }
+
+    started = time.perf_counter()
+    try:
+        results = await asyncio.to_thread(
+            job_store.search, query,
+            model=model, job_type=job_type, since=since_ts, until=until_ts, limit=limit
+        )
+    except sqlite3.Error as e:
+        return {
+            "status": "error",
+            "message": f"Search failed: {str(e)}"
+        }
+
+    for result in results:
+        result["status"] = JOB_STATUS_NAMES.get(result.pop("state"), "complete")
+
+    return {
+        "status": "success",
+        "query": query,
+        "results": results,
+        "took_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
+
+
+@mcp.tool()
+async def job_stats(
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    group_by: Optional[str] = "model",
+    job_type: Optional[str] = None,
+    model: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Aggregate statistics of finished jobs over a time window.
+
+    Reports count, error rate, latency and time-to-first-token percentiles,
+    tokens in/out, generation speed and the CPU time, peak memory and block
+    I/O of bash and fast-agent jobs. Served from hourly rollups, so the
+    window is rounded out to whole hours and percentiles are accurate to
+    about 10%.
+
+    Args:
+        since: Start of the window (ISO 8601 or Unix timestamp, default 7 days ago)
+        until: End of the window (ISO 8601 or Unix timestamp, default now)
+        group_by: "model", "job_type", "client", or None for a single total
+        job_type: Only include jobs of this type
+        model: Only include jobs run with this model
+
+    Returns:
+        Dict with statistics per group
+    """
+    try:
+        until_ts = parse_time_filter(until) or time.time()
+        since_ts = parse_time_filter(since) or until_ts - 7 * 24 * 3600
+    except ValueError as e:
+        return {
+            "status": "error",
+            "message": f"Invalid date filter: {str(e)}"
+        }
+
+    try:
+        groups = await asyncio.to_thread(
+            job_store.rollup_stats, since_ts, until_ts,
+            group_by=group_by, job_type=job_type, model=model
+        )
+    except ValueError as e:
+        return {
+            "status": "error",
+            "message": str(e)
+        }
+
+    return {
+        "status": "success",
+        "since": datetime.fromtimestamp(since_ts, tz=timezone.utc).isoformat(),
+        "until": datetime.fromtimestamp(until_ts, tz=timezone.utc).isoformat(),
+        "group_by": group_by,
+        "groups": groups
+    }
+
+
+@mcp.tool()
+async def export_jobs(
+    path: Optional[str] = None,
+    format: str = "jsonl",
+    columns: Optional[List[str]] = None,
+    include_output: bool = False,
+    states: Optional[List[str]] = None,
+    job_type: Optional[str] = None,
+    model: Optional[str] = None,
+    batch_id: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Export job history to a JSONL or CSV file for offline analysis.
+
+    Rows are streamed to disk, so large exports do not load the history into memory.
+
+    Args:
+        path: File to write; relative paths are placed in outputs/exports (default: a timestamped file there)
+        format: "jsonl" or "csv"
+        columns: Columns to export (default: all job fields except params; "output" adds the cleaned output)
+        include_output: Include each job's cleaned output
+        states: Only export jobs in these states (e.g. ["completed"])
+        job_type: Only export jobs of this type
+        model: Only export jobs run with this model
+        batch_id: Only export jobs of this batch or workflow run
+        since: Only export jobs created on or after this date (ISO 8601 or Unix timestamp)
+        until: Only export jobs created before this date (ISO 8601 or Unix timestamp)
+
+    Returns:
+        Dict with the export file path, row count and size
+    """
+    if format not in EXPORT_FORMATS:
+        return {
+            "status": "error",
+            "message": f"Unknown export format '{format}' (expected jsonl or csv)"
+        }
+    try:
+        since_ts = parse_time_filter(since)
+        until_ts = parse_time_filter(until)
+    except ValueError as e:
+        return {
+            "status": "error",
+            "message": f"Invalid date filter: {str(e)}"
+        }
+
+    destination = Path(path) if path else Path(f"jobs-{time.strftime('%Y%m%d-%H%M%S')}.{format}")
+    if not destination.is_absolute():
+        destination = OUTPUTS_DIR / "exports" / destination
+
+    try:
+        summary = await asyncio.to_thread(
+            write_job_export, job_store, OUTPUTS_DIR, destination,
+            export_format=format,
+            columns=columns,
+            include_output=include_output,
+            read_output=read_clean_output,
+            states=states,
+            job_type=job_type,
+            model=model,
+            batch_id=batch_id,
+            since=since_ts,
+            until=until_ts
+        )
+    except (ValueError, OSError) as e:
+        return {
+            "status": "error",
+            "message": f"Export failed: {str(e)}"
+        }
+
+    return {
+        "status": "success",
+        **summary
+    }
+
+
+@mcp.tool()
+async def list_jobs() -> Dict[str, Any]:
+    """
+    List all jobs - both running and completed.
+
+    Returns:
+        Dict with lists of running and completed jobs
+    """
+    # Exited processes are dropped by the process supervisor as soon as they exit
+    running_jobs = list(running_processes)
+
+    # Everything else comes from the job index rather than scanning output files
+    completed_jobs = []
+    indexed_ids = set()
+    for record in job_store.list_jobs():
+        indexed_ids.add(record.job_id)
+        if not record.is_terminal:
+            if record.job_id not in running_jobs:
+                running_jobs.append(record.job_id)
+            continue
+        completed_jobs.append({
+            "job_id": record.job_id,
+            "output_file": record.output_file,
+            "timestamp": record.created_at,
+            "model": record.model,
+            "state": record.state
+        })
+
+    # Legacy flat output files that have not been migrated into the index yet
+    for output_file in OUTPUTS_DIR.glob("*.txt"):
+        job_id = output_file.stem.split("_", 1)[0]
+        if job_id in indexed_ids or job_id in running_jobs:
+            continue
+        # Get metadata if available
+        try:
+            with open(output_file, "r") as f:
+                first_line = f.readline().strip()
+                if first_line.startswith("METADATA:"):
+                    metadata = json.loads(first_line[9:])
+                    completed_jobs.append({
+                        "job_id": job_id,
+                        "output_file": str(output_file),
+                        "timestamp": metadata.get("timestamp"),
+                        "model": metadata.get("model")
+                    })
+                else:
+                    completed_jobs.append({
+                        "job_id": job_id,
+                        "output_file": str(output_file),
+                        "timestamp": output_file.stat().st_mtime
+                    })
+        except (IOError, json.JSONDecodeError):
+            # Fall back to file stats if metadata parsing fails
+            completed_jobs.append({
+                "job_id": job_id,
+                "output_file": str(output_file),
+                "timestamp": output_file.stat().st_mtime
+            })
+
+    # Sort completed jobs by timestamp, newest first
+    completed_jobs.sort(key=lambda x: x.get("timestamp") or 0, reverse=True)
+
+    return {
+        "running_jobs": running_jobs,
+        "completed_jobs": completed_jobs
+    }
+
+
+@mcp.tool()
+async def migrate_job_outputs(
+    dry_run: bool = False,
+    limit: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Move legacy flat output files into the sharded date/hash layout.
+
+    Safe to run while jobs are executing: active jobs and recently modified
+    files are skipped, and old job IDs keep resolving throughout.
+
+    Args:
+        dry_run: Only report how many files would be moved
+        limit: Maximum number of files to move in this call
+
+    Returns:
+        Dict with counts of moved and skipped files
+    """
+    try:
+        summary = await asyncio.to_thread(
+            migrate_flat_outputs, OUTPUTS_DIR, job_store, dry_run=dry_run, limit=limit
+        )
+        return {
+            "status": "success",
+            "dry_run": dry_run,
+            **summary
+        }
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": f"Migration failed: {str(e)}"
+        }
+
+
+@mcp.tool()
+async def server_stats() -> Dict[str, Any]:
+    """
+    Report the server's current resource usage.
+
+    Returns:
+        Dict with result cache usage, tracked processes and tasks, job pool
+        slots and queues, process supervisor counters and job counts by state
+    """
+    return {
+        "status": "success",
+        "result_cache": result_cache.stats(),
+        "running_processes": len(running_processes),
+        "running_generations": len(running_generations),
+        "background_tasks": len(background_tasks),
+        "open_output_writers": len(job_writers),
+        "job_pool": job_pool.stats(),
+        "process_supervisor": process_supervisor.stats(),
+        "jobs_by_state": job_store.count_by_state()
+    }
+
+
+async def wait_for_job_output(
+    job_id: str,
+    writer: JobOutputWriter,
+    position: int,
+    wait_seconds: float,
+    quiet_seconds: float
+) -> None:
+    """
+    Wait for a job to produce output after a position and then go quiet.
+
+    Returns early when the job finishes, or once output has arrived and
+    nothing new has come for quiet_seconds; otherwise after wait_seconds.
+    """
+    deadline = time.monotonic() + wait_seconds
+    seen = writer.chars_written
+    last_change = time.monotonic()
+    while time.monotonic() < deadline and job_writers.get(job_id) is writer:
+        await asyncio.sleep(0.05)
+        now = time.monotonic()
+        if writer.chars_written != seen:
+            seen = writer.chars_written
+            last_change = now
+        elif seen > position and now - last_change >= quiet_seconds:
+            return
+
+
+def job_output_response(job_id: str, writer: JobOutputWriter, position: int) -> Dict[str, Any]:
+    """Output of a job after a position, with the offset to continue reading from."""
+    text, start = writer.read_since(position)
+    record = job_store.get(job_id)
+    result = {
+        "status": "success",
+        "job_id": job_id,
+        "job_status": JOB_STATUS_NAMES.get(record.state, record.state) if record else "running",
+        "output": text,
+        "next_offset": start + len(text)
+    }
+    if start > position:
+        result["skipped_chars"] = start - position
+    return result
+
+
+@mcp.tool()
+async def send_job_input(
+    job_id: str,
+    text: str,
+    newline: bool = True,
+    close_input: bool = False,
+    wait_seconds: float = 10.0,
+    quiet_seconds: float = 1.0
+) -> Dict[str, Any]:
+    """
+    Send input to a running job and return the output it produces in reply.
+
+    Only jobs started with stdin="pipe"/"pty" (run_bash_command) or
+    interactive=True (run_fastagent_script) take input. The reply is the
+    output written after the input was sent, collected until the job has
+    been quiet for quiet_seconds (at most wait_seconds); read anything later
+    with read_job_output from next_offset.
+
+    Args:
+        job_id: The ID of the running job
+        text: Input to send
+        newline: Append a newline, as if Enter was pressed
+        close_input: Signal end of input after sending the text
+        wait_seconds: Longest time to wait for the reply
+        quiet_seconds: How long output must pause before the reply is considered complete
+
+    Returns:
+        Dict with the output produced after the input and the offset to read on from
+    """
+    job_input = job_inputs.get(job_id)
+    if job_input is None or job_input.closed:
+        record = job_store.get(job_id)
+        if record is None:
+            return {
+                "status": "not_found",
+                "message": f"No job found with ID {job_id}"
+            }
+        return {
+            "status": "error",
+            "job_id": job_id,
+            "message": "Job is not running with an open stdin (start it with stdin=\"pipe\"/\"pty\" or interactive=True)"
+        }
 
-    # CRITICAL: Safe subprocess creation with tracking and cleanup
+    writer = job_writers.get(job_id)
+    position = writer.chars_written if writer else 0
     try:
-        # Run the process with separate stderr
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-
-        # CRITICAL: Track the process
-        running_processes[job_id] = process
-
-        # Create and run a background task to capture output
-        async def capture_output():
-            output = ""
-            response_text = ""
+        await job_input.write((text + "\n" if newline else text).encode("utf-8"))
+        if close_input:
+            await job_input.send_eof()
+    except (BrokenPipeError, ConnectionResetError, OSError) as e:
+        return {
+            "status": "error",
+            "job_id": job_id,
+            "message": f"Failed to send input: {str(e)}"
+        }
 
-            try:
-                if process.stdout:
-                    # Collect all output from curl (should be clean JSON now)
-                    for line in process.stdout:
-                        output += line
-
-                    # Parse the JSON response from Ollama API
-                    try:
-                        json_response = json.loads(output.strip())
-                        if "response" in json_response:
-                            response_text = json_response["response"]
-                        elif "error" in json_response:
-                            response_text = f"Error: {json_response['error']}"
-                        else:
-                            response_text = f"Unexpected response format: {output}"
-                    except json.JSONDecodeError:
-                        # Fallback: try line by line if the whole output isn't valid JSON
-                        lines = output.split('\n')
-                        for line in lines:
-                            line = line.strip()
-                            if not line:
-                                continue
-                            try:
-                                json_response = json.loads(line)
-                                if "response" in json_response:
-                                    response_text += json_response["response"]
-                            except json.JSONDecodeError:
-                                continue
-
-                        # If still no response, use cleaned output as fallback
-                        if not response_text:
-                            response_text = clean_ansi_escape_codes(output)
-
-                    # Write the response to file
-                    if response_text and response_text.strip():
-                        with open(output_file, "a") as f:
-                            f.write(response_text)
-
-                # Store the complete output
-                process_outputs[job_id] = response_text or clean_ansi_escape_codes(output)
-
-                # Wait for the process to finish
-                process.wait()
-            finally:
-                # CRITICAL: Always clean up
-                if job_id in running_processes:
-                    del running_processes[job_id]
-
-        # Start the background task to capture output without waiting
-        task = asyncio.create_task(capture_output())
-        track_background_task(task)  # CRITICAL: Track the task
-
-        # If wait_for_result is True, wait for the process to complete
-        if wait_for_result:
-            await asyncio.to_thread(process.wait)
+    if writer is None:
+        return {
+            "status": "success",
+            "job_id": job_id,
+            "output": "",
+            "next_offset": 0
+        }
+    if wait_seconds > 0:
+        await wait_for_job_output(job_id, writer, position, wait_seconds, quiet_seconds)
+    return job_output_response(job_id, writer, position)
 
-            # Check process status
-            if process.returncode == 0:
-                try:
-                    with open(output_file, "r") as f:
-                        content = f.read()
 
-                    # Process is already cleaned up in capture_output finally block
+@mcp.tool()
+async def read_job_output(
+    job_id: str,
+    offset: int = 0,
+    wait_seconds: float = 0.0,
+    quiet_seconds: float = 1.0
+) -> Dict[str, Any]:
+    """
+    Read a job's output from an offset, e.g. the next_offset returned by send_job_input.
 
-                    # Clean the output
-                    content = clean_ollama_output(content)
+    Offsets count characters of captured output (without the header of the
+    output file). Output older than the in-memory tail of a running job, or
+    cut from the stored output of a finished one (see max_output_bytes), is
+    skipped, and skipped_chars says how much.
 
-                    return {
-                        "status": "complete",
-                        "job_id": job_id,
-                        "output_file": str(output_file),
-                        "content": content
-                    }
-                except Exception as e:
-                    return {
-                        "status": "error",
-                        "job_id": job_id,
-                        "message": f"Error reading output: {str(e)}"
-                    }
-            else:
-                return {
-                    "status": "error",
-                    "job_id": job_id,
-                    "message": f"Process exited with code {process.returncode}"
-                }
+    Args:
+        job_id: The ID of the job
+        offset: Character offset to read from
+        wait_seconds: Longest time to wait for new output from a running job
+        quiet_seconds: How long output must pause before returning early
 
-        # Return immediately with job information
+    Returns:
+        Dict with the output after offset and the offset to read on from
+    """
+    writer = job_writers.get(job_id)
+    if writer is not None:
+        if wait_seconds > 0:
+            await wait_for_job_output(job_id, writer, offset, wait_seconds, quiet_seconds)
+        return job_output_response(job_id, writer, offset)
+
+    record = job_store.get(job_id)
+    if record is None:
         return {
-            "status": "running",
-            "job_id": job_id,
-            "output_file": str(output_file),
-            "message": "Process started, check job status for completion"
+            "status": "not_found",
+            "message": f"No job found with ID {job_id}"
         }
-    except Exception as e:
-        # CRITICAL: Clean up on error
-        if job_id in running_processes:
-            del running_processes[job_id]
+    total = record.metadata.get("output_chars")
+    if total is None:
         return {
             "status": "error",
             "job_id": job_id,
-            "message": f"Failed to start process: {str(e)}"
+            "message": "Output offsets are only available for running or finished command and fast-agent jobs"
         }
+    # Truncated output ends with the stored tail; offsets before it were never stored whole
+    start = offset
+    if record.metadata.get("truncated"):
+        start = max(offset, total - record.metadata.get("stored_tail_chars", 0))
+    remaining = max(total - start, 0)
+    text = await asyncio.to_thread(read_output_body_tail, record.output_file, remaining) if remaining else ""
+    result = {
+        "status": "success",
+        "job_id": job_id,
+        "job_status": JOB_STATUS_NAMES.get(record.state, record.state),
+        "output": text,
+        "next_offset": total
+    }
+    if start > offset:
+        result["skipped_chars"] = start - offset
+    return result
 
 
 @mcp.tool()
-async def get_job_status(job_id: str) -> Dict[str, Any]:
+async def get_job_timeline(
+    job_id: str,
+    gaps: int = 10,
+    buckets: int = 20,
+    min_gap_seconds: float = 0.0
+) -> Dict[str, Any]:
     """
-    Check the status of a specific job by its ID.
+    Profile where a command or fast-agent job spent its time, from the timestamped lines of its output.
+
+    Every line a job prints is recorded with its arrival time and stream
+    (stdout or stderr; jobs on a terminal only have stdout). This returns
+    the longest silences between lines, with the lines around them, and a
+    timeline counting lines per stream in equal slices of the run. Running
+    jobs can be profiled too, up to their most recent output.
 
     Args:
-        job_id: The ID of the job to check
+        job_id: The ID of the job
+        gaps: Number of longest gaps to return
+        buckets: Number of timeline slices
+        min_gap_seconds: Leave out gaps shorter than this
 
     Returns:
-        Dict with job status information and content if complete
+        Dict with the run's duration, per-stream line counts, longest gaps and timeline
     """
-    output_file = OUTPUTS_DIR / f"{job_id}.txt"
-
-    if not output_file.exists():
+    record = job_store.get(job_id)
+    if record is None:
         return {
             "status": "not_found",
             "message": f"No job found with ID {job_id}"
         }
-
-    # Check if the process is still running
-    process = running_processes.get(job_id)
-    if process and process.poll() is None:
+    if gaps < 0 or buckets < 0:
         return {
-            "status": "running",
+            "status": "error",
             "job_id": job_id,
-            "output_file": str(output_file)
+            "message": "gaps and buckets must not be negative"
         }
-
-    # Read the output file
     try:
-        with open(output_file, "r") as f:
-            content = f.read()
-
-        # Clean the output if it's not a bash command
-        if "_bash.txt" not in str(output_file):
-            content = clean_ollama_output(content)
-
-    except Exception as e:
+        summary = await asyncio.to_thread(
+            summarize_events, events_path(Path(record.output_file)), gaps, buckets, min_gap_seconds
+        )
+    except FileNotFoundError:
         return {
             "status": "error",
             "job_id": job_id,
-            "message": f"Error reading output file: {str(e)}"
+            "message": "No output timeline for this job; only command and fast-agent jobs record one"
         }
-
-    # Process is complete, clean up if needed
-    if job_id in running_processes:
-        del running_processes[job_id]
-
     return {
-        "status": "complete",
+        "status": "success",
         "job_id": job_id,
-        "output_file": str(output_file),
-        "content": content
+        "job_status": JOB_STATUS_NAMES.get(record.state, record.state),
+        **summary
     }
 
-@mcp.tool()
-async def list_jobs() -> Dict[str, Any]:
-    """
-    List all jobs - both running and completed.
-
-    Returns:
-        Dict with lists of running and completed jobs
-    """
-    # Check running processes
-    running_jobs = []
-    for job_id, process in list(running_processes.items()):
-        # Update status and clean up completed processes
-        if process.poll() is not None:
-            del running_processes[job_id]
-        else:
-            running_jobs.append(job_id)
-
-    # List output files to find completed jobs
-    completed_jobs = []
-    for output_file in OUTPUTS_DIR.glob("*.txt"):
-        job_id = output_file.stem
-        if job_id not in running_jobs:
-            # Get metadata if available
-            try:
-                with open(output_file, "r") as f:
-                    first_line = f.readline().strip()
-                    if first_line.startswith("METADATA:"):
-                        metadata = json.loads(first_line[9:])
-                        completed_jobs.append({
-                            "job_id": job_id,
-                            "output_file": str(output_file),
-                            "timestamp": metadata.get("timestamp"),
-                            "model": metadata.get("model")
-                        })
-                    else:
-                        completed_jobs.append({
-                            "job_id": job_id,
-                            "output_file": str(output_file),
-                            "timestamp": output_file.stat().st_mtime
-                        })
-            except (IOError, json.JSONDecodeError):
-                # Fall back to file stats if metadata parsing fails
-                completed_jobs.append({
-                    "job_id": job_id,
-                    "output_file": str(output_file),
-                    "timestamp": output_file.stat().st_mtime
-                })
-
-    # Sort completed jobs by timestamp, newest first
-    completed_jobs.sort(key=lambda x: x.get("timestamp", 0), reverse=True)
-
-    return {
-        "running_jobs": running_jobs,
-        "completed_jobs": completed_jobs
-    }
 
 @mcp.tool()
 async def cancel_job(job_id: str) -> Dict[str, Any]:
@@ -622,35 +1966,70 @@ async def cancel_job(job_id: str) -> Dict[str, Any]:
     Returns:
         Dict with cancellation status
     """
+    # Generations are cancelled by closing their connection to Ollama
+    generation = running_generations.get(job_id)
+    if generation and not generation.done():
+        # Stop the generation before recording the cancellation, so the token
+        # count it stores on the way out is in the record the job is rolled up from
+        generation.cancel()
+        await asyncio.wait({generation}, timeout=5)
+
+        record = set_job_state(job_id, CANCELLED, error="Cancelled by user")
+        if record is None:
+            # The generation finished before the cancellation reached it
+            return {
+                "status": "already_complete",
+                "job_id": job_id,
+                "message": "Generation had already completed"
+            }
+        append_job_notice(record.output_file, "JOB CANCELLED BY USER", job_id=job_id)
+        return {
+            "status": "cancelled",
+            "job_id": job_id,
+            "tokens_generated": record.metadata.get("tokens_generated"),
+            "message": "Generation aborted and connection to Ollama closed"
+        }
+
     process = running_processes.get(job_id)
 
     if not process:
+        # A queued job has no process yet and can be cancelled before it starts
+        record = job_store.get(job_id)
+        if record and record.state == QUEUED:
+            set_job_state(job_id, CANCELLED, error="Cancelled by user")
+            job_pool.withdraw(job_id)
+            append_job_notice(record.output_file, "JOB CANCELLED BY USER")
+            return {
+                "status": "cancelled",
+                "job_id": job_id,
+                "message": "Queued job has been cancelled"
+            }
+        if job_id in job_writers:
+            # The process has exited and its last output is still being saved
+            return {
+                "status": "already_complete",
+                "job_id": job_id,
+                "message": "Process had already completed"
+            }
+
         return {
             "status": "not_found",
             "message": f"No running process found with ID {job_id}"
         }
 
-    if process.poll() is None:
+    if is_process_running(process):
+        # Record the cancellation first so the capture task doesn't mark the job complete
+        record = set_job_state(job_id, CANCELLED, error="Cancelled by user")
+
         # Process is still running, terminate it
-        process.terminate()
-        try:
-            # Wait a bit for graceful termination
-            process.wait(timeout=5)
-        except subprocess.TimeoutExpired:
-            # Force kill if it doesn't terminate gracefully
-            process.kill()
+        await terminate_process(process)
 
         # Update output file with cancellation notice
-        output_file = OUTPUTS_DIR / f"{job_id}.txt"
-        if output_file.exists():
-            try:
-                with open(output_file, "a") as f:
-                    f.write("\n\n[JOB CANCELLED BY USER]\n")
-            except IOError:
-                pass
+        output_file = record.output_file if record else str(OUTPUTS_DIR / f"{job_id}.txt")
+        append_job_notice(output_file, "JOB CANCELLED BY USER", job_id=job_id)
 
         # Clean up references
-        del running_processes[job_id]
+        running_processes.pop(job_id, None)
 
         return {
             "status": "cancelled",
@@ -843,261 +2222,761 @@ async def run_script(
         }
 
 
+def output_cap(max_output_bytes: Optional[int]) -> Optional[int]:
+    """
+    Resolve a job's output size cap.
+
+    Args:
+        max_output_bytes: Requested cap, or None for MAX_OUTPUT_BYTES
+
+    Returns:
+        The cap in bytes, or None for no limit
+    """
+    if max_output_bytes is None:
+        max_output_bytes = MAX_OUTPUT_BYTES
+    return max_output_bytes if max_output_bytes > 0 else None
+
+
+async def _start_bash_job(
+    job_id: str,
+    output_file: Path,
+    command: str,
+    max_output_bytes: Optional[int] = None,
+    limits: Optional[Dict[str, int]] = None,
+    nice: Optional[int] = None,
+    stdin_mode: str = "none"
+) -> Tuple[asyncio.subprocess.Process, asyncio.Task]:
+    """
+    Launch a shell command job and capture its output in the background.
+
+    Args:
+        job_id: The job ID (already persisted in the job store)
+        output_file: Output file with the job header already written
+        command: The shell command to run
+        max_output_bytes: Output size cap (defaults to MAX_OUTPUT_BYTES, 0 for no limit)
+        limits: Validated resource limits (see process_control.JOB_LIMITS)
+        nice: Niceness increment (defaults to JOB_NICE)
+        stdin_mode: How the command's stdin is connected (see spawn_job_process)
+
+    Returns:
+        Tuple of the running shell process and the task capturing its output
+    """
+    # Run the command in its own session so it can be stopped with everything it forks
+    events = OutputEventLog(events_path(output_file))
+    try:
+        process, streams = await spawn_job_process(
+            job_id,
+            ["/bin/sh", "-c", command],
+            make_preexec_fn(limits or {}, JOB_NICE if nice is None else nice),
+            stdin_mode
+        )
+    except BaseException:
+        events.close()
+        raise
+
+    # CRITICAL: Track the process
+    running_processes[job_id] = process
+    set_job_state(job_id, RUNNING)
+
+    writer = JobOutputWriter(output_file, max_bytes=output_cap(max_output_bytes))
+    writer.start()
+    job_writers[job_id] = writer
+
+    # Create and run a background task to capture output
+    async def capture_output():
+        try:
+            await capture_process_output(job_id, process, writer, streams, events)
+        finally:
+            job_input = job_inputs.pop(job_id, None)
+            if job_input:
+                job_input.close()
+            events.close()
+            await writer.close()
+            job_writers.pop(job_id, None)
+            job_store.update_metadata(job_id, **writer.stats(), **events.stats())
+
+            # CRITICAL: Always clean up
+            if job_id in running_processes:
+                del running_processes[job_id]
+            set_job_state(job_id, COMPLETED, exit_code=process.returncode)
+
+    # Start the background task to capture output without waiting
+    task = asyncio.create_task(capture_output())
+    track_background_task(task)  # CRITICAL: Track the task
+
+    return process, task
+
+
+def start_pooled_job(
+    job_id: str,
+    job_type: str,
+    slot: asyncio.Future,
+    launch: Callable[[], Awaitable[Tuple[asyncio.subprocess.Process, asyncio.Task]]]
+) -> asyncio.Task:
+    """
+    Launch a subprocess job once it holds a job pool slot.
+
+    Args:
+        job_id: The job ID (already persisted in the job store)
+        job_type: The job type the slot was requested for
+        slot: Future returned by job_pool.submit
+        launch: Starts the job and returns its process and capture task
+
+    Returns:
+        Task that finishes when the job has finished (or was dropped from the queue)
+    """
+    released = False
+
+    def release_slot() -> None:
+        nonlocal released
+        if not released:
+            released = True
+            job_pool.release(job_type)
+
+    async def run_when_ready():
+        try:
+            await slot
+        except asyncio.CancelledError:
+            # Withdrawn from the queue, or shutting down
+            if not slot.cancelled():
+                release_slot()
+            return
+
+        try:
+            # The job may have been cancelled or timed out while it waited
+            record = job_store.get(job_id)
+            if record is None or record.state != QUEUED:
+                return
+            try:
+                process, capture_task = await launch()
+            except Exception as e:
+                running_processes.pop(job_id, None)
+                set_job_state(job_id, FAILED, error=f"Failed to start job: {str(e)}")
+                return
+            # The slot is free once the process exits, even while its last output drains
+            process_supervisor.call_on_exit(process, release_slot)
+            record = job_store.get(job_id)
+            if record and record.state == CANCELLED:
+                await terminate_process(process)
+            await capture_task
+        finally:
+            release_slot()
+
+    task = asyncio.create_task(run_when_ready())
+    track_background_task(task)  # CRITICAL: Track the task
+    return task
+
+
+def abandon_job_slot(job_id: str, job_type: str, slot: asyncio.Future, output_file: Path) -> None:
+    """
+    Undo a job submission whose setup failed before it reached start_pooled_job.
+
+    Args:
+        job_id: The job ID
+        job_type: The job type the slot was requested for
+        slot: Future returned by job_pool.submit
+        output_file: The job's output file, removed if it was created
+    """
+    # Setup doesn't await, so the job still holds its slot or is still waiting for one
+    if slot.done() and not slot.cancelled():
+        job_pool.release(job_type)
+    else:
+        job_pool.withdraw(job_id)
+    try:
+        output_file.unlink(missing_ok=True)
+    except OSError:
+        pass
+
+
+def submitted_job_response(job_id: str, output_file: Path, slot: asyncio.Future, message: str) -> Dict[str, Any]:
+    """
+    Response for a subprocess job that was started or queued without waiting for it.
+
+    Args:
+        job_id: The job ID
+        output_file: The job's output file
+        slot: Future returned by job_pool.submit
+        message: Message for a job that started straight away
+
+    Returns:
+        Dict with the job's status, and its queue position if it is waiting
+    """
+    if slot.done():
+        return {
+            "status": "running",
+            "job_id": job_id,
+            "output_file": str(output_file),
+            "message": message
+        }
+    return {
+        "status": "queued",
+        "job_id": job_id,
+        "output_file": str(output_file),
+        "queue_position": job_pool.queue_position(job_id),
+        "message": "Job is waiting for a free slot, check job status for progress"
+    }
+
+
+@mcp.tool()
+async def run_bash_command(
+    command: str,
+    wait_for_result: bool = False,
+    timeout: Optional[int] = None,
+    content: str = "full",
+    tail_chars: int = 2000,
+    max_output_bytes: Optional[int] = None,
+    limits: Optional[Dict[str, int]] = None,
+    nice: Optional[int] = None,
+    priority: int = 0,
+    stdin: str = "none"
+) -> Dict[str, Any]:
+    """
+    Run a bash command and capture its output.
+
+    At most OLLAMA_MCP_MAX_BASH_JOBS commands run at once; others wait in a
+    queue (and count towards the timeout), and are refused when it is full.
+
+    Output past max_output_bytes is not stored: the output file keeps the
+    first max_output_bytes, a truncation marker and the last part of the
+    output.
+
+    Args:
+        command: The bash command to execute
+        wait_for_result: Whether to wait for completion before returning
+        timeout: Maximum time (in seconds) to wait for the command to complete
+        content: With wait_for_result, "full" to return the stored output or
+            "tail" to return only its last tail_chars characters
+        tail_chars: Number of characters returned with content="tail"
+        max_output_bytes: Output size cap (defaults to OLLAMA_MCP_MAX_OUTPUT_BYTES, 0 for no limit)
+        limits: Resource limits for the command: cpu_seconds, memory_bytes,
+            open_files and max_processes (per user, not per job)
+        nice: Niceness increment from 0 to 19 (defaults to OLLAMA_MCP_JOB_NICE)
+        priority: Queued commands with a higher priority start first
+        stdin: "none" to read from /dev/null, or "pipe" or "pty" to take input
+            sent with send_job_input ("pty" runs the command on a terminal)
+
+    Returns:
+        Dict with command status information
+    """
+    if content not in ("full", "tail"):
+        return {
+            "status": "error",
+            "message": f"Invalid content projection '{content}' (expected full or tail)"
+        }
+    if stdin not in STDIN_MODES:
+        return {
+            "status": "error",
+            "message": f"Invalid stdin mode '{stdin}' (expected {', '.join(STDIN_MODES)})"
+        }
+    try:
+        limits = validate_limits(limits, nice)
+    except (TypeError, ValueError) as e:
+        return {
+            "status": "error",
+            "message": f"Invalid resource limits: {str(e)}"
+        }
+
+    # Generate a unique job ID
+    job_id = new_job_id()
+    output_file = job_output_path(OUTPUTS_DIR, job_id, "bash")
+
+    # Refuse the job up front if too many commands are already waiting
+    try:
+        slot = job_pool.submit(job_id, "bash", priority)
+    except QueueFullError as e:
+        return {
+            "status": "error",
+            "message": str(e)
+        }
+
+    try:
+        # Write metadata to the output file
+        with open(output_file, "w") as f:
+            metadata = {
+                "job_id": job_id,
+                "command": command,
+                "timestamp": time.time()
+            }
+            f.write(f"METADATA: {json.dumps(metadata)}\n\n")
+            f.write(f"COMMAND: {command}\n\n")
+            f.write("OUTPUT:\n")
+
+        job_store.create(
+            job_id, "bash", output_file,
+            params={
+                "command": command,
+                "max_output_bytes": max_output_bytes,
+                "limits": limits,
+                "nice": nice,
+                "priority": priority,
+                "stdin": stdin
+            },
+            metadata={"server_pid": os.getpid(), "client": current_client_name()},
+            batch_id=current_batch_id.get()
+        )
+    except Exception as e:
+        # Don't leave the slot taken (or the queue entry waiting) for a job that never existed
+        abandon_job_slot(job_id, "bash", slot, output_file)
+        return {
+            "status": "error",
+            "message": f"Failed to create job: {str(e)}"
+        }
+
+    # CRITICAL: The job is started (and its process tracked) once it holds a slot
+    task = start_pooled_job(
+        job_id, "bash", slot,
+        lambda: _start_bash_job(job_id, output_file, command, max_output_bytes, limits, nice, stdin)
+    )
+
+    # If wait_for_result is True, wait for the process to complete
+    if wait_for_result:
+        try:
+            # Wait for the job task so all buffered output is on disk
+            if timeout:
+                await asyncio.wait_for(asyncio.shield(task), timeout=timeout)
+            else:
+                await task
+
+            # Process is already cleaned up in capture_output finally block
+            record = job_store.get(job_id)
+            if record and record.state == FAILED and record.exit_code is None:
+                return {
+                    "status": "error",
+                    "job_id": job_id,
+                    "message": record.error or "Command failed to start"
+                }
+            result = {
+                "status": "complete",
+                "job_id": job_id,
+                "output_file": str(output_file),
+                "exitcode": record.exit_code if record else None
+            }
+            if content == "tail":
+                result["content"] = read_job_tail(job_id, str(output_file), tail_chars)
+            else:
+                with open(output_file, "r") as f:
+                    result["content"] = f.read()
+            if record:
+                result.update(output_size_fields(record.metadata))
+                if "resources" in record.metadata:
+                    result["resources"] = record.metadata["resources"]
+            return result
+        except asyncio.TimeoutError:
+            # Timeout occurred, terminate the process (or drop the job from the queue)
+            set_job_state(job_id, FAILED, error=f"Command timed out after {timeout} seconds")
+            process = running_processes.get(job_id)
+            if process:
+                await terminate_process(process)
+            else:
+                job_pool.withdraw(job_id)
+            return {
+                "status": "timeout",
+                "job_id": job_id,
+                "output_file": str(output_file),
+                "message": f"Command timed out after {timeout} seconds"
+            }
+        except Exception as e:
+            return {
+                "status": "error",
+                "job_id": job_id,
+                "message": f"Error: {str(e)}"
+            }
+
+    # Return immediately with job information
+    return submitted_job_response(job_id, output_file, slot, "Command started, check job status for completion")
+
+
+async def expire_shell_sessions() -> None:
+    """Close shell sessions that have ended or sat unused past SHELL_SESSION_IDLE_TIMEOUT."""
+    now = time.time()
+    for session_id, session in list(shell_sessions.items()):
+        idle = not session.busy and now - session.last_used > SHELL_SESSION_IDLE_TIMEOUT
+        if idle or not session.alive:
+            shell_sessions.pop(session_id, None)
+            await session.close()
+
+
 @mcp.tool()
-async def run_bash_command(
-    command: str,
-    wait_for_result: bool = False,
-    timeout: Optional[int] = None
+async def open_shell_session(
+    cwd: Optional[str] = None,
+    env: Optional[Dict[str, str]] = None
 ) -> Dict[str, Any]:
     """
-    Run a bash command and capture its output.
+    Start a persistent shell for running many small commands quickly.
+
+    Commands sent with run_in_shell_session share the shell, so the working
+    directory, variables and exports persist between them. They are not
+    tracked as jobs and have no output files.
 
     Args:
-        command: The bash command to execute
-        wait_for_result: Whether to wait for completion before returning
-        timeout: Maximum time (in seconds) to wait for the command to complete
+        cwd: Initial working directory
+        env: Environment variables to set in the shell
 
     Returns:
-        Dict with command status information
+        Dict with the new session ID
     """
-    # Generate a unique job ID
-    job_id = str(uuid.uuid4())
-    output_file = OUTPUTS_DIR / f"{job_id}_bash.txt"
-
-    # Write metadata to the output file
-    with open(output_file, "w") as f:
-        metadata = {
-            "job_id": job_id,
-            "command": command,
-            "timestamp": time.time()
+    await expire_shell_sessions()
+    if len(shell_sessions) >= MAX_SHELL_SESSIONS:
+        return {
+            "status": "error",
+            "message": f"Too many open shell sessions ({MAX_SHELL_SESSIONS}); close one with close_shell_session"
         }
-        f.write(f"METADATA: {json.dumps(metadata)}\n\n")
-        f.write(f"COMMAND: {command}\n\n")
-        f.write("OUTPUT:\n")
-
-    # CRITICAL: Safe subprocess creation with tracking and cleanup
     try:
-        # Run the command
-        process = subprocess.Popen(
-            command,
-            shell=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True
-        )
-
-        # CRITICAL: Track the process
-        running_processes[job_id] = process
+        session = await ShellSession.start(cwd=cwd, env=env, nice=JOB_NICE)
+    except (OSError, ShellSessionClosed) as e:
+        return {
+            "status": "error",
+            "message": f"Failed to start shell session: {str(e)}"
+        }
+    shell_sessions[session.session_id] = session
+    return {
+        "status": "success",
+        "session_id": session.session_id,
+        "message": f"Shell session started (closed after {int(SHELL_SESSION_IDLE_TIMEOUT)}s unused)"
+    }
 
-        # Create and run a background task to capture output
-        async def capture_output():
-            output = ""
-            try:
-                if process.stdout:
-                    for line in process.stdout:
-                        output += line
-                        # Append the output to the file in real-time
-                        with open(output_file, "a") as f:
-                            f.write(line)
-
-                # Store the complete output
-                process_outputs[job_id] = output
-
-                # Wait for the process to finish
-                process.wait()
-            finally:
-                # CRITICAL: Always clean up
-                if job_id in running_processes:
-                    del running_processes[job_id]
-
-        # Start the background task to capture output without waiting
-        task = asyncio.create_task(capture_output())
-        track_background_task(task)  # CRITICAL: Track the task
-
-        # If wait_for_result is True, wait for the process to complete
-        if wait_for_result:
-            try:
-                if timeout:
-                    await asyncio.wait_for(asyncio.to_thread(process.wait), timeout=timeout)
-                else:
-                    await asyncio.to_thread(process.wait)
 
-                # Read the output file
-                with open(output_file, "r") as f:
-                    content = f.read()
+@mcp.tool()
+async def run_in_shell_session(
+    session_id: str,
+    command: str,
+    timeout: float = 30
+) -> Dict[str, Any]:
+    """
+    Run a command in a shell session and return its output.
 
-                # Process is already cleaned up in capture_output finally block
+    The command's stdin is /dev/null. A program still running after timeout
+    seconds is interrupted as with Ctrl-C (the rest of the command line
+    still runs, and the command's exit code is 130); one that ignores the
+    interrupt ends the session.
 
-                return {
-                    "status": "complete",
-                    "job_id": job_id,
-                    "output_file": str(output_file),
-                    "exitcode": process.returncode,
-                    "content": content
-                }
-            except asyncio.TimeoutError:
-                # Timeout occurred, terminate the process
-                process.terminate()
-                try:
-                    process.wait(timeout=5)
-                except subprocess.TimeoutExpired:
-                    process.kill()
-                return {
-                    "status": "timeout",
-                    "job_id": job_id,
-                    "output_file": str(output_file),
-                    "message": f"Command timed out after {timeout} seconds"
-                }
-            except Exception as e:
-                return {
-                    "status": "error",
-                    "job_id": job_id,
-                    "message": f"Error: {str(e)}"
-                }
+    Args:
+        session_id: ID returned by open_shell_session
+        command: The shell command to run
+        timeout: Maximum time (in seconds) the command may run
 
-        # Return immediately with job information
+    Returns:
+        Dict with the output (stdout and stderr together), exit code and duration
+    """
+    session = shell_sessions.get(session_id)
+    if session is None:
         return {
-            "status": "running",
-            "job_id": job_id,
-            "output_file": str(output_file),
-            "message": "Command started, check job status for completion"
+            "status": "not_found",
+            "message": f"No shell session with ID {session_id}"
         }
-    except Exception as e:
-        # CRITICAL: Clean up on error
-        if job_id in running_processes:
-            del running_processes[job_id]
+    try:
+        result = await session.run(command, timeout)
+    except ShellSessionClosed as e:
+        shell_sessions.pop(session_id, None)
         return {
             "status": "error",
-            "job_id": job_id,
-            "message": f"Failed to start command: {str(e)}"
+            "session_id": session_id,
+            "message": str(e)
+        }
+    if result.get("session_closed"):
+        shell_sessions.pop(session_id, None)
+        await session.close()
+    return {
+        "status": "timeout" if result.get("timed_out") else "complete",
+        "session_id": session_id,
+        **result
+    }
+
+
+@mcp.tool()
+async def close_shell_session(session_id: str) -> Dict[str, Any]:
+    """
+    End a shell session and anything still running in it.
+
+    Args:
+        session_id: ID returned by open_shell_session
+
+    Returns:
+        Dict with the closing status
+    """
+    session = shell_sessions.pop(session_id, None)
+    if session is None:
+        return {
+            "status": "not_found",
+            "message": f"No shell session with ID {session_id}"
         }
+    await session.close()
+    return {
+        "status": "closed",
+        "session_id": session_id,
+        "commands_run": session.commands_run
+    }
 
 
-# This is our fix to properly handle nested functions in the workflow tool
 @mcp.tool()
-async def run_workflow(
-    steps: List[Dict[str, Any]]
-) -> Dict[str, Any]:
+async def list_shell_sessions() -> Dict[str, Any]:
+    """
+    List open shell sessions.
+
+    Returns:
+        Dict with each session's ID, PID, state and usage
+    """
+    await expire_shell_sessions()
+    return {
+        "status": "success",
+        "sessions": [session.info() for session in shell_sessions.values()]
+    }
+
+
+# Result statuses that mean a workflow step's tool call failed
+FAILED_STEP_STATUSES = {"error", "not_found", "timeout", "failed", "cancelled", "timed_out", "stalled"}
+
+
+async def finish_step_job(result: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Run a workflow of multiple steps sequentially.
+    Wait for the job a workflow step started, if it is still running.
 
     Args:
-        steps: List of step dictionaries, each containing:
-               - tool: Name of the tool to call (e.g., "run_ollama_prompt")
-               - params: Parameters to pass to the tool
-               - name: Optional step name
+        result: The step's tool result
 
     Returns:
-        Dict with workflow execution status
+        The result, with "job_status" (and "exitcode" for commands) set once
+        a job it started has finished
     """
-    # Generate a unique workflow run ID
-    run_id = str(uuid.uuid4())
-    output_file = OUTPUTS_DIR / f"{run_id}_workflow.txt"
+    job_id = result.get("job_id") if isinstance(result, dict) else None
+    if not job_id or result.get("status") not in ("running", "queued"):
+        return result
+    record = await wait_for_job(job_id)
+    if record is None:
+        return result
+    finished = {**result, "status": JOB_STATUS_NAMES.get(record.state, record.state), "job_status": record.state}
+    if record.exit_code is not None:
+        finished["exitcode"] = record.exit_code
+    if record.error:
+        finished["message"] = record.error
+    return finished
+
+
+async def step_result_fields(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Fields of a finished workflow step that later steps can reference.
 
-    # Write metadata to the output file
-    with open(output_file, "w") as f:
-        metadata = {
-            "run_id": run_id,
-            "started_at": time.time(),
-            "steps_count": len(steps),
-            "current_dir": os.getcwd()
-        }
-        f.write(f"WORKFLOW RUN: {json.dumps(metadata)}\n\n")
-        f.write(f"OUTPUT DIR: {OUTPUTS_DIR}\n")
-        f.write(f"SCRIPTS DIR: {SCRIPTS_DIR}\n")
-        f.write(f"WORKFLOWS DIR: {WORKFLOWS_DIR}\n\n")
+    Args:
+        result: The step's tool result, after finish_step_job
+
+    Returns:
+        The result's fields, with "content" set to the cleaned output of the
+        job the step started (without the output file's header)
+    """
+    fields = dict(result) if isinstance(result, dict) else {"result": result}
+    record = job_store.get(fields["job_id"]) if fields.get("job_id") else None
+    if record is not None:
+        fields["content"] = (await asyncio.to_thread(job_output_body, record)).strip()
+    return fields
+
+
+def step_succeeded(result: Dict[str, Any]) -> bool:
+    """Whether a workflow step's (finished) tool result counts as a success."""
+    if not isinstance(result, dict):
+        return True
+    if result.get("status") in FAILED_STEP_STATUSES:
+        return False
+    return result.get("exitcode") in (None, 0)
+
+
+def _start_workflow(
+    run_id: str,
+    output_file: Path,
+    steps: List[Dict[str, Any]],
+    max_parallel: Optional[int] = None
+) -> asyncio.Task:
+    """
+    Execute a workflow's steps in a background task.
+
+    Steps that declare depends_on wait for the jobs they start, so their
+    dependents see finished work, and independent steps run concurrently.
+    Old-style step lists run one call after another (see workflow_graph).
+    Steps whose results are referenced ({{steps.<id>.<field>}}) always wait
+    for their jobs, and the references are filled in from their results.
+
+    Args:
+        run_id: The workflow run ID (already persisted in the job store)
+        output_file: Output file with the workflow header already written
+        steps: The workflow steps to execute
+        max_parallel: Most steps running at once (defaults to WORKFLOW_PARALLELISM)
+
+    Returns:
+        The background task running the workflow
+    """
+    # Map tool names to actual functions
+    tool_functions = {
+        "run_ollama_prompt": run_ollama_prompt,
+        "list_ollama_models": list_ollama_models,
+        "get_job_status": get_job_status,
+        "cancel_job": cancel_job,
+        "list_jobs": list_jobs,
+        "save_script": save_script,
+        "list_scripts": list_scripts,
+        "get_script": get_script,
+        "run_script": run_script,
+        "run_bash_command": run_bash_command,
+        "create_fastagent_script": create_fastagent_script,
+        "list_fastagent_scripts": list_fastagent_scripts,
+        "get_fastagent_script": get_fastagent_script,
+        "update_fastagent_script": update_fastagent_script,
+        "delete_fastagent_script": delete_fastagent_script,
+        "run_fastagent_script": run_fastagent_script,
+        "create_fastagent_workflow": create_fastagent_workflow,
+    }
 
     # Function to execute the workflow steps
     async def execute_workflow():
-        results = []
+        # Jobs started by the steps are grouped under the run ID
+        current_batch_id.set(run_id)
 
         try:
-            for i, step in enumerate(steps):
-                step_num = i + 1
-                tool_name = step.get("tool")
-                params = step.get("params", {})
-                name = step.get("name", f"Step {step_num}")
+            planned = plan_steps(steps)
+            wait_for_jobs = any("depends_on" in step for step in steps)
+            # Referenceable fields of finished steps, by step ID
+            step_results: Dict[str, Dict[str, Any]] = {}
+
+            async def run_step(step: Dict[str, Any]) -> bool:
+                tool_name = step["tool"]
+                params = step["params"]
 
                 # Skip step if it has no tool name
                 if not tool_name:
-                    continue
-
-                # Log step execution
-                with open(output_file, "a") as f:
-                    f.write(f"\n--- STEP {step_num}: {name} ---\n")
-                    f.write(f"Tool: {tool_name}\n")
-                    f.write(f"Params: {json.dumps(params)}\n\n")
+                    return True
 
                 # Remove any wait_for_result parameters to ensure consistent behavior
-                if "wait_for_result" in params:
-                    del params["wait_for_result"]
-
-                # Execute the tool by calling the appropriate function directly
+                params.pop("wait_for_result", None)
+
+                # Each step's log is written in one piece, as steps may run concurrently
+                log = (
+                    f"\n--- STEP {step['index']}: {step['name']} ---\n"
+                    f"Tool: {tool_name}\n"
+                    f"Params: {json.dumps(params)}\n\n"
+                )
                 try:
-                    # Map tool names to actual functions
-                    tool_functions = {
-                        "run_ollama_prompt": run_ollama_prompt,
-                        "list_ollama_models": list_ollama_models,
-                        "get_job_status": get_job_status,
-                        "cancel_job": cancel_job,
-                        "list_jobs": list_jobs,
-                        "save_script": save_script,
-                        "list_scripts": list_scripts,
-                        "get_script": get_script,
-                        "run_script": run_script,
-                        "run_bash_command": run_bash_command,
-                        "create_fastagent_script": create_fastagent_script,
-                        "list_fastagent_scripts": list_fastagent_scripts,
-                        "get_fastagent_script": get_fastagent_script,
-                        "update_fastagent_script": update_fastagent_script,
-                        "delete_fastagent_script": delete_fastagent_script,
-                        "run_fastagent_script": run_fastagent_script,
-                        "create_fastagent_workflow": create_fastagent_workflow,
-                    }
-                    
                     if tool_name not in tool_functions:
                         raise ValueError(f"Unknown tool: {tool_name}")
-                    
-                    # Execute the tool with its parameters
-                    tool_fn = tool_functions[tool_name]
-                    result = await tool_fn(**params)
 
-                    # Record the result
-                    with open(output_file, "a") as f:
-                        f.write(f"Result: {json.dumps(result)}\n")
+                    if step["references"]:
+                        params = resolve_references(params, step_results)
 
-                    results.append({
-                        "step": step_num,
-                        "name": name,
-                        "status": "success",
-                        "result": result
-                    })
+                    # Execute the tool with its parameters
+                    result = await tool_functions[tool_name](**params)
+                    if wait_for_jobs or step["referenced"]:
+                        result = await finish_step_job(result)
+                    succeeded = step_succeeded(result)
+                    if succeeded and step["referenced"]:
+                        step_results[step["id"]] = await step_result_fields(result)
                 except Exception as e:
-                    error_msg = f"ERROR executing {tool_name}: {str(e)}"
                     with open(output_file, "a") as f:
-                        f.write(f"{error_msg}\n")
+                        f.write(f"{log}ERROR executing {tool_name}: {str(e)}\n")
+                    return False
 
-                    results.append({
-                        "step": step_num,
-                        "name": name,
-                        "status": "error",
-                        "message": error_msg
-                    })
+                # Record the result
+                with open(output_file, "a") as f:
+                    f.write(f"{log}Result: {json.dumps(result)}\n")
+                return succeeded
+
+            outcomes = await run_step_graph(
+                planned, run_step, (max_parallel or WORKFLOW_PARALLELISM) if wait_for_jobs else 1
+            )
 
+            skipped = [step for step in planned if outcomes.get(step["id"]) == SKIPPED]
             # Mark workflow as complete
             with open(output_file, "a") as f:
+                for step in skipped:
+                    f.write(f"\n--- STEP {step['index']}: {step['name']} SKIPPED (a step it depends on failed) ---\n")
                 f.write("\n--- WORKFLOW COMPLETED ---\n")
 
-            return results
+            succeeded = sum(1 for outcome in outcomes.values() if outcome == SUCCEEDED)
+            set_job_state(run_id, COMPLETED, metadata={
+                "steps_succeeded": succeeded,
+                "steps_failed": len(outcomes) - succeeded - len(skipped),
+                "steps_skipped": len(skipped),
+            })
+            return outcomes
         except Exception as e:
             with open(output_file, "a") as f:
                 f.write(f"\n--- WORKFLOW ERROR: {str(e)} ---\n")
-            return []
+            set_job_state(run_id, FAILED, error=str(e))
+            return {}
 
     # Start the workflow in the background
+    set_job_state(run_id, RUNNING)
     task = asyncio.create_task(execute_workflow())
     track_background_task(task)  # CRITICAL: Track the task
 
+    return task
+
+
+# This is our fix to properly handle nested functions in the workflow tool
+@mcp.tool()
+async def run_workflow(
+    steps: List[Dict[str, Any]],
+    max_parallel: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Run a workflow of multiple steps, in order or as a dependency graph.
+
+    Without depends_on, steps run one after another. Steps that declare
+    depends_on start once the steps they depend on (and the jobs those
+    started) have finished successfully, and independent steps run at the
+    same time, so a fan-out finishes in the time of its longest branch.
+
+    Args:
+        steps: List of step dictionaries, each containing:
+               - tool: Name of the tool to call (e.g., "run_ollama_prompt")
+               - params: Parameters to pass to the tool
+               - name: Optional step name
+               - id: Optional step ID for depends_on (defaults to "step_<n>")
+               - depends_on: Optional list of step IDs that must succeed first
+               Params may use earlier results as {{steps.<id>.<field>}}, e.g.
+               {{steps.research.content}} for the cleaned output of the job
+               step "research" started; referenced jobs are waited for
+        max_parallel: Most steps running at once for dependency graphs
+            (defaults to OLLAMA_MCP_WORKFLOW_PARALLELISM)
+
+    Returns:
+        Dict with workflow execution status
+    """
+    if max_parallel is not None and max_parallel < 1:
+        return {
+            "status": "error",
+            "message": "max_parallel must be at least 1"
+        }
+    try:
+        plan_steps(steps)
+    except WorkflowError as e:
+        return {
+            "status": "error",
+            "message": f"Invalid workflow: {str(e)}"
+        }
+
+    # Generate a unique workflow run ID
+    run_id = new_job_id()
+    output_file = job_output_path(OUTPUTS_DIR, run_id, "workflow")
+
+    # Write metadata to the output file
+    with open(output_file, "w") as f:
+        metadata = {
+            "run_id": run_id,
+            "started_at": time.time(),
+            "steps_count": len(steps),
+            "current_dir": os.getcwd()
+        }
+        f.write(f"WORKFLOW RUN: {json.dumps(metadata)}\n\n")
+        f.write(f"OUTPUT DIR: {OUTPUTS_DIR}\n")
+        f.write(f"SCRIPTS DIR: {SCRIPTS_DIR}\n")
+        f.write(f"WORKFLOWS DIR: {WORKFLOWS_DIR}\n\n")
+
+    job_store.create(
+        run_id, "workflow", output_file,
+        params={"steps": steps, "max_parallel": max_parallel},
+        metadata={"server_pid": os.getpid(), "client": current_client_name(), "steps_count": len(steps)}
+    )
+
+    # Start the workflow in the background
+    _start_workflow(run_id, output_file, steps, max_parallel)
+
     return {
         "status": "running",
         "run_id": run_id,
@@ -1390,21 +3269,102 @@ async def delete_fastagent_script(name: str) -> Dict[str, Any]:
         }
 
 
+async def _start_fastagent_job(
+    job_id: str,
+    output_file: Path,
+    cmd: List[str],
+    interactive: bool = False
+) -> Tuple[asyncio.subprocess.Process, asyncio.Task]:
+    """
+    Launch a fast-agent script job and capture its output in the background.
+
+    Args:
+        job_id: The job ID (already persisted in the job store)
+        output_file: Output file with the job header already written
+        cmd: The command line used to run the script
+        interactive: Run the script on a PTY that send_job_input writes to
+
+    Returns:
+        Tuple of the running fast-agent process and the task capturing its output
+    """
+    # Run the command in its own session so it can be stopped with everything it forks
+    events = OutputEventLog(events_path(output_file))
+    try:
+        process, streams = await spawn_job_process(
+            job_id, cmd, make_preexec_fn({}, JOB_NICE), "pty" if interactive else "none"
+        )
+    except BaseException:
+        events.close()
+        raise
+
+    # CRITICAL: Track the process
+    running_processes[job_id] = process
+    set_job_state(job_id, RUNNING)
+
+    # Fast-agent writes terminal output (colors, spinners), so it is cleaned as it is
+    # captured, keeping only the final state of lines it redraws. Interactive runs
+    # release each line as soon as it is finished, so replies can be read right away.
+    writer = JobOutputWriter(
+        output_file,
+        cleaner=StreamingCleaner(
+            emulator=TerminalLineEmulator(live_lines=1) if interactive else TerminalLineEmulator()
+        ),
+        max_bytes=output_cap(None)
+    )
+    writer.start()
+    job_writers[job_id] = writer
+
+    # Create and run a background task to capture output
+    async def capture_output():
+        try:
+            await capture_process_output(job_id, process, writer, streams, events)
+        finally:
+            job_input = job_inputs.pop(job_id, None)
+            if job_input:
+                job_input.close()
+            events.close()
+            await writer.close()
+            job_writers.pop(job_id, None)
+            job_store.update_metadata(job_id, **writer.stats(), **events.stats())
+
+            # CRITICAL: Always clean up
+            if job_id in running_processes:
+                del running_processes[job_id]
+            set_job_state(job_id, COMPLETED, exit_code=process.returncode)
+
+    # Start the background task to capture output without waiting
+    task = asyncio.create_task(capture_output())
+    track_background_task(task)  # CRITICAL: Track the task
+
+    return process, task
+
+
 @mcp.tool()
 async def run_fastagent_script(
     name: str,
     agent_name: Optional[str] = None,
     message: Optional[str] = None,
-    timeout: Optional[int] = None
+    timeout: Optional[int] = None,
+    priority: int = 0,
+    interactive: bool = False
 ) -> Dict[str, Any]:
     """
     Run a fast-agent script and optionally send a message to a specific agent.
 
+    With interactive=True the script runs its interactive prompt on a
+    terminal and keeps running; send it messages with send_job_input and
+    stop it with cancel_job.
+
+    At most OLLAMA_MCP_MAX_FASTAGENT_JOBS scripts run at once; others wait
+    in a queue, and are refused when it is full.
+
     Args:
         name: Name of the script (without extension)
         agent_name: Optional name of the agent to target (defaults to the main agent)
         message: Optional message to send to the agent
         timeout: Maximum time (in seconds) to wait for the command to complete
+        priority: Queued scripts with a higher priority start first
+        interactive: Keep the script running and take messages with send_job_input
 
     Returns:
         Dict with execution status
@@ -1416,10 +3376,24 @@ async def run_fastagent_script(
             "status": "error",
             "message": f"Script '{name}.py' not found"
         }
+    if interactive and message:
+        return {
+            "status": "error",
+            "message": "Interactive scripts take messages with send_job_input once they are running"
+        }
 
     # Generate a unique job ID
-    job_id = str(uuid.uuid4())
-    output_file = OUTPUTS_DIR / f"{job_id}_fastagent.txt"
+    job_id = new_job_id()
+    output_file = job_output_path(OUTPUTS_DIR, job_id, "fastagent")
+
+    # Refuse the job up front if too many scripts are already waiting
+    try:
+        slot = job_pool.submit(job_id, "fastagent", priority)
+    except QueueFullError as e:
+        return {
+            "status": "error",
+            "message": str(e)
+        }
 
     # Build the command
     cmd = ["uv", "run", str(script_path)]
@@ -1435,71 +3409,48 @@ async def run_fastagent_script(
     # Add quiet mode to get cleaner output for programmatic use
     cmd.append("--quiet")
 
-    # Write metadata to the output file
-    with open(output_file, "w") as f:
-        metadata = {
-            "job_id": job_id,
-            "script": name,
-            "agent": agent_name,
-            "message": message,
-            "timestamp": time.time()
-        }
-        f.write(f"METADATA: {json.dumps(metadata)}\n\n")
-        f.write(f"COMMAND: {' '.join(cmd)}\n\n")
-        f.write("OUTPUT:\n")
-
-    # CRITICAL: Safe subprocess creation with tracking and cleanup
     try:
-        # Run the command
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True
+        # Write metadata to the output file
+        with open(output_file, "w") as f:
+            metadata = {
+                "job_id": job_id,
+                "script": name,
+                "agent": agent_name,
+                "message": message,
+                "timestamp": time.time()
+            }
+            f.write(f"METADATA: {json.dumps(metadata)}\n\n")
+            f.write(f"COMMAND: {' '.join(cmd)}\n\n")
+            f.write("OUTPUT:\n")
+
+        job_store.create(
+            job_id, "fastagent", output_file,
+            params={"cmd": cmd, "priority": priority, "interactive": interactive},
+            metadata={
+                "server_pid": os.getpid(),
+                "client": current_client_name(),
+                "script": name,
+                "agent": agent_name
+            },
+            batch_id=current_batch_id.get()
         )
-
-        # CRITICAL: Track the process
-        running_processes[job_id] = process
-
-        # Create and run a background task to capture output
-        async def capture_output():
-            output = ""
-            try:
-                if process.stdout:
-                    for line in process.stdout:
-                        output += line
-                        # Append the output to the file in real-time
-                        with open(output_file, "a") as f:
-                            f.write(line)
-
-                # Wait for the process to finish
-                process.wait()
-            finally:
-                # CRITICAL: Always clean up
-                if job_id in running_processes:
-                    del running_processes[job_id]
-
-        # Start the background task to capture output without waiting
-        task = asyncio.create_task(capture_output())
-        track_background_task(task)  # CRITICAL: Track the task
-
-        # Return immediately with job information
-        return {
-            "status": "running",
-            "job_id": job_id,
-            "output_file": str(output_file),
-            "message": "FastAgent script started, check job status for completion"
-        }
     except Exception as e:
-        # CRITICAL: Clean up on error
-        if job_id in running_processes:
-            del running_processes[job_id]
+        abandon_job_slot(job_id, "fastagent", slot, output_file)
         return {
             "status": "error",
-            "job_id": job_id,
-            "message": f"Failed to start FastAgent script: {str(e)}"
+            "message": f"Failed to create job: {str(e)}"
         }
 
+    # CRITICAL: The job is started (and its process tracked) once it holds a slot
+    start_pooled_job(
+        job_id, "fastagent", slot, lambda: _start_fastagent_job(job_id, output_file, cmd, interactive)
+    )
+
+    # Return immediately with job information
+    return submitted_job_response(
+        job_id, output_file, slot, "FastAgent script started, check job status for completion"
+    )
+
 
 @mcp.tool()
 async def create_fastagent_workflow(
@@ -1624,6 +3575,99 @@ if __name__ == "__main__":
         }
 
 
+# ---------- Job Recovery ----------
+
+def _owner_is_alive(record: JobRecord) -> bool:
+    """Whether another live server process owns this job (several servers may share OUTPUTS_DIR)."""
+    owner_pid = record.metadata.get("server_pid")
+    if not owner_pid or owner_pid == os.getpid():
+        return False
+    try:
+        os.kill(owner_pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+async def _relaunch_job(record: JobRecord) -> None:
+    """
+    Start a queued job again from its persisted launch parameters.
+
+    Args:
+        record: The queued job record
+    """
+    output_file = Path(record.output_file)
+    params = record.params
+
+    if record.job_type == "ollama":
+        # Drop any partial response written before the interruption
+        offset = params.get("response_offset")
+        if offset is not None and output_file.exists():
+            os.truncate(output_file, offset)
+        _start_ollama_job(record.job_id, output_file, params["ollama_input"], **params.get("limits", {}))
+    elif record.job_type == "bash":
+        start_pooled_job(
+            record.job_id, "bash", job_pool.submit(record.job_id, "bash", params.get("priority", 0)),
+            lambda: _start_bash_job(
+                record.job_id, output_file, params["command"],
+                params.get("max_output_bytes"), params.get("limits"), params.get("nice"),
+                params.get("stdin", "none")
+            )
+        )
+    elif record.job_type == "fastagent":
+        start_pooled_job(
+            record.job_id, "fastagent", job_pool.submit(record.job_id, "fastagent", params.get("priority", 0)),
+            lambda: _start_fastagent_job(record.job_id, output_file, params["cmd"], params.get("interactive", False))
+        )
+    elif record.job_type == "workflow":
+        _start_workflow(record.job_id, output_file, params["steps"], params.get("max_parallel"))
+    else:
+        raise ValueError(f"Unknown job type: {record.job_type}")
+
+
+async def reconcile_jobs() -> Dict[str, List[str]]:
+    """
+    Reconcile persisted job state after a (re)start.
+
+    Jobs left running by a dead server are marked failed, unless they are
+    resumable generations and OLLAMA_MCP_RESUME_GENERATIONS is enabled, in
+    which case they are re-queued. Queued jobs are started again.
+
+    Returns:
+        Dict listing the job IDs that were failed, re-queued and resumed
+    """
+    summary: Dict[str, List[str]] = {"failed": [], "requeued": [], "resumed": []}
+
+    for record in job_store.list_jobs(states=[QUEUED, RUNNING]):
+        if record.job_id in running_processes or record.job_id in running_generations or _owner_is_alive(record):
+            continue
+
+        if record.state == RUNNING:
+            if record.job_type in RESUMABLE_JOB_TYPES and RESUME_GENERATIONS:
+                record = job_store.transition(record.job_id, QUEUED, error="Interrupted by server restart")
+                summary["resumed"].append(record.job_id)
+            else:
+                job_store.transition(
+                    record.job_id, FAILED,
+                    error="Orphaned: the server stopped while the job was running"
+                )
+                append_job_notice(record.output_file, "JOB FAILED: SERVER RESTARTED WHILE RUNNING")
+                summary["failed"].append(record.job_id)
+                continue
+        else:
+            summary["requeued"].append(record.job_id)
+
+        job_store.update_metadata(record.job_id, server_pid=os.getpid())
+        try:
+            await _relaunch_job(record)
+        except Exception as e:
+            set_job_state(record.job_id, FAILED, error=f"Failed to relaunch job: {str(e)}")
+
+    return summary
+
+
 # ---------- MCP Prompts ----------
 
 @mcp.prompt()
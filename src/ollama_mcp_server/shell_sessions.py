@@ -0,0 +1,288 @@
+"""
+Persistent shell sessions for running many small commands cheaply.
+
+A session is one long-lived ``/bin/sh`` reading commands from its stdin.
+Each command is run with ``command eval`` in the session's shell, so the
+working directory, variables and exports carry over to the next command,
+and is followed by a ``printf`` of a random sentinel and the exit status::
+
+    command eval 'cd src && ls' </dev/null
+    printf '%s %d\\n' __OMR_3f2a...__ "$?"
+
+Everything read from the shell before the sentinel is the command's output
+(stdout and stderr together). Commands run without a process spawn or an
+output file of their own, so small commands take milliseconds.
+
+The shell traps SIGINT, so a command that runs past its timeout can be
+interrupted by signalling the session's process group without ending the
+session. As with Ctrl-C in a script, this stops the program that is
+running; the rest of the command line still runs, but the command is
+reported with exit code 130 (interrupted) whatever its last part returned.
+A command that ignores the interrupt gets the whole session killed.
+"""
+
+import asyncio
+import os
+import re
+import shlex
+import signal
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+try:
+    from .process_control import kill_process_group, make_preexec_fn, signal_process_group
+except ImportError:
+    from process_control import kill_process_group, make_preexec_fn, signal_process_group
+
+# Shell that runs session commands (the same one bash jobs use)
+SESSION_SHELL = "/bin/sh"
+
+# Size of each read from the shell's output pipe
+READ_CHUNK_SIZE = 64 * 1024
+
+# Output kept from the end of a command whose output went past the cap
+OUTPUT_TAIL_BYTES = 4096
+
+# Seconds an interrupted command gets to exit before the session is killed
+INTERRUPT_GRACE = 2.0
+
+# Exit code reported for a command interrupted at its timeout (128 + SIGINT, as shells report it)
+INTERRUPTED_EXIT_CODE = 128 + signal.SIGINT
+
+# Marker placed between the kept head and tail of truncated output
+TRUNCATION_MARKER = "\n[OUTPUT TRUNCATED: {omitted} bytes omitted]\n"
+
+
+class ShellSessionClosed(Exception):
+    """Raised when a command is sent to a session whose shell has exited."""
+
+
+class ShellSession:
+    """A long-lived shell that runs commands one at a time."""
+
+    def __init__(
+        self,
+        session_id: str,
+        process: asyncio.subprocess.Process,
+        max_output_bytes: int
+    ):
+        """
+        Wrap a started shell process (use ShellSession.start to create one).
+
+        Args:
+            session_id: The session ID
+            process: The shell process, with stdin and stdout pipes
+            max_output_bytes: Output kept per command before it is truncated
+        """
+        self.session_id = session_id
+        self.process = process
+        self.max_output_bytes = max_output_bytes
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.commands_run = 0
+
+        self._lock = asyncio.Lock()
+        # Output that arrived after the last command's sentinel (e.g. from background jobs)
+        self._leftover = bytearray()
+
+    @classmethod
+    async def start(
+        cls,
+        cwd: Optional[str] = None,
+        env: Optional[Dict[str, str]] = None,
+        nice: int = 0,
+        max_output_bytes: int = 1024 * 1024
+    ) -> "ShellSession":
+        """
+        Start a new session shell in its own process group.
+
+        Args:
+            cwd: Initial working directory (defaults to the server's)
+            env: Environment variables to add to the server's environment
+            nice: Niceness increment for the shell and its commands
+            max_output_bytes: Output kept per command before it is truncated
+
+        Returns:
+            The new session
+        """
+        process = await asyncio.create_subprocess_exec(
+            SESSION_SHELL,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            cwd=cwd,
+            env={**os.environ, **env} if env else None,
+            start_new_session=True,
+            preexec_fn=make_preexec_fn({}, nice)
+        )
+        session = cls(uuid.uuid4().hex[:12], process, max_output_bytes)
+        # A handler rather than SIG_IGN, so commands still die from SIGINT
+        await session._send("trap : INT\n")
+        return session
+
+    @property
+    def alive(self) -> bool:
+        """Whether the session's shell is still running."""
+        return self.process.returncode is None
+
+    @property
+    def busy(self) -> bool:
+        """Whether a command is running in the session."""
+        return self._lock.locked()
+
+    async def _send(self, text: str) -> None:
+        if self.process.stdin is None or self.process.stdin.is_closing():
+            raise ShellSessionClosed(f"Shell session {self.session_id} has ended")
+        try:
+            self.process.stdin.write(text.encode("utf-8"))
+            await self.process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError) as e:
+            raise ShellSessionClosed(f"Shell session {self.session_id} has ended") from e
+
+    async def run(self, command: str, timeout: float) -> Dict[str, Any]:
+        """
+        Run a command in the session's shell and collect its output.
+
+        Commands in one session run one after another. The command's stdin is
+        /dev/null.
+
+        Args:
+            command: Shell command line
+            timeout: Seconds before the command is interrupted
+
+        Returns:
+            Dict with the output, exit code, duration and output byte count;
+            "timed_out" is set if the command was interrupted (its exit code
+            is then INTERRUPTED_EXIT_CODE), and "session_closed" if the shell
+            is gone afterwards
+
+        Raises:
+            ShellSessionClosed: If the session's shell has already exited
+        """
+        async with self._lock:
+            if not self.alive:
+                raise ShellSessionClosed(f"Shell session {self.session_id} has ended")
+            token = f"__OMR_{uuid.uuid4().hex}__".encode("ascii")
+            sentinel = re.compile(re.escape(token) + rb" (-?\d+)\n")
+
+            started = time.monotonic()
+            await self._send(
+                f"command eval {shlex.quote(command)} </dev/null\n"
+                f"printf '%s %d\\n' {token.decode('ascii')} \"$?\"\n"
+            )
+
+            data = self._leftover
+            self._leftover = bytearray()
+            dropped = 0
+            search_from = 0
+            match = None
+            timed_out = False
+            deadline = started + timeout
+
+            while match is None:
+                match = sentinel.search(data, search_from)
+                if match is not None:
+                    break
+                search_from = max(0, len(data) - len(token) - 24)
+                # Keep the head and a tail of long output; the tail holds any partial sentinel
+                excess = len(data) - self.max_output_bytes - OUTPUT_TAIL_BYTES
+                if excess > 0:
+                    del data[self.max_output_bytes:self.max_output_bytes + excess]
+                    dropped += excess
+                    search_from = max(0, search_from - excess)
+
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError
+                    chunk = await asyncio.wait_for(self.process.stdout.read(READ_CHUNK_SIZE), remaining)
+                except asyncio.TimeoutError:
+                    if timed_out:
+                        # The command ignored the interrupt
+                        await self.close(timeout=0)
+                        break
+                    timed_out = True
+                    signal_process_group(self.process.pid, signal.SIGINT)
+                    deadline = time.monotonic() + INTERRUPT_GRACE
+                    continue
+                if not chunk:
+                    # The shell exited (e.g. the command ran "exit")
+                    await self.process.wait()
+                    break
+                data += chunk
+
+            self.last_used = time.time()
+            self.commands_run += 1
+            end = match.start() if match else len(data)
+            if match:
+                self._leftover = data[match.end():]
+
+            output_bytes = end + dropped
+            if dropped:
+                head = bytes(data[:self.max_output_bytes])
+                tail = bytes(data[self.max_output_bytes:end])
+                output = (
+                    head.decode("utf-8", errors="replace")
+                    + TRUNCATION_MARKER.format(omitted=dropped)
+                    + tail.decode("utf-8", errors="replace")
+                )
+            else:
+                output = bytes(data[:end]).decode("utf-8", errors="replace")
+
+            if timed_out:
+                # What ran after the interrupted program must not make the command look successful
+                exit_code = INTERRUPTED_EXIT_CODE
+            else:
+                exit_code = int(match.group(1)) if match else self.process.returncode
+            result: Dict[str, Any] = {
+                "output": output,
+                "exit_code": exit_code,
+                "duration_ms": round((time.monotonic() - started) * 1000, 2),
+                "output_bytes": output_bytes,
+                "truncated": bool(dropped),
+            }
+            if timed_out:
+                result["timed_out"] = True
+            if not self.alive or match is None:
+                result["session_closed"] = True
+            return result
+
+    async def close(self, timeout: float = 2.0) -> None:
+        """
+        End the session, killing anything still running in it.
+
+        Args:
+            timeout: Seconds to let the shell exit on its own first
+        """
+        if timeout > 0 and self.alive and self.process.stdin is not None and not self.process.stdin.is_closing():
+            self.process.stdin.close()
+            try:
+                await asyncio.wait_for(self.process.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        kill_process_group(self.process.pid)
+        if self.alive:
+            await self.process.wait()
+
+    def close_now(self) -> None:
+        """Kill the session without waiting (for shutdown without a running loop)."""
+        kill_process_group(self.process.pid)
+
+    def info(self) -> Dict[str, Any]:
+        """
+        Describe the session.
+
+        Returns:
+            Dict with the session ID, PID, state and usage counters
+        """
+        return {
+            "session_id": self.session_id,
+            "pid": self.process.pid,
+            "alive": self.alive,
+            "busy": self.busy,
+            "commands_run": self.commands_run,
+            "created_at": self.created_at,
+            "last_used": self.last_used,
+        }
+
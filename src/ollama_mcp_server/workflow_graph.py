@@ -0,0 +1,249 @@
+"""
+Dependency-ordered scheduling of workflow steps.
+
+A workflow is a list of steps. Steps may name themselves with ``id`` and
+list the steps they need with ``depends_on``::
+
+    [
+        {"id": "draft", "tool": "run_ollama_prompt", "params": {...}},
+        {"id": "critique_a", "depends_on": ["draft"], "tool": ..., "params": {...}},
+        {"id": "critique_b", "depends_on": ["draft"], "tool": ..., "params": {...}},
+        {"id": "merge", "depends_on": ["critique_a", "critique_b"], ...}
+    ]
+
+Steps whose dependencies have all succeeded run concurrently, up to a
+parallelism limit; a step whose dependency failed (or was skipped) is
+skipped. Steps without an ``id`` are called ``step_<n>`` (1-based).
+
+Lists where no step has ``depends_on`` keep their old meaning: the steps
+run one after another, in order, and a failing step doesn't stop the ones
+after it.
+
+A step's params can use the results of earlier steps with references like
+``{{steps.draft.content}}``. A reference makes the step depend on the one
+it names; a param that is nothing but a reference gets the value itself
+(e.g. a number), otherwise the value is put into the text.
+"""
+
+import asyncio
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Set
+
+# {{steps.<step id>.<field>}}
+STEP_REFERENCE_PATTERN = re.compile(r"\{\{\s*steps\.([A-Za-z0-9_-]+)\.([A-Za-z0-9_]+)\s*\}\}")
+
+# Step outcomes
+SUCCEEDED = "success"
+FAILED = "error"
+SKIPPED = "skipped"
+
+
+class WorkflowError(ValueError):
+    """Raised when a workflow's steps don't form a valid dependency graph."""
+
+
+def plan_steps(steps: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Check a workflow's steps and work out their dependencies.
+
+    Args:
+        steps: The workflow steps, as passed to run_workflow
+
+    Returns:
+        One dict per step, in list order, with its "index" (1-based), "id",
+        "name", "tool", "params", "depends_on" (steps that must succeed),
+        "after" (steps that must only have finished), "references" (steps
+        whose results its params use) and "referenced" (whether another
+        step uses its results)
+
+    Raises:
+        WorkflowError: If step IDs repeat, a dependency or reference is
+            unknown or the dependencies form a cycle
+    """
+    linear = not any("depends_on" in step for step in steps)
+    planned: List[Dict[str, Any]] = []
+    seen: Set[str] = set()
+    for index, step in enumerate(steps, start=1):
+        if not isinstance(step, dict):
+            raise WorkflowError(f"Step {index} must be an object")
+        step_id = str(step.get("id") or f"step_{index}")
+        if step_id in seen:
+            raise WorkflowError(f"Duplicate step id {step_id!r}")
+        seen.add(step_id)
+
+        depends_on = step.get("depends_on") or []
+        if isinstance(depends_on, str):
+            depends_on = [depends_on]
+        depends_on = [str(dependency) for dependency in depends_on]
+        references = step_references(step.get("params") or {})
+        if linear:
+            for reference in sorted(references - seen):
+                if any(str(later.get("id")) == reference for later in steps[index:]):
+                    raise WorkflowError(f"Step {step_id!r} references step {reference!r}, which runs after it")
+        planned.append({
+            "index": index,
+            "id": step_id,
+            "name": step.get("name", f"Step {index}"),
+            "tool": step.get("tool"),
+            "params": dict(step.get("params") or {}),
+            # Steps whose results are referenced must have succeeded too
+            "depends_on": depends_on + sorted(references - set(depends_on)),
+            "references": sorted(references),
+            # Old-style lists run in order whatever happened to the step before
+            "after": [planned[-1]["id"]] if linear and planned else [],
+        })
+
+    referenced: Set[str] = set()
+    for step in planned:
+        for dependency in step["depends_on"]:
+            if dependency not in seen:
+                raise WorkflowError(f"Step {step['id']!r} depends on (or references) unknown step {dependency!r}")
+            if dependency == step["id"]:
+                raise WorkflowError(f"Step {step['id']!r} depends on itself")
+        referenced.update(step["references"])
+    for step in planned:
+        step["referenced"] = step["id"] in referenced
+    _check_acyclic(planned)
+    return planned
+
+
+def step_references(value: Any) -> Set[str]:
+    """
+    IDs of the steps referenced anywhere in a step's params.
+
+    Args:
+        value: Params (or any value nested in them)
+
+    Returns:
+        The referenced step IDs
+    """
+    if isinstance(value, str):
+        return {match.group(1) for match in STEP_REFERENCE_PATTERN.finditer(value)}
+    if isinstance(value, dict):
+        return set().union(*(step_references(item) for item in value.values()))
+    if isinstance(value, list):
+        return set().union(*(step_references(item) for item in value))
+    return set()
+
+
+def resolve_references(value: Any, results: Dict[str, Dict[str, Any]]) -> Any:
+    """
+    Replace step references in params with the referenced steps' results.
+
+    Args:
+        value: Params (or any value nested in them)
+        results: Result fields of finished steps, by step ID
+
+    Returns:
+        A copy of value with every reference replaced
+
+    Raises:
+        WorkflowError: If a referenced field doesn't exist
+    """
+    if isinstance(value, dict):
+        return {key: resolve_references(item, results) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve_references(item, results) for item in value]
+    if not isinstance(value, str) or "{{" not in value:
+        return value
+
+    def lookup(match: "re.Match[str]") -> Any:
+        step_id, field = match.groups()
+        fields = results.get(step_id, {})
+        if field not in fields:
+            raise WorkflowError(f"Step {step_id!r} has no result field {field!r}")
+        return fields[field]
+
+    whole = STEP_REFERENCE_PATTERN.fullmatch(value.strip())
+    if whole:
+        return lookup(whole)
+
+    def as_text(match: "re.Match[str]") -> str:
+        found = lookup(match)
+        return "" if found is None else str(found)
+
+    return STEP_REFERENCE_PATTERN.sub(as_text, value)
+
+
+def _check_acyclic(planned: List[Dict[str, Any]]) -> None:
+    """Raise WorkflowError if the steps' dependencies form a cycle."""
+    waiting = {step["id"]: set(step["depends_on"]) | set(step["after"]) for step in planned}
+    ready = [step_id for step_id, needs in waiting.items() if not needs]
+    done = 0
+    while ready:
+        finished = ready.pop()
+        done += 1
+        for step_id, needs in waiting.items():
+            if finished in needs:
+                needs.discard(finished)
+                if not needs:
+                    ready.append(step_id)
+    if done < len(planned):
+        cycle = sorted(step_id for step_id, needs in waiting.items() if needs)
+        raise WorkflowError(f"Steps {', '.join(cycle)} depend on each other in a cycle")
+
+
+async def run_step_graph(
+    planned: List[Dict[str, Any]],
+    run_step: Callable[[Dict[str, Any]], Awaitable[bool]],
+    max_parallel: int
+) -> Dict[str, str]:
+    """
+    Run planned steps as their dependencies allow.
+
+    Ready steps start in list order. Cancelling the caller cancels every
+    step that is running.
+
+    Args:
+        planned: Steps returned by plan_steps
+        run_step: Runs one step and returns whether it succeeded; exceptions
+            count as failures
+        max_parallel: Most steps running at once
+
+    Returns:
+        Dict mapping each step ID to SUCCEEDED, FAILED or SKIPPED
+    """
+    by_id = {step["id"]: step for step in planned}
+    waiting = {step["id"]: set(step["depends_on"]) | set(step["after"]) for step in planned}
+    dependents: Dict[str, List[str]] = {step["id"]: [] for step in planned}
+    for step in planned:
+        for needed in waiting[step["id"]]:
+            dependents[needed].append(step["id"])
+
+    outcomes: Dict[str, str] = {}
+    ready = [step["id"] for step in planned if not waiting[step["id"]]]
+    running: Dict[asyncio.Task, str] = {}
+
+    def finish(step_id: str, outcome: str) -> None:
+        outcomes[step_id] = outcome
+        for dependent in dependents[step_id]:
+            waiting[dependent].discard(step_id)
+            if not waiting[dependent]:
+                ready.append(dependent)
+        ready.sort(key=lambda ready_id: by_id[ready_id]["index"])
+
+    async def guarded(step: Dict[str, Any]) -> bool:
+        try:
+            return bool(await run_step(step))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            return False
+
+    try:
+        while ready or running:
+            while ready and len(running) < max(max_parallel, 1):
+                step = by_id[ready.pop(0)]
+                if any(outcomes.get(dependency) != SUCCEEDED for dependency in step["depends_on"]):
+                    finish(step["id"], SKIPPED)
+                    continue
+                running[asyncio.create_task(guarded(step))] = step["id"]
+            if not running:
+                continue
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                finish(running.pop(task), SUCCEEDED if task.result() else FAILED)
+    finally:
+        for task in running:
+            task.cancel()
+    return outcomes